@@ -0,0 +1,154 @@
+"""
+Benchmark hors-ligne de l'enrichissement: fetches par prospect et contacts trouvés.
+
+Compare l'ancienne stratégie (home + 2 pages contact ou 2 chemins devinés, sans arrêt anticipé)
+à `enrich_prospects` (robots.txt, classement des liens, sitemap, arrêt dès email + téléphone).
+Les sites sont servis depuis fixtures/enrich_sites.json (aucun accès réseau).
+
+    cd backend && python -m benchmarks.bench_enrich [--fixtures chemin.json]
+"""
+import argparse
+import copy
+import json
+import os
+import re
+from urllib.parse import urljoin
+
+import requests
+
+from src.service import enrich
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = os.path.join(HERE, "fixtures", "enrich_sites.json")
+
+META_KEYS = ("page_fetches", "meta_fetches", "early_exits", "already_complete", "robots_blocked")
+
+LEGACY_CONTACT_WORDS = ["contact", "contact-us", "contacts", "support", "help", "a-propos", "about", "mentions-legales"]
+LEGACY_PATH_GUESSES = ["/contact", "/contact-us", "/contacts", "/support", "/help", "/a-propos", "/about"]
+
+
+class _Response:
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+
+class FixtureSession(requests.Session):
+    """Session qui sert les pages des fixtures et compte les GET."""
+
+    def __init__(self, pages: dict):
+        super().__init__()
+        self.pages = {k.rstrip("/"): v for k, v in pages.items()}
+        self.calls: list[str] = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(url)
+        page = self.pages.get(url.rstrip("/"))
+        if page is None:
+            return _Response(404, "")
+        return _Response(int(page.get("status", 200)), page.get("body", ""))
+
+
+def _legacy_contact_urls(base: str, html: str, limit: int = 2) -> list:
+    out = []
+    for href in re.findall(r'<a[^>]+href=["\']([^"\']+)["\']', html or "", flags=re.IGNORECASE):
+        h = href.strip()
+        if not h or h.startswith(("#", "mailto:", "tel:", "javascript:")):
+            continue
+        if any(w in h.lower() for w in LEGACY_CONTACT_WORDS):
+            full = urljoin(base, h)
+            if enrich._same_domain(base, full) and full not in out:
+                out.append(full)
+        if len(out) >= limit:
+            break
+    return out
+
+
+def run_legacy(prospects: list, session: FixtureSession) -> None:
+    for p in prospects:
+        site = enrich._normalize_url(p.get("site") or "")
+        if not site:
+            continue
+        html, _ = enrich._fetch(session, site, timeout=5)
+        found = enrich._extract(html)
+        urls = _legacy_contact_urls(site, html) or [urljoin(site, x) for x in LEGACY_PATH_GUESSES[:2]]
+        for u in urls:
+            html2, _ = enrich._fetch(session, u, timeout=5)
+            ex = enrich._extract(html2)
+            found["emails"] += [x for x in ex["emails"] if x not in found["emails"]]
+            found["telephones"] += [x for x in ex["telephones"] if x not in found["telephones"]]
+        p["emails"] = list(dict.fromkeys((p.get("emails") or []) + found["emails"]))
+        p["telephones"] = list(dict.fromkeys((p.get("telephones") or []) + found["telephones"]))
+
+
+def run_current(prospects: list, session: FixtureSession, cold: bool = True) -> dict:
+    # on mesure la stratégie de scraping: jamais de contacts déjà en cache par site
+    enrich._SITE_CACHE.clear()
+    if cold:
+        enrich._ROBOTS_CACHE.clear()
+        enrich._SITEMAP_CACHE.clear()
+    orig = enrich.requests.Session
+    enrich.requests.Session = lambda: session
+    try:
+        _, meta = enrich.enrich_prospects(prospects, return_meta=True, delay=0, region="MG")
+    finally:
+        enrich.requests.Session = orig
+    return meta
+
+
+def lost_contacts(legacy: list, current: list) -> list:
+    """Prospects dont l'ancienne stratégie trouvait un email ou un téléphone, et plus la nouvelle."""
+    return [
+        p["nom"] for p, q in zip(legacy, current)
+        if (p.get("emails") and not q.get("emails")) or (p.get("telephones") and not q.get("telephones"))
+    ]
+
+
+def _summary(name: str, prospects: list, session: FixtureSession) -> dict:
+    n = len(prospects)
+    return {
+        "strategy": name,
+        "prospects": n,
+        "fetches": len(session.calls),
+        "fetches_per_prospect": round(len(session.calls) / n, 2) if n else 0.0,
+        "with_email": sum(1 for p in prospects if p.get("emails")),
+        "with_phone": sum(1 for p in prospects if p.get("telephones")),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    args = ap.parse_args()
+
+    with open(args.fixtures, encoding="utf-8") as f:
+        data = json.load(f)
+
+    rows = []
+    legacy_session = FixtureSession(data["pages"])
+    legacy = copy.deepcopy(data["prospects"])
+    run_legacy(legacy, legacy_session)
+    rows.append(_summary("legacy", legacy, legacy_session))
+
+    # cold: robots.txt / sitemap à récupérer; warm: caches TTL déjà remplis (requêtes suivantes)
+    for name, cold in (("cold", True), ("warm", False)):
+        current_session = FixtureSession(data["pages"])
+        current = copy.deepcopy(data["prospects"])
+        meta = run_current(current, current_session, cold=cold)
+        rows.append(_summary(name, current, current_session))
+        print(f"{name} meta:", json.dumps({k: meta[k] for k in META_KEYS}))
+
+    for r in rows:
+        print(
+            f"{r['strategy']:<8} prospects={r['prospects']:<3} fetches={r['fetches']:<4} "
+            f"per_prospect={r['fetches_per_prospect']:<5} email={r['with_email']:<3} phone={r['with_phone']}"
+        )
+
+    lost = lost_contacts(legacy, current)
+    if lost:
+        print("contacts perdus:", ", ".join(lost))
+
+
+if __name__ == "__main__":
+    main()
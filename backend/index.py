@@ -1,6 +1,9 @@
 """Point d'entrée principal de l'API FastAPI."""
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from src.controller.prewarm import start_background
+from src.metrics import metrics_middleware
+from src.profiling import ADMIN_TOKEN, PROFILING_ENABLED, profiling_middleware
 from src.routes import router
 
 app = FastAPI(title="Prospect.com API", version="0.4")
@@ -10,9 +13,21 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
-    allow_methods=["GET"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
 
+# Métriques (/metrics)
+app.middleware("http")(metrics_middleware)
+
+# Profilage à la demande / requêtes lentes (PROSPECT_PROFILING=1); absent sinon
+if PROFILING_ENABLED:
+    app.middleware("http")(profiling_middleware)
+    if ADMIN_TOKEN is None:
+        print("[profiling] PROSPECT_ADMIN_TOKEN non défini: profils à la demande et /admin/profiles refusés")
+
 # Routes
 app.include_router(router)
+
+# Prewarm des caches hors-pointe (PROSPECT_PREWARM=1)
+app.add_event_handler("startup", start_background)
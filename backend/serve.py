@@ -0,0 +1,82 @@
+"""
+Démarrage de l'API en multi-workers (uvicorn, un process par worker).
+
+    cd backend && python serve.py --workers 4 [--host 0.0.0.0 --port 8000]
+
+Avec plus d'un worker, l'état partagé est choisi par défaut (variables non définies seulement):
+- caches TTL (geocode, Overpass, enrichissement): PROSPECT_CACHE_BACKEND=sqlite (fichier WAL + mmap)
+- rate limit Nominatim (1 req/s au total): PROSPECT_RATE_LIMIT_BACKEND=file
+- snapshots de pagination (un curseur peut arriver sur un autre worker): PROSPECT_SNAPSHOT_STORE=postgres
+Le prewarm en process (PROSPECT_PREWARM=1) tournerait dans chaque worker: il est désactivé,
+utiliser le CLI en cron (python -m src.controller.prewarm).
+/metrics reste par process: chaque scrape ne voit que les compteurs du worker qui répond (pas de
+total entre workers); pour des séries complètes, un seul worker par port derrière le proxy.
+backend/.env est chargé avant (sans écraser l'environnement): ses valeurs passent avant ces défauts.
+
+Volontairement hors de `src`: le process parent n'importe pas l'app (ni le pool Postgres).
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+import uvicorn
+from dotenv import load_dotenv
+
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+SHARED_DEFAULTS = {
+    "PROSPECT_CACHE_BACKEND": "sqlite",
+    "PROSPECT_RATE_LIMIT_BACKEND": "file",
+    "PROSPECT_SNAPSHOT_STORE": "postgres",
+}
+
+
+def configure(workers: int) -> List[str]:
+    """Positionne l'environnement hérité par les workers; retourne les avertissements."""
+    warnings = []
+    if workers <= 1:
+        return warnings
+    for key, value in SHARED_DEFAULTS.items():
+        os.environ.setdefault(key, value)
+    if os.environ["PROSPECT_CACHE_BACKEND"].strip().lower() == "memory":
+        warnings.append("PROSPECT_CACHE_BACKEND=memory: un cache par worker (taux de hit divisé)")
+    if os.environ["PROSPECT_RATE_LIMIT_BACKEND"].strip().lower() == "memory":
+        warnings.append(f"PROSPECT_RATE_LIMIT_BACKEND=memory: jusqu'à {workers} req/s vers Nominatim")
+    if os.environ["PROSPECT_SNAPSHOT_STORE"].strip().lower() == "memory":
+        warnings.append("PROSPECT_SNAPSHOT_STORE=memory: un curseur servi par un autre worker expire")
+    warnings.append(f"/metrics par worker: chaque scrape ne voit qu'un des {workers} workers")
+    if os.environ.get("PROSPECT_PREWARM", "0") in ("1", "true", "yes"):
+        os.environ["PROSPECT_PREWARM"] = "0"
+        warnings.append("PROSPECT_PREWARM désactivé en multi-workers: lancer le CLI prewarm en cron")
+    return warnings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="API prospects en multi-workers (uvicorn).")
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1)
+    ap.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args(argv)
+
+    workers = max(1, args.workers)
+    # comme src.db.connection dans les workers, mais avant les défauts: sinon ils masqueraient .env
+    if os.path.exists(ENV_PATH):
+        load_dotenv(ENV_PATH)
+    for w in configure(workers):
+        print(f"[serve] attention: {w}", file=sys.stderr)
+    print(
+        f"[serve] {workers} worker(s) sur {args.host}:{args.port} "
+        f"(cache={os.getenv('PROSPECT_CACHE_BACKEND', 'memory')}, "
+        f"rate_limit={os.getenv('PROSPECT_RATE_LIMIT_BACKEND', 'memory')})",
+        file=sys.stderr,
+    )
+    # chemin d'import "index:app": chaque worker importe l'app après le fork/spawn
+    uvicorn.run("index:app", host=args.host, port=args.port, workers=workers, log_level=args.log_level)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
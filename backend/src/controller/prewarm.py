@@ -0,0 +1,292 @@
+"""
+Prewarm des caches (geocode, Overpass, enrichissement) pour les recherches fréquentes.
+
+Hot-list: fichier JSON (PROSPECT_PREWARM_HOTLIST) ou apprise depuis le journal des recherches
+(service.querylog). Format du fichier, au choix:
+- [{"where": "Antananarivo", "category": "restaurant", "limit": 20}, ...]
+- {"cities": [...], "categories": [...], "limit": 20}  (produit cartésien)
+
+Rythme poli avec les upstreams: Nominatim via le rate limit existant (≈1 req/s, une fois par ville),
+Overpass espacé de PREWARM_OVERPASS_INTERVAL secondes, enrichissement avec le délai habituel.
+
+CLI (cron hors-pointe):
+    cd backend && python -m src.controller.prewarm --hotlist hot.json [--enrich] [--dry-run]
+    cd backend && python -m src.controller.prewarm --learn --top 50
+En process: PROSPECT_PREWARM=1 -> thread qui tourne une fois par jour dans PROSPECT_PREWARM_HOURS (ex "2-5").
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import sys
+import time
+from threading import Event, Lock, Thread
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from src import metrics
+from src.controller.prospect_controller import ProspectController
+from src.deadline import expired
+from src.prospect.open_street_map.osm import _geocode, get_prospects
+from src.service.enrich import enrich_prospects
+from src.service.querylog import QUERY_LOG_PATH, top_queries
+
+
+PREWARM_ENABLED = os.getenv("PROSPECT_PREWARM", "0") in ("1", "true", "yes")
+PREWARM_HOTLIST = os.getenv("PROSPECT_PREWARM_HOTLIST") or None
+PREWARM_HOURS = os.getenv("PROSPECT_PREWARM_HOURS", "2-5")  # heures locales [début, fin)
+PREWARM_TOP = int(os.getenv("PROSPECT_PREWARM_TOP", "50"))
+PREWARM_ENRICH = os.getenv("PROSPECT_PREWARM_ENRICH", "0") in ("1", "true", "yes")
+PREWARM_OVERPASS_INTERVAL = float(os.getenv("PREWARM_OVERPASS_INTERVAL", "10"))
+PREWARM_CHECK_SECONDS = 300
+
+
+def load_hotlist(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    if isinstance(data, dict):
+        limit = int(data.get("limit") or 20)
+        return [
+            {"where": city, "category": cat, "limit": limit}
+            for city in data.get("cities") or []
+            for cat in data.get("categories") or [None]
+        ]
+    return list(data)
+
+
+def learn_hotlist(top: int = PREWARM_TOP, path: Optional[str] = QUERY_LOG_PATH) -> List[dict]:
+    """Recherches les plus fréquentes (journal fichier si configuré, sinon compteur du process)."""
+    return top_queries(top, path=path)
+
+
+def _normalize(entry: dict) -> dict:
+    where = (entry.get("where") or "").strip()
+    if not where:
+        raise ValueError(f"Entrée hot-list sans where: {entry}")
+    return {
+        "where": where,
+        # même résolution que /prospects => même clé de cache Overpass
+        "tags": ProspectController._resolve_tags(entry.get("category"), entry.get("tags")),
+        "limit": int(entry.get("limit") or 20),
+        "radius_km": entry.get("radius_km"),
+    }
+
+
+def prewarm(
+    entries: List[dict],
+    *,
+    enrich: bool = False,
+    overpass_interval: float = PREWARM_OVERPASS_INTERVAL,
+    deadline: Optional[float] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Rafraîchit les caches pour chaque entrée. deadline (perf_counter absolu): fin de la fenêtre
+    hors-pointe; les entrées restantes sont marquées "skipped".
+    Retourne un rapport: par entrée (statut, résultats, sites enrichis, secondes) + totaux.
+    """
+    t0 = time.perf_counter()
+    specs = [_normalize(e) for e in entries]
+    session = requests.Session()
+    report: Dict[str, Any] = {
+        "started_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "entries": len(specs),
+        "geocode_refreshed": 0,
+        "overpass_refreshed": 0,
+        "sites_refreshed": 0,
+        "errors": 0,
+        "skipped": 0,
+        "items": [],
+    }
+
+    geocoded: set = set()
+    last_overpass = 0.0
+    for spec in specs:
+        item = {**spec, "status": "ok"}
+        report["items"].append(item)
+        if dry_run:
+            item["status"] = "dry_run"
+            continue
+        if expired(deadline):
+            item["status"] = "skipped"
+            report["skipped"] += 1
+            continue
+
+        t_item = time.perf_counter()
+        try:
+            # geocode: une seule fois par ville (rate limit Nominatim appliqué par _geocode)
+            key = spec["where"].lower()
+            if key not in geocoded:
+                _geocode(spec["where"], session, deadline, refresh=True)
+                geocoded.add(key)
+                report["geocode_refreshed"] += 1
+                metrics.PREWARM_REFRESHED.inc(cache="geocode")
+
+            # Overpass: espacement minimal entre deux requêtes
+            wait = overpass_interval - (time.perf_counter() - last_overpass)
+            if last_overpass and wait > 0:
+                if expired(deadline, margin=wait):
+                    item["status"] = "skipped"
+                    report["skipped"] += 1
+                    continue
+                metrics.sleep_backoff(wait, "overpass")
+            last_overpass = time.perf_counter()
+            results, meta = get_prospects(
+                where=spec["where"],
+                lat=None,
+                lon=None,
+                radius_km=spec["radius_km"],
+                radius_min_km=None,
+                tags=spec["tags"],
+                limit=spec["limit"],
+                deadline=deadline,
+                refresh=True,
+            )
+            report["overpass_refreshed"] += 1
+            metrics.PREWARM_REFRESHED.inc(cache="overpass")
+            item["results"] = len(results)
+
+            if enrich:
+                with_site = [r for r in results if r.get("site")]
+                _, enrich_meta = enrich_prospects(
+                    with_site, return_meta=True, region=meta.get("country_code"), deadline=deadline, refresh=True
+                )
+                item["sites_refreshed"] = enrich_meta["enriched_count"]
+                report["sites_refreshed"] += enrich_meta["enriched_count"]
+                metrics.PREWARM_REFRESHED.inc(enrich_meta["enriched_count"], cache="enrich")
+
+        except (ValueError, RuntimeError) as e:
+            item["status"] = "error"
+            item["error"] = str(e)
+            report["errors"] += 1
+
+        item["seconds"] = round(time.perf_counter() - t_item, 3)
+
+    report["seconds"] = round(time.perf_counter() - t0, 3)
+    return report
+
+
+# --- tâche de fond (optionnelle)
+
+def _parse_hours(value: str) -> tuple[int, int]:
+    """"début-fin" (heures locales, fin exclue, ex "2-5" ou "23-1"); ValueError sinon (fenêtre vide)."""
+    start, sep, end = (value or "").strip().partition("-")
+    try:
+        hours = int(start) % 24, int(end) % 24
+    except ValueError:
+        hours = None
+    if not sep or hours is None or hours[0] == hours[1]:
+        raise ValueError(
+            f"PROSPECT_PREWARM_HOURS invalide: '{value}' (attendu: début-fin, ex '2-5'; fin exclue, ≠ début)"
+        )
+    return hours
+
+
+def _in_window(now: dt.datetime, hours: tuple[int, int]) -> bool:
+    start, end = hours
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end  # fenêtre à cheval sur minuit
+
+
+def _window_seconds_left(now: dt.datetime, hours: tuple[int, int]) -> float:
+    end = now.replace(hour=hours[1], minute=0, second=0, microsecond=0)
+    if end <= now:
+        end += dt.timedelta(days=1)
+    return (end - now).total_seconds()
+
+
+class PrewarmScheduler:
+    """Une passe par jour dans la fenêtre hors-pointe; le dernier rapport est gardé dans `last_report`."""
+
+    def __init__(self, hours: str = PREWARM_HOURS, hotlist: Optional[str] = PREWARM_HOTLIST, enrich: bool = PREWARM_ENRICH):
+        self.hours = _parse_hours(hours)
+        self.hotlist = hotlist
+        self.enrich = enrich
+        self.last_run: Optional[dt.date] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._loop, name="prewarm", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _entries(self) -> List[dict]:
+        return load_hotlist(self.hotlist) if self.hotlist else learn_hotlist()
+
+    def run_once(self) -> Dict[str, Any]:
+        now = dt.datetime.now()
+        deadline = time.perf_counter() + _window_seconds_left(now, self.hours)
+        report = prewarm(self._entries(), enrich=self.enrich, deadline=deadline)
+        self.last_run = now.date()
+        self.last_report = report
+        print(
+            f"[prewarm] {report['entries']} entrées, geocode={report['geocode_refreshed']} "
+            f"overpass={report['overpass_refreshed']} sites={report['sites_refreshed']} "
+            f"erreurs={report['errors']} ignorées={report['skipped']} en {report['seconds']}s"
+        )
+        return report
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            now = dt.datetime.now()
+            if _in_window(now, self.hours) and self.last_run != now.date():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    self.last_run = now.date()
+                    print(f"[prewarm] échec: {e}")
+            self._stop.wait(PREWARM_CHECK_SECONDS)
+
+
+scheduler: Optional[PrewarmScheduler] = None
+
+
+def start_background() -> Optional[PrewarmScheduler]:
+    """Démarre la tâche de fond si PROSPECT_PREWARM=1 (appelé au démarrage de l'app)."""
+    global scheduler
+    if not PREWARM_ENABLED:
+        return None
+    if scheduler is None:
+        scheduler = PrewarmScheduler()
+        scheduler.start()
+    return scheduler
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Prewarm des caches geocode / Overpass / enrichissement.")
+    source = ap.add_mutually_exclusive_group()
+    source.add_argument("--hotlist", default=PREWARM_HOTLIST, help="Fichier JSON de la hot-list")
+    source.add_argument("--learn", action="store_true", help="Hot-list apprise depuis PROSPECT_QUERY_LOG")
+    ap.add_argument("--query-log", default=QUERY_LOG_PATH, help="Journal des recherches (JSON lines)")
+    ap.add_argument("--top", type=int, default=PREWARM_TOP, help="Nb d'entrées apprises")
+    ap.add_argument("--enrich", action="store_true", default=PREWARM_ENRICH, help="Rafraîchir aussi le cache d'enrichissement")
+    ap.add_argument("--interval", type=float, default=PREWARM_OVERPASS_INTERVAL, help="Secondes entre deux requêtes Overpass")
+    ap.add_argument("--max-minutes", type=float, default=None, help="Budget total (fin de fenêtre)")
+    ap.add_argument("--dry-run", action="store_true", help="Affiche la hot-list sans appeler les upstreams")
+    args = ap.parse_args(argv)
+
+    if args.learn or not args.hotlist:
+        if not args.query_log:
+            ap.error("--learn nécessite --query-log ou PROSPECT_QUERY_LOG")
+        entries = learn_hotlist(args.top, path=args.query_log)
+    else:
+        entries = load_hotlist(args.hotlist)
+
+    deadline = time.perf_counter() + args.max_minutes * 60 if args.max_minutes else None
+    report = prewarm(entries, enrich=args.enrich, overpass_interval=args.interval, deadline=deadline, dry_run=args.dry_run)
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,43 @@
-from typing import Optional, Dict, Any
+from time import perf_counter
+from typing import Optional, Dict, Any, List, Tuple
 
-from src.prospect.open_street_map.osm import get_prospects
+from src import metrics
+from src.prospect import SearchSpec
+from src.prospect.fanout import parse_provider_names, run_providers
+from src.prospect.open_street_map.osm import get_prospects_batch
+from src.service.addresses import complete_addresses
+from src.service.coverage import compute_coverage, score_fields, score_prospects
 from src.service.enrich import enrich_prospects
-from src.service.tags import category_to_tags  # petit helper
+from src.service.fields import ENRICH_FIELDS, SMART_DEDUPE_FIELDS, parse_fields, project, with_required
+from src.service.querylog import record_query
+from src.service.resolve import resolve_entities
+from src.service.snapshots import SNAPSHOT_MAX_RESULTS, create_snapshot, read_page
+from src.service.tags import resolve_categories
+
+
+DEDUPE_MODES = ("strict", "smart")
+MAX_UNPAGED_LIMIT = 200
 
 
 class ProspectController:
     @staticmethod
+    def _resolve_filters(category: Optional[str], tags: Optional[str]) -> Tuple[Optional[str], Optional[tuple]]:
+        """
+        category -> (tags, filtres) si tags non fourni (plusieurs catégories séparées par des virgules).
+        Les filtres structurés vont tels quels au provider; `tags` (forme canonique) sert à la meta,
+        au journal des recherches et aux clés de cache. Filtres None: le provider parse `tags`.
+        """
+        if (not tags or not tags.strip()) and category and category.strip():
+            tags, filters, _ = resolve_categories(category)
+            return tags, filters
+        return tags, None
+
+    @staticmethod
+    def _resolve_tags(category: Optional[str], tags: Optional[str]) -> Optional[str]:
+        return ProspectController._resolve_filters(category, tags)[0]
+
+    @staticmethod
+    @metrics.traced("ProspectController.search_prospects")
     def search_prospects(
         *,
         where: Optional[str],
@@ -18,44 +49,232 @@ class ProspectController:
         tags: Optional[str],
         limit: int,
         enrich: bool,
+        dedupe: str = "strict",
+        providers: Optional[str] = None,
+        deadline: Optional[float] = None,
+        fields: Optional[str] = None,
+        page_size: Optional[int] = None,
+        sort: Optional[str] = None,
     ) -> Dict[str, Any]:
-        # category -> tags si tags non fourni
-        # Gère plusieurs catégories séparées par des virgules
-        if (not tags or not tags.strip()) and category and category.strip():
-            # Si plusieurs catégories, les mapper séparément puis les joindre
-            categories = [c.strip() for c in category.split(",") if c.strip()]
-            if categories:
-                mapped_tags = []
-                for cat in categories:
-                    mapped = category_to_tags(cat)
-                    # Si le mapping retourne plusieurs tags (séparés par virgule), les ajouter individuellement
-                    if "," in mapped:
-                        mapped_tags.extend([t.strip() for t in mapped.split(",") if t.strip()])
-                    else:
-                        mapped_tags.append(mapped)
-                tags = ",".join(mapped_tags)
-
-        results, meta = get_prospects(
+        """
+        page_size: pagination par curseur; `limit` = taille totale du snapshot (≤ SNAPSHOT_MAX_RESULTS),
+        la réponse ne contient que la première page + `page.next_cursor` (cf. next_page).
+        sort: "score" (complétude des contacts, décroissant), sur tous les candidats des providers,
+        avant la troncature à `limit`.
+        """
+        if dedupe not in DEDUPE_MODES:
+            raise ValueError(f"dedupe invalide: '{dedupe}' (attendu: {', '.join(DEDUPE_MODES)})")
+        max_limit = SNAPSHOT_MAX_RESULTS if page_size else MAX_UNPAGED_LIMIT
+        if limit > max_limit:
+            raise ValueError(f"limit > {max_limit}: utiliser page_size (pagination par curseur)")
+        names = parse_provider_names(providers)
+        wanted = parse_fields(fields)
+        scored = score_fields(wanted, sort)
+
+        tags, filters = ProspectController._resolve_filters(category, tags)
+        # fréquence des recherches: hot-list apprise par le prewarm
+        if lat is None or lon is None:
+            record_query(where=where, tags=tags, limit=limit, radius_km=radius_km)
+        spec = SearchSpec(
             where=where,
             lat=lat,
             lon=lon,
             radius_km=radius_km,
             radius_min_km=radius_min_km,
             tags=tags,
+            filters=filters,
             limit=limit,
+            # sort=score: le provider renvoie tous ses candidats, compute_coverage trie puis tronque
+            candidates=sort == "score",
+            # le provider ne construit que les blocs demandés + ceux lus par dedupe / enrichissement
+            fields=with_required(
+                scored,
+                ENRICH_FIELDS if enrich else (),
+                SMART_DEDUPE_FIELDS if dedupe == "smart" else (),
+            ),
         )
 
-        enrich_meta = {"enabled": bool(enrich), "enriched_count": 0, "total_seconds": 0.0, "avg_seconds": 0.0}
-        if enrich:
-            results, enrich_meta = enrich_prospects(results, return_meta=True)
+        # fan-out parallèle; un provider lent => résultats partiels (status "timeout")
+        by_provider, provider_status, meta = run_providers(spec, names, deadline)
+        results = [r for name in names for r in by_provider[name]]
+        if not meta:
+            meta = {**spec.to_dict(), "timings": {}}
 
-        return {
+        # strict: entity_key (déjà fait par le provider); smart: entity resolution (nom, distance, contacts)
+        dedupe_meta = {"mode": dedupe}
+        if dedupe == "smart":
+            with metrics.stage("dedupe"):
+                results, stats = resolve_entities(results)
+            dedupe_meta.update(stats)
+
+        # adresses vides: complétées depuis le cache, sinon résolues en fond pour les fetchs suivants
+        with metrics.stage("addresses"):
+            results, address_meta = complete_addresses(results)
+
+        # score par prospect + couverture de la recherche (colonnes), tri éventuel puis troncature
+        with metrics.stage("coverage"):
+            results, coverage = compute_coverage(results, sort=sort, limit=limit, fields=scored)
+
+        page = None
+        if page_size:
+            # snapshot de la liste ordonnée (avant enrichissement): les pages suivantes n'appellent aucun upstream
+            snapshot_meta = {
+                "query": meta,
+                "enrich": bool(enrich),
+                "dedupe": dedupe_meta,
+                "providers": provider_status,
+                "coverage": coverage,
+                "fields": sorted(wanted) if wanted is not None else None,
+                "score_fields": sorted(scored) if scored is not None else None,
+            }
+            results, page = create_snapshot(snapshot_meta, results, page_size)
+
+        results, enrich_meta = ProspectController._finish_page(
+            results, enrich=enrich, wanted=wanted, scored=scored, region=meta.get("country_code"), deadline=deadline
+        )
+
+        resp = {
             "query": meta,
             "count": len(results),
             "enrich": enrich,
+            "dedupe": dedupe_meta,
+            "providers": provider_status,
+            "coverage": coverage,
+            "addresses": address_meta,
             "timings": {
                 "provider": meta.get("timings", {}),
+                "providers": {name: st["seconds"] for name, st in provider_status.items()},
+                "enrichment": enrich_meta,
+            },
+            "results": results,
+        }
+        if page is not None:
+            resp["page"] = page
+        return resp
+
+    @staticmethod
+    def _finish_page(
+        results: List[dict],
+        *,
+        enrich: bool,
+        wanted: Optional[frozenset],
+        scored: Optional[frozenset],
+        region: Optional[str],
+        deadline: Optional[float],
+    ) -> Tuple[List[dict], Dict[str, Any]]:
+        """Enrichissement (si demandé) puis projection `fields`, sur les seuls résultats renvoyés."""
+        enrich_meta = {
+            "enabled": bool(enrich), "enriched_count": 0, "total_seconds": 0.0, "avg_seconds": 0.0, "skipped_deadline": 0,
+        }
+        if enrich:
+            with metrics.stage("enrichment"):
+                results, enrich_meta = enrich_prospects(
+                    results, return_meta=True, region=region, deadline=deadline
+                )
+            # contacts trouvés par le scraping: score à jour (l'ordre et `coverage` restent ceux de la recherche)
+            score_prospects(results, scored)
+        return project(results, wanted), enrich_meta
+
+    @staticmethod
+    @metrics.traced("ProspectController.next_page")
+    def next_page(
+        cursor: str,
+        page_size: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Page suivante d'un snapshot (curseur opaque): tranche par position, aucun appel upstream."""
+        t0 = perf_counter()
+        snap, results, page = read_page(cursor, page_size)
+        snapshot_s = perf_counter() - t0
+
+        wanted = frozenset(snap["fields"]) if snap.get("fields") is not None else None
+        scored = frozenset(snap["score_fields"]) if snap.get("score_fields") is not None else wanted
+        query = snap.get("query") or {}
+        # adresses résolues en fond depuis la création du snapshot
+        results, address_meta = complete_addresses(results)
+        if address_meta["filled"]:
+            score_prospects(results, scored)
+        results, enrich_meta = ProspectController._finish_page(
+            results, enrich=snap.get("enrich", False), wanted=wanted, scored=scored,
+            region=query.get("country_code"), deadline=deadline,
+        )
+
+        return {
+            "query": query,
+            "count": len(results),
+            "enrich": snap.get("enrich", False),
+            "dedupe": snap.get("dedupe", {}),
+            "providers": snap.get("providers", {}),
+            "coverage": snap.get("coverage"),
+            "addresses": address_meta,
+            "page": page,
+            "timings": {
+                "snapshot_seconds": round(snapshot_s, 4),
                 "enrichment": enrich_meta,
             },
             "results": results,
         }
+
+    @staticmethod
+    @metrics.traced("ProspectController.search_batch")
+    def search_batch(specs: List[Dict[str, Any]], deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Plusieurs recherches (ville × catégorie) en un appel: geocoding mutualisé,
+        requêtes Overpass regroupées par bbox, enrichissement par spec si demandé.
+        """
+        if not specs:
+            raise ValueError("specs vide.")
+
+        provider_specs = []
+        wanted_by_spec = []
+        for spec in specs:
+            wanted = parse_fields(spec.get("fields"))
+            scored = score_fields(wanted, spec.get("sort"))
+            wanted_by_spec.append((wanted, scored))
+            tags, filters = ProspectController._resolve_filters(spec.get("category"), spec.get("tags"))
+            provider_specs.append({
+                **spec,
+                "tags": tags,
+                "filters": filters,
+                "fields": with_required(scored, ENRICH_FIELDS if spec.get("enrich") else ()),
+                "candidates": spec.get("sort") == "score",
+            })
+
+        outs, stats = get_prospects_batch(provider_specs, deadline=deadline)
+
+        t_enrich = perf_counter()
+        items = []
+        for spec, (wanted, scored), out in zip(specs, wanted_by_spec, outs):
+            if "error" in out:
+                items.append({"error": out["error"], "status": out["status"]})
+                continue
+
+            enrich = bool(spec.get("enrich"))
+            results, address_meta = complete_addresses(out["results"])
+            results, coverage = compute_coverage(
+                results, sort=spec.get("sort"), limit=spec.get("limit"), fields=scored
+            )
+            results, enrich_meta = ProspectController._finish_page(
+                results, enrich=enrich, wanted=wanted, scored=scored, region=out["query"].get("country_code"),
+                deadline=deadline,
+            )
+
+            items.append({
+                "query": out["query"],
+                "count": len(results),
+                "enrich": enrich,
+                "coverage": coverage,
+                "addresses": address_meta,
+                "timings": {
+                    "provider": out["query"].pop("timings", {}),
+                    "enrichment": enrich_meta,
+                },
+                "results": results,
+            })
+
+        stats["timings"]["enrichment_seconds"] = round(perf_counter() - t_enrich, 3)
+        return {
+            "count": len(items),
+            "stats": stats,
+            "items": items,
+        }
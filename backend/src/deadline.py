@@ -0,0 +1,45 @@
+"""
+Échéances de requête (deadline) propagées de la route jusqu'aux appels upstream.
+Une deadline est un instant absolu `time.perf_counter()`; None = pas de limite.
+"""
+import os
+import time
+from typing import Optional
+
+
+# deadline par défaut si le client n'en fournit pas (ex: limite de la plateforme); vide = aucune
+DEFAULT_DEADLINE_MS = int(os.getenv("PROSPECT_DEFAULT_DEADLINE_MS", "0") or 0)
+
+
+class DeadlineExceeded(RuntimeError):
+    """Plus assez de temps pour lancer l'appel (RuntimeError => 503 côté route)."""
+
+
+def from_ms(deadline_ms: Optional[int], start: Optional[float] = None) -> Optional[float]:
+    ms = deadline_ms or DEFAULT_DEADLINE_MS
+    if not ms:
+        return None
+    return (start if start is not None else time.perf_counter()) + ms / 1000.0
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return deadline - time.perf_counter()
+
+
+def expired(deadline: Optional[float], margin: float = 0.0) -> bool:
+    return deadline is not None and time.perf_counter() + margin >= deadline
+
+
+def clamp_timeout(default: float, deadline: Optional[float], what: str = "appel", minimum: float = 0.5) -> float:
+    """
+    Timeout réseau = min(défaut, temps restant).
+    Lève DeadlineExceeded s'il reste moins de `minimum` secondes (inutile de lancer l'appel).
+    """
+    left = remaining(deadline)
+    if left is None:
+        return default
+    if left < minimum:
+        raise DeadlineExceeded(f"Deadline dépassée avant {what}.")
+    return min(default, left)
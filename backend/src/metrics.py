@@ -0,0 +1,286 @@
+"""
+Métriques au format Prometheus (texte) + spans optionnels (OpenTelemetry).
+
+Registre minimal en mémoire du process (en multi-workers, /metrics ne montre que le worker qui
+répond, cf. serve.py), thread-safe, sans dépendance obligatoire:
+- Histogram: durées par étape du pipeline (geocode, overpass, parse, …)
+- Counter: cache hits, retries, 429, secondes de backoff
+- Gauge: requêtes upstream en cours, usage du pool DB
+
+Si `opentelemetry` est installé, `span()` / `stage()` ouvrent aussi des spans.
+"""
+from __future__ import annotations
+
+import functools
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator, Optional, Sequence
+
+try:  # dépendance optionnelle
+    from opentelemetry import trace as _otel_trace
+except ImportError:
+    _otel_trace = None
+
+
+TRACING_ENABLED = os.getenv("PROSPECT_TRACING", "1") not in ("0", "false", "no")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+_REGISTRY: list["_Metric"] = []
+
+
+def _escape_label(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[dict] = None) -> str:
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    for k, v in (extra or {}).items():
+        pairs.append(f'{k}="{_escape_label(v)}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        k = self._key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + float(amount)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        k = self._key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + float(amount)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """+1 pendant la durée du bloc (ex: requêtes upstream en vol)."""
+        self.inc(1.0, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1.0, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # clé labels -> [compteurs par bucket (non cumulés), somme, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        k = self._key(labels)
+        v = float(value)
+        with self._lock:
+            it = self._values.get(k)
+            if it is None:
+                it = [[0] * len(self.buckets), 0.0, 0]
+                self._values[k] = it
+            for i, b in enumerate(self.buckets):
+                if v <= b:
+                    it[0][i] += 1
+                    break
+            it[1] += v
+            it[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = []
+        for k, (counts, total, n) in items:
+            acc = 0
+            for b, c in zip(self.buckets, counts):
+                acc += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, k, {'le': _fmt_value(b)})} {acc}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, k)} {_fmt_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, k)} {n}")
+        return lines
+
+
+# --- Métriques de l'application
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP", ["method", "route", "status"]
+)
+STAGE_SECONDS = Histogram(
+    "prospect_stage_seconds", "Durée par étape du pipeline prospects", ["stage"]
+)
+CACHE_HITS = Counter("prospect_cache_hits_total", "Cache hits", ["cache"])
+CACHE_MISSES = Counter("prospect_cache_misses_total", "Cache misses", ["cache"])
+UPSTREAM_RETRIES = Counter("prospect_upstream_retries_total", "Retries vers un upstream", ["upstream"])
+UPSTREAM_RATE_LIMITED = Counter("prospect_upstream_rate_limited_total", "Réponses 429 d'un upstream", ["upstream"])
+UPSTREAM_BACKOFF_SECONDS = Counter(
+    "prospect_upstream_backoff_seconds_total", "Secondes dormies en backoff / rate limit", ["upstream"]
+)
+UPSTREAM_INFLIGHT = Gauge("prospect_upstream_inflight", "Requêtes upstream en cours", ["upstream"])
+PREWARM_REFRESHED = Counter(
+    "prospect_prewarm_refreshed_total", "Entrées de cache rafraîchies par le prewarm", ["cache"]
+)
+SYNC_CHANGES = Counter(
+    "prospect_sync_changes_total", "Changements détectés par le sync incrémental", ["change"]
+)
+CATEGORY_RESOLUTIONS = Counter(
+    "prospect_category_resolutions_total", "Résolutions de catégorie (exact|plural|fuzzy|unknown)", ["method"]
+)
+ADDRESS_COMPLETIONS = Counter(
+    "prospect_address_completions_total",
+    "Complétion d'adresses (cache|queued|filled|not_found|error|dropped)",
+    ["result"],
+)
+DB_POOL = Gauge("prospect_db_pool", "Usage du pool psycopg (get_stats)", ["stat"])
+
+_DB_POOL_STATS = ("pool_min", "pool_max", "pool_size", "pool_available", "requests_waiting")
+
+
+def _collect_db_pool() -> None:
+    try:
+        from src.db import pool
+        stats = pool.get_stats()
+    except Exception:
+        return
+    for k in _DB_POOL_STATS:
+        if k in stats:
+            DB_POOL.set(stats[k], stat=k)
+
+
+def render() -> str:
+    """Exposition texte Prometheus (version 0.0.4)."""
+    _collect_db_pool()
+    out: list[str] = []
+    for m in _REGISTRY:
+        lines = m.render()
+        if not lines:
+            continue
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+# --- Tracing
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """Span OpenTelemetry si disponible, sinon no-op."""
+    if _otel_trace is None or not TRACING_ENABLED:
+        yield
+        return
+    tracer = _otel_trace.get_tracer("prospect")
+    with tracer.start_as_current_span(name) as s:
+        for k, v in attributes.items():
+            if v is not None:
+                s.set_attribute(k, v)
+        yield
+
+
+def traced(name: str):
+    """Décorateur: exécute la fonction dans un span `name` (kwargs scalaires en attributs)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            attrs = {k: v for k, v in kwargs.items() if isinstance(v, (str, int, float, bool))}
+            with span(name, **attrs):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+@contextmanager
+def stage(name: str, **attributes) -> Iterator[None]:
+    """Histogramme `prospect_stage_seconds{stage=…}` + span enfant."""
+    with span(f"prospect.{name}", **attributes):
+        with STAGE_SECONDS.time(stage=name):
+            yield
+
+
+def sleep_backoff(seconds: float, upstream: str) -> None:
+    """time.sleep() comptabilisé dans les métriques de backoff."""
+    if seconds <= 0:
+        return
+    UPSTREAM_BACKOFF_SECONDS.inc(seconds, upstream=upstream)
+    time.sleep(seconds)
+
+
+# --- Middleware HTTP
+
+async def metrics_middleware(request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - t0, method=request.method, route=path, status=str(status)
+        )
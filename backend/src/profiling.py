@@ -0,0 +1,300 @@
+"""
+Profilage à la demande (échantillonnage de piles) des requêtes lentes.
+
+Désactivé par défaut: sans PROSPECT_PROFILING=1 le middleware n'est pas installé (coût nul).
+Activé:
+- à la demande: en-tête `X-Profile: 1` ou `?profile=1` + `X-Admin-Token` (PROSPECT_ADMIN_TOKEN;
+  sans token configuré, ni profil à la demande ni accès à /admin/profiles)
+- automatiquement: si PROSPECT_PROFILE_SLOW_MS > 0, chaque requête est échantillonnée et le profil
+  n'est gardé que si elle dépasse le seuil
+
+Un seul thread échantillonneur (sys._current_frames toutes les PROSPECT_PROFILE_INTERVAL_MS),
+démarré tant qu'au moins une requête est profilée. Seules les piles qui traversent le code de l'app
+sont gardées (threads du pool au repos, boucle d'événements exclus); une pile par thread, donc les
+threads du fan-out providers / enrichissement apparaissent séparément. Des requêtes concurrentes
+profilées en même temps partagent les mêmes échantillons.
+
+Fichiers dans PROSPECT_PROFILE_DIR (les PROSPECT_PROFILE_MAX_FILES plus récents; répertoire privé 0700
+de l'utilisateur, fichiers 0600: les piles exposent routes et paramètres):
+- `<id>.speedscope.json` (https://www.speedscope.app), `<id>.collapsed.txt` (flamegraph.pl / speedscope)
+- `<id>.meta.json`: route, statut, durée, CPU du process, nb d'échantillons, déclencheur
+"""
+from __future__ import annotations
+
+import hmac
+import json
+import os
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from src.service.cache import private_dir
+
+
+PROFILING_ENABLED = os.getenv("PROSPECT_PROFILING", "0") in ("1", "true", "yes")
+PROFILE_SLOW_MS = float(os.getenv("PROSPECT_PROFILE_SLOW_MS", "0") or 0)
+PROFILE_INTERVAL = float(os.getenv("PROSPECT_PROFILE_INTERVAL_MS", "5")) / 1000.0
+PROFILE_DIR = os.getenv("PROSPECT_PROFILE_DIR", os.path.join(tempfile.gettempdir(), f"prospect-profiles-{os.getuid()}"))
+PROFILE_MAX_FILES = int(os.getenv("PROSPECT_PROFILE_MAX_FILES", "50"))
+ADMIN_TOKEN = os.getenv("PROSPECT_ADMIN_TOKEN") or None
+
+PROFILE_FORMATS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed.txt"}
+
+# routes jamais profilées automatiquement
+_SKIP_PREFIXES = ("/admin", "/metrics", "/health")
+_MAX_DEPTH = 200
+_THIS_FILE = os.path.abspath(__file__)
+_APP_ROOT = os.path.dirname(os.path.dirname(_THIS_FILE))
+_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{6}$")
+
+Frame = Tuple[str, str, int]  # (fonction, fichier relatif, première ligne)
+
+
+def _is_app_file(filename: str) -> bool:
+    return filename.startswith(_APP_ROOT) and "site-packages" not in filename and filename != _THIS_FILE
+
+
+def _short_path(filename: str) -> str:
+    """Chemin relatif à l'app, sinon à l'entrée de sys.path la plus longue (stdlib, site-packages)."""
+    if _is_app_file(filename):
+        return os.path.relpath(filename, _APP_ROOT)
+    for root in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if filename.startswith(root + os.sep):
+            return os.path.relpath(filename, root)
+    return filename
+
+
+class _Session:
+    """Échantillons d'une requête: (thread, pile racine->feuille) -> [nb, secondes]."""
+
+    def __init__(self):
+        self.stacks: Dict[Tuple[str, Tuple[Frame, ...]], List[float]] = defaultdict(lambda: [0, 0.0])
+        self.samples = 0
+
+    def add(self, stacks: List[Tuple[str, Tuple[Frame, ...]]], weight: float) -> None:
+        self.samples += 1
+        for key in stacks:
+            entry = self.stacks[key]
+            entry[0] += 1
+            entry[1] += weight
+
+
+class _Sampler:
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self._sessions: set = set()
+        self._lock = threading.Lock()
+        self._stop: Optional[threading.Event] = None
+
+    def attach(self, session: _Session) -> None:
+        with self._lock:
+            self._sessions.add(session)
+            if self._stop is None:
+                self._stop = threading.Event()
+                threading.Thread(target=self._run, args=(self._stop,), name="profiler", daemon=True).start()
+
+    def detach(self, session: _Session) -> None:
+        with self._lock:
+            self._sessions.discard(session)
+            if not self._sessions and self._stop is not None:
+                self._stop.set()
+                self._stop = None
+
+    def _run(self, stop: threading.Event) -> None:
+        me = threading.get_ident()
+        code_cache: Dict[Any, Tuple[Frame, bool]] = {}
+        last = time.perf_counter()
+        while not stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack: List[Frame] = []
+                in_app = False
+                depth = 0
+                while frame is not None and depth < _MAX_DEPTH:
+                    code = frame.f_code
+                    hit = code_cache.get(code)
+                    if hit is None:
+                        fn = code.co_filename
+                        hit = code_cache[code] = ((code.co_name, _short_path(fn), code.co_firstlineno), _is_app_file(fn))
+                    stack.append(hit[0])
+                    in_app = in_app or hit[1]
+                    frame = frame.f_back
+                    depth += 1
+                if in_app:
+                    stacks.append((names.get(tid, str(tid)), tuple(reversed(stack))))
+            with self._lock:
+                for s in self._sessions:
+                    s.add(stacks, weight)
+
+
+SAMPLER = _Sampler()
+
+
+# --- formats
+
+def _frame_name(f: Frame) -> str:
+    name, file, line = f
+    return f"{name} ({file}:{line})"
+
+
+def to_collapsed(session: _Session) -> str:
+    """Une ligne par pile: `thread;f1;f2;... nb_échantillons` (flamegraph.pl)."""
+    lines = []
+    for (thread, stack), (count, _) in sorted(session.stacks.items(), key=lambda kv: -kv[1][0]):
+        frames = ";".join(_frame_name(f).replace(";", ",") for f in stack)
+        lines.append(f"{thread};{frames} {int(count)}")
+    return "\n".join(lines) + "\n"
+
+
+def to_speedscope(session: _Session, name: str) -> Dict[str, Any]:
+    """Format speedscope "sampled": un profil par thread, poids = secondes entre échantillons."""
+    frames: List[dict] = []
+    index: Dict[Frame, int] = {}
+    by_thread: Dict[str, dict] = {}
+    for (thread, stack), (_, seconds) in session.stacks.items():
+        ids = []
+        for f in stack:
+            if f not in index:
+                index[f] = len(frames)
+                frames.append({"name": f[0], "file": f[1], "line": f[2]})
+            ids.append(index[f])
+        prof = by_thread.setdefault(thread, {
+            "type": "sampled", "name": thread, "unit": "seconds", "startValue": 0, "endValue": 0.0,
+            "samples": [], "weights": [],
+        })
+        prof["samples"].append(ids)
+        prof["weights"].append(round(seconds, 6))
+        prof["endValue"] = round(prof["endValue"] + seconds, 6)
+    profiles = sorted(by_thread.values(), key=lambda p: -p["endValue"])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "prospect-profiler",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+# --- stockage
+
+def _path(profile_id: str, suffix: str) -> str:
+    return os.path.join(PROFILE_DIR, profile_id + suffix)
+
+
+def _create(path: str):
+    """Fichier neuf en 0600 (jamais à travers un lien symbolique)."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+    return open(fd, "w", encoding="utf-8")
+
+
+def save_profile(session: _Session, meta: Dict[str, Any]) -> str:
+    private_dir(PROFILE_DIR)
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}"
+    title = f"{meta['method']} {meta['path']} {meta['duration_ms']}ms"
+    with _create(_path(profile_id, PROFILE_FORMATS["speedscope"])) as fh:
+        json.dump(to_speedscope(session, title), fh, separators=(",", ":"))
+    with _create(_path(profile_id, PROFILE_FORMATS["collapsed"])) as fh:
+        fh.write(to_collapsed(session))
+    with _create(_path(profile_id, ".meta.json")) as fh:
+        json.dump({"id": profile_id, **meta}, fh, ensure_ascii=False)
+    _prune()
+    return profile_id
+
+
+def _prune() -> None:
+    metas = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".meta.json"))
+    for f in metas[:max(0, len(metas) - PROFILE_MAX_FILES)]:
+        pid = f[:-len(".meta.json")]
+        for suffix in (*PROFILE_FORMATS.values(), ".meta.json"):
+            try:
+                os.remove(_path(pid, suffix))
+            except OSError:
+                pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Profils enregistrés, du plus récent au plus ancien."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for f in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not f.endswith(".meta.json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, f), encoding="utf-8") as fh:
+                out.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_path(profile_id: str, fmt: str = "speedscope") -> Optional[str]:
+    """Chemin du fichier (None si inconnu); l'id est validé (pas de traversée de répertoire)."""
+    if fmt not in PROFILE_FORMATS:
+        raise ValueError(f"format invalide: '{fmt}' (attendu: {', '.join(PROFILE_FORMATS)})")
+    if not _ID_RE.match(profile_id or ""):
+        return None
+    path = _path(profile_id, PROFILE_FORMATS[fmt])
+    return path if os.path.exists(path) else None
+
+
+def admin_allowed(request) -> bool:
+    # les meta.json gardent les query strings brutes: jamais d'accès sans token configuré
+    if ADMIN_TOKEN is None:
+        return False
+    given = request.headers.get("x-admin-token") or ""
+    return hmac.compare_digest(given.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+# --- middleware HTTP (installé seulement si PROSPECT_PROFILING=1)
+
+def _requested(request) -> bool:
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return flag in ("1", "true", "yes") and admin_allowed(request)
+
+
+async def profiling_middleware(request, call_next):
+    explicit = _requested(request)
+    auto = PROFILE_SLOW_MS > 0 and not request.url.path.startswith(_SKIP_PREFIXES)
+    if not (explicit or auto):
+        return await call_next(request)
+
+    session = _Session()
+    SAMPLER.attach(session)
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    response = None
+    try:
+        response = await call_next(request)
+        return response
+    finally:
+        SAMPLER.detach(session)
+        duration_ms = round((time.perf_counter() - t0) * 1000, 1)
+        if explicit or duration_ms >= PROFILE_SLOW_MS:
+            meta = {
+                "method": request.method,
+                "path": request.url.path,
+                "query": str(request.url.query),
+                "status": response.status_code if response is not None else 500,
+                "duration_ms": duration_ms,
+                "cpu_seconds": round(time.process_time() - cpu0, 3),  # process entier
+                "samples": session.samples,
+                "trigger": "request" if explicit else "slow",
+                "created_at": time.time(),
+            }
+            profile_id = await run_in_threadpool(save_profile, session, meta)
+            if response is not None:
+                response.headers["X-Profile-Id"] = profile_id
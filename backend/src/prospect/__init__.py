@@ -0,0 +1,18 @@
+"""
+Sources de prospects.
+Chaque provider implémente `Provider.search(spec, deadline)` et est enregistré ici.
+"""
+from .base import Provider, SearchSpec, register_provider, get_provider, provider_names
+from .open_street_map.provider import OsmProvider
+from .fixture.provider import FixtureProvider
+
+register_provider(OsmProvider())
+register_provider(FixtureProvider())
+
+__all__ = [
+    "Provider",
+    "SearchSpec",
+    "register_provider",
+    "get_provider",
+    "provider_names",
+]
@@ -0,0 +1,75 @@
+"""
+Interface commune des sources de prospects (OSM, fixture, puis Facebook/LinkedIn…)
+et registre des providers disponibles.
+"""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, FrozenSet, Iterator, Optional, Tuple
+
+
+@dataclass
+class SearchSpec:
+    """Paramètres d'une recherche, indépendants de la source."""
+    where: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    radius_km: Optional[float] = None
+    radius_min_km: Optional[float] = None
+    tags: Optional[str] = None
+    limit: int = 20
+    # filtres déjà résolus (service.tags), équivalents à `tags`: évite un re-parsing côté provider
+    filters: Optional[Tuple[Dict[str, str], ...]] = None
+    # champs optionnels à construire (service.fields); None = tous
+    fields: Optional[FrozenSet[str]] = None
+    # True: tous les candidats de la recherche upstream, `limit` ne fait que la dimensionner
+    # (tri sort=score côté controller, qui tronque ensuite)
+    candidates: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["fields"] = sorted(self.fields) if self.fields is not None else None
+        d.pop("filters")
+        d.pop("candidates")
+        return d
+
+
+class Provider(ABC):
+    """
+    Une source de prospects.
+
+    `search()` est un générateur: il yield les prospects (format commun, cf. osm._parse_elements)
+    au fur et à mesure, et peut `return` un dict meta (centre, bbox, timings…). Un provider qui
+    obtient ses résultats d'un bloc (un appel upstream) yield la liste entière: elle est gardée
+    telle quelle, même si l'échéance tombe juste après l'appel.
+    `deadline` est une échéance absolue `time.perf_counter()` (None = pas de limite):
+    le controller arrête de consommer le générateur une fois l'échéance passée.
+    """
+    name: str = ""
+    timeout: float = 30.0  # secondes, budget par défaut de ce provider
+
+    @abstractmethod
+    def search(self, spec: SearchSpec, deadline: Optional[float]) -> Iterator[dict]:
+        raise NotImplementedError
+
+
+_PROVIDERS: Dict[str, Provider] = {}
+
+
+def register_provider(provider: Provider) -> Provider:
+    if not provider.name:
+        raise ValueError("Provider sans nom.")
+    _PROVIDERS[provider.name] = provider
+    return provider
+
+
+def get_provider(name: str) -> Provider:
+    p = _PROVIDERS.get((name or "").strip().lower())
+    if p is None:
+        raise ValueError(f"Provider inconnu: '{name}' (disponibles: {', '.join(sorted(_PROVIDERS))})")
+    return p
+
+
+def provider_names() -> list[str]:
+    return sorted(_PROVIDERS)
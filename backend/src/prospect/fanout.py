@@ -0,0 +1,139 @@
+"""
+Fan-out d'une recherche vers plusieurs providers en parallèle, chacun avec sa propre échéance.
+Un provider lent ne bloque pas la réponse: on renvoie ce qu'il a déjà produit (statut "timeout").
+"""
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from threading import Event, Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from src import metrics
+from .base import SearchSpec, get_provider, provider_names
+
+
+DEFAULT_PROVIDERS = os.getenv("PROSPECT_PROVIDERS", "osm")
+# requêtes sync servies en parallèle (limiteur anyio par défaut de Starlette: 40 threads)
+SERVER_THREADS = int(os.getenv("PROSPECT_SERVER_THREADS", "40"))
+# 0 = une place par requête concurrente et par provider: un job n'attend jamais dans la file
+PROVIDER_WORKERS = int(os.getenv("PROSPECT_PROVIDER_WORKERS", "0"))
+
+# pool partagé (multi-providers): un provider en retard continue en arrière-plan sans bloquer la requête
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            workers = PROVIDER_WORKERS or SERVER_THREADS * max(1, len(provider_names()))
+            _EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="provider")
+        return _EXECUTOR
+
+
+def parse_provider_names(value: Optional[str]) -> List[str]:
+    names = [n.strip().lower() for n in (value or DEFAULT_PROVIDERS).split(",") if n.strip()]
+    names = list(dict.fromkeys(names))
+    for n in names:
+        get_provider(n)  # ValueError si inconnu
+    if not names:
+        raise ValueError("Aucun provider activé.")
+    return names
+
+
+def _drain(name: str, spec: SearchSpec, deadline: Optional[float], sink: list, cancel: Event, state: dict) -> Dict[str, Any]:
+    """
+    Consomme le générateur du provider dans `sink`; retourne son meta (valeur de `return`).
+    L'échéance n'est vérifiée qu'avant de demander l'item suivant; un lot (liste) déjà produit est gardé
+    en entier, et le générateur qui l'a produit va jusqu'à son `return` (meta) sans nouvelle vérification.
+    """
+    t0 = time.perf_counter()
+    gen = get_provider(name).search(spec, deadline)
+    batched = False
+    try:
+        with metrics.stage(f"provider:{name}"):
+            while True:
+                if cancel.is_set():
+                    gen.close()
+                    return {}
+                if not batched and deadline is not None and time.perf_counter() >= deadline:
+                    # échéance atteinte entre deux prospects: résultats partiels
+                    gen.close()
+                    state["timed_out"] = True
+                    return {}
+                item = next(gen)
+                if isinstance(item, list):
+                    batched = True
+                    sink.extend(item)
+                else:
+                    sink.append(item)
+    except StopIteration as stop:
+        return stop.value or {}
+    finally:
+        state["seconds"] = round(time.perf_counter() - t0, 3)
+
+
+def run_providers(
+    spec: SearchSpec,
+    names: List[str],
+    deadline: Optional[float] = None,
+) -> Tuple[Dict[str, List[dict]], Dict[str, Dict[str, Any]], Dict[str, Any]]:
+    """
+    Lance chaque provider dans le pool partagé; deadline provider = min(deadline globale, t0 + provider.timeout).
+    Un seul provider: exécuté dans le thread de la requête (pas de file, il respecte sa deadline lui-même).
+    Retourne (résultats par provider, statut par provider, meta du premier provider OK).
+    """
+    t0 = time.perf_counter()
+    jobs = []
+    for name in names:
+        p_deadline = t0 + get_provider(name).timeout
+        if deadline is not None:
+            p_deadline = min(p_deadline, deadline)
+        sink: list = []
+        cancel = Event()
+        state: dict = {}
+        if len(names) == 1:
+            fut: Future = Future()
+            try:
+                fut.set_result(_drain(name, spec, p_deadline, sink, cancel, state))
+            except Exception as e:
+                fut.set_exception(e)
+        else:
+            fut = _executor().submit(_drain, name, spec, p_deadline, sink, cancel, state)
+        jobs.append((p_deadline, name, fut, sink, cancel, state))
+
+    results: Dict[str, List[dict]] = {}
+    status: Dict[str, Dict[str, Any]] = {}
+    metas: Dict[str, Dict[str, Any]] = {}
+    errors: List[Exception] = []
+
+    # attente par échéance croissante: chaque provider a tout son budget
+    for p_deadline, name, fut, sink, cancel, state in sorted(jobs, key=lambda j: j[0]):
+        st: Dict[str, Any] = {"status": "ok"}
+        try:
+            metas[name] = fut.result(timeout=max(0.0, p_deadline - time.perf_counter()))
+            if state.get("timed_out"):
+                st = {"status": "timeout"}
+        except FutureTimeout:
+            cancel.set()
+            st = {"status": "timeout"}
+        except (ValueError, RuntimeError) as e:
+            errors.append(e)
+            st = {"status": "error", "error": str(e)}
+        # copie: un provider en timeout peut encore écrire dans sink
+        results[name] = list(sink)
+        st["count"] = len(results[name])
+        st["seconds"] = state.get("seconds", round(time.perf_counter() - t0, 3))
+        status[name] = st
+
+    # tous en erreur: on remonte la première (400/503 comme avant)
+    if errors and len(errors) == len(names):
+        raise errors[0]
+
+    meta: Dict[str, Any] = {}
+    for name in names:
+        if name in metas:
+            meta = metas[name]
+            break
+    return results, status, meta
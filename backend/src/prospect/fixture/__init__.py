@@ -0,0 +1,4 @@
+"""Provider local (fichier JSON) pour les tests et benchmarks, sans appel réseau."""
+from .provider import FixtureProvider
+
+__all__ = ["FixtureProvider"]
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+from threading import Lock
+from typing import Iterator, Optional
+
+from src.prospect.base import Provider, SearchSpec
+from src.prospect.open_street_map.osm import _haversine_km, _matches_filters, _parse_tags
+from src.service.fields import project
+
+
+FIXTURE_PATH = os.getenv("PROSPECT_FIXTURE_PATH") or os.path.join(os.path.dirname(__file__), "sample.json")
+# délai simulé par prospect (tests de deadline / résultats partiels)
+FIXTURE_DELAY = float(os.getenv("PROSPECT_FIXTURE_DELAY", "0"))
+
+
+class FixtureProvider(Provider):
+    """
+    Lit une liste de prospects (format commun) depuis PROSPECT_FIXTURE_PATH.
+    Filtres: tags (sur raw_tags), rayon autour de lat/lon, ou ville/adresse contenant `where`.
+    """
+    name = "fixture"
+    timeout = float(os.getenv("PROSPECT_FIXTURE_TIMEOUT", "10"))
+
+    def __init__(self, path: Optional[str] = None, delay: Optional[float] = None):
+        self.path = path or FIXTURE_PATH
+        self.delay = FIXTURE_DELAY if delay is None else delay
+        self._data: Optional[list[dict]] = None
+        self._lock = Lock()
+
+    def _load(self) -> list[dict]:
+        with self._lock:
+            if self._data is None:
+                if not self.path or not os.path.exists(self.path):
+                    raise RuntimeError(f"Fixture introuvable: '{self.path}' (PROSPECT_FIXTURE_PATH)")
+                with open(self.path, encoding="utf-8") as fh:
+                    data = json.load(fh)
+                self._data = data.get("results", data) if isinstance(data, dict) else data
+            return self._data
+
+    def search(self, spec: SearchSpec, deadline: Optional[float]) -> Iterator[dict]:
+        t0 = time.perf_counter()
+        filters = spec.filters or (_parse_tags(spec.tags) if spec.tags else None)
+        where = (spec.where or "").strip().lower()
+        has_point = spec.lat is not None and spec.lon is not None
+
+        n = 0
+        for p in self._load():
+            if n >= spec.limit and not spec.candidates:
+                break
+            if filters and not _matches_filters(p.get("raw_tags") or {}, filters):
+                continue
+            if has_point and spec.radius_km:
+                d = _haversine_km(spec.lat, spec.lon, float(p["lat"]), float(p["lon"]))
+                if d > spec.radius_km or (spec.radius_min_km and d <= spec.radius_min_km):
+                    continue
+            elif where and not has_point:
+                addr = p.get("adresse") or {}
+                hay = " ".join(str(addr.get(k) or "") for k in ("full", "city", "street")).lower()
+                if where not in hay:
+                    continue
+            if self.delay:
+                time.sleep(self.delay)
+            n += 1
+            yield project([dict(p, source=p.get("source") or "fixture")], spec.fields)[0]
+
+        return {
+            "where": spec.where,
+            "lat": spec.lat,
+            "lon": spec.lon,
+            "tags": spec.tags,
+            "timings": {"provider_total_seconds": round(time.perf_counter() - t0, 3)},
+        }
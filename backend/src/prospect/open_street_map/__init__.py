@@ -1,4 +1,4 @@
 """Module pour récupérer des prospects depuis OpenStreetMap."""
-from .osm import get_prospects
+from .osm import get_prospects, get_prospects_batch
 
-__all__ = ["get_prospects"]
+__all__ = ["get_prospects", "get_prospects_batch"]
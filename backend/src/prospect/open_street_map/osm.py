@@ -1,20 +1,32 @@
 from __future__ import annotations
 
+import codecs
 import json
 import math
 import os
 import random
 import re
 import time
-from threading import Lock
-from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import requests
 
+from src import metrics
+from src.deadline import clamp_timeout, expired, remaining
+from src.service.cache import TTLCache
+from src.service.fields import FIELD_GROUPS, project, wants
+from src.service.phones import dedupe_phones, phone_keys, region_from_country
+from src.service.ratelimit import IntervalLimiter
+
 
 # --- Endpoints (1 Overpass)
 OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
 NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+NOMINATIM_REVERSE_URL = os.getenv("NOMINATIM_REVERSE_URL", NOMINATIM_URL.rsplit("/", 1)[0] + "/reverse")
+NOMINATIM_LOOKUP_URL = os.getenv("NOMINATIM_LOOKUP_URL", NOMINATIM_URL.rsplit("/", 1)[0] + "/lookup")
+NOMINATIM_LOOKUP_MAX_IDS = 50  # limite de /lookup par requête
 
 CONTACT_EMAIL = os.getenv("OSM_CONTACT_EMAIL", "randriamanjakacedric@gmail.com")
 USER_AGENT = os.getenv("OSM_USER_AGENT", f"prospecting/1.0 (contact: {CONTACT_EMAIL})")
@@ -24,46 +36,39 @@ DEFAULT_POI_KEYS = ["amenity", "shop", "tourism", "leisure", "office", "craft",
 
 # Gardes-fous anti-overpass
 MAX_RADIUS_KM = float(os.getenv("OSM_MAX_RADIUS_KM", "25"))
-MAX_LIMIT = 200
+MAX_LIMIT = 1000  # snapshots paginés; sans pagination le controller borne à 200
+
+# Deadline: on ne relance pas une tentative Overpass avec moins que ça
+MIN_OVERPASS_ATTEMPT_SECONDS = float(os.getenv("OSM_MIN_OVERPASS_ATTEMPT_SECONDS", "3"))
+
+# Batch: nb de requêtes Overpass simultanées (Overpass public ≈ 2 slots / IP)
+BATCH_CONCURRENCY = int(os.getenv("OSM_BATCH_CONCURRENCY", "2"))
 
 _SAFE_KEY_RE = re.compile(r"^[A-Za-z0-9:_-]+$")
 
 # Cache geocode
-_CACHE: dict[str, tuple[float, dict]] = {}
-_CACHE_LOCK = Lock()
 CACHE_TTL = int(os.getenv("OSM_GEOCODE_CACHE_TTL", "86400"))  # 24h
+_GEOCODE_CACHE = TTLCache("geocode", CACHE_TTL)
 
-# Rate limit Nominatim (≈1 req/s)
-_LAST_NOMINATIM = 0.0
-_NOMINATIM_LOCK = Lock()
-
+# Cache Overpass (éléments bruts par requête, hors [timeout:N])
+OVERPASS_CACHE_TTL = int(os.getenv("OSM_OVERPASS_CACHE_TTL", "3600"))
+OVERPASS_CACHE_MAX = int(os.getenv("OSM_OVERPASS_CACHE_MAX", "256"))
+_OVERPASS_CACHE = TTLCache("overpass", OVERPASS_CACHE_TTL, max_items=OVERPASS_CACHE_MAX)
+# Lecture en flux des grosses réponses: au-delà de OSM_OVERPASS_STREAM_MIN_BYTES, éléments décodés
+# un à un (corps brut et JSON complet jamais en mémoire, réponse non mise en cache); en dessous,
+# décodage complet et cache comme sans flux. 1 Mo ≈ 2 600 éléments (`out center`, tags complets):
+# une recherche à limit ≤ 200 (fetch ≤ 600) reste en cache, un export de 10 000 éléments passe en flux
+OVERPASS_STREAM = os.getenv("OSM_OVERPASS_STREAM", "1") in ("1", "true", "yes")
+OVERPASS_STREAM_MIN_BYTES = int(os.getenv("OSM_OVERPASS_STREAM_MIN_BYTES", str(1024 * 1024)))
+_STREAM_CHUNK = 64 * 1024
+_TIMEOUT_RE = re.compile(r"\[timeout:\d+\]")
 
-def _rate_limit_nominatim(min_interval: float = 1.0) -> None:
-    global _LAST_NOMINATIM
-    with _NOMINATIM_LOCK:
-        now = time.time()
-        wait = min_interval - (now - _LAST_NOMINATIM)
-        if wait > 0:
-            time.sleep(wait)
-        _LAST_NOMINATIM = time.time()
+# Rate limit Nominatim: ≈1 req/s pour l'ensemble des workers (cf. service.ratelimit)
+_NOMINATIM_LIMITER = IntervalLimiter("nominatim", 1.0)
 
 
-def _cache_get(key: str) -> Optional[dict]:
-    now = time.time()
-    with _CACHE_LOCK:
-        it = _CACHE.get(key)
-        if not it:
-            return None
-        exp, val = it
-        if exp <= now:
-            _CACHE.pop(key, None)
-            return None
-        return val
-
-
-def _cache_set(key: str, val: dict) -> None:
-    with _CACHE_LOCK:
-        _CACHE[key] = (time.time() + CACHE_TTL, val)
+def _rate_limit_nominatim(min_interval: float = 1.0, deadline: Optional[float] = None) -> None:
+    _NOMINATIM_LIMITER.wait(deadline, min_interval=min_interval)
 
 
 def _escape_ql_string(s: str) -> str:
@@ -101,34 +106,45 @@ def _bbox_around(lat: float, lon: float, radius_km: float) -> tuple[float, float
     return south, west, north, east
 
 
-def _geocode(where: str, session: requests.Session) -> dict:
-    q = (where or "").strip()
-    if len(q) < 2:
-        raise ValueError("where trop court")
-
-    key = q.lower()
-    cached = _cache_get(key)
-    if cached:
-        return {**cached, "cache_hit": True}
-
-    _rate_limit_nominatim(1.0)
-
+def _nominatim_get(url: str, params: dict, session: requests.Session, deadline: Optional[float], what: str):
+    """GET Nominatim sous le rate limit partagé; JSON décodé."""
+    _rate_limit_nominatim(1.0, deadline)
+    timeout = clamp_timeout(20, deadline, f"le {what} Nominatim")
     headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
-    params = {"format": "jsonv2", "limit": 1, "q": q, "email": CONTACT_EMAIL, "addressdetails": 1}
-
+    params = {"format": "jsonv2", "email": CONTACT_EMAIL, "addressdetails": 1, **params}
     try:
-        r = session.get(NOMINATIM_URL, params=params, headers=headers, timeout=20)
+        with metrics.UPSTREAM_INFLIGHT.track(upstream="nominatim"):
+            r = session.get(url, params=params, headers=headers, timeout=timeout)
     except requests.exceptions.Timeout:
-        raise RuntimeError("Timeout Nominatim (geocoding).")
+        raise RuntimeError(f"Timeout Nominatim ({what}).")
     except requests.exceptions.RequestException as e:
         raise RuntimeError(f"Erreur réseau Nominatim: {e}")
 
     if r.status_code == 429:
+        metrics.UPSTREAM_RATE_LIMITED.inc(upstream="nominatim")
         raise RuntimeError("Nominatim rate limit (429). Réessaye plus tard.")
     if r.status_code >= 400:
         raise RuntimeError(f"Nominatim HTTP {r.status_code}: {r.text[:200]}")
+    return r.json()
+
+
+def _geocode(
+    where: str,
+    session: requests.Session,
+    deadline: Optional[float] = None,
+    refresh: bool = False,
+) -> dict:
+    """refresh: ignore le cache (prewarm) mais le met à jour."""
+    q = (where or "").strip()
+    if len(q) < 2:
+        raise ValueError("where trop court")
+
+    key = q.lower()
+    cached = None if refresh else _GEOCODE_CACHE.get(key)
+    if cached:
+        return {**cached, "cache_hit": True}
 
-    data = r.json()
+    data = _nominatim_get(NOMINATIM_URL, {"limit": 1, "q": q}, session, deadline, "geocoding")
     if not data:
         raise ValueError(f"Lieu introuvable: '{q}'")
 
@@ -139,9 +155,10 @@ def _geocode(where: str, session: requests.Session) -> dict:
         "lat": float(it["lat"]),
         "lon": float(it["lon"]),
         "bbox": [south, west, north, east],
+        "country_code": ((it.get("address") or {}).get("country_code") or "").upper() or None,
     }
 
-    _cache_set(key, out)
+    _GEOCODE_CACHE.set(key, out)
     return {**out, "cache_hit": False}
 
 
@@ -182,34 +199,241 @@ def _parse_tags(tags: Optional[str]) -> list[dict]:
     return out or [{"type": "key_exists", "key": k} for k in DEFAULT_POI_KEYS]
 
 
-def _build_overpass_query(filters: list[dict], south: float, west: float, north: float, east: float, fetch_limit: int) -> str:
+def _build_overpass_query(
+    filters: list[dict],
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    fetch_limit: Optional[int],
+    server_timeout: int = 25,
+    since: Optional[str] = None,
+    ids_only: bool = False,
+) -> str:
+    """
+    since (ISO 8601 UTC): sync incrémental, seulement les éléments modifiés depuis `since`,
+    nommés ou non (un nom supprimé = prospect retiré). ids_only: `out ids` (réconciliation).
+    fetch_limit None = pas de limite.
+    """
     bbox = f"({south},{west},{north},{east})"
+    body = "\n  ".join(_filter_statements(filters, bbox, since))
+    out = "ids" if ids_only else "center"
+    if fetch_limit:
+        out += f" {int(fetch_limit)}"
+
+    return f"""[out:json][timeout:{int(server_timeout)}];
+(
+  {body}
+);
+out {out};
+"""
+
+
+def _filter_statements(filters: list[dict], bbox: str, since: Optional[str] = None) -> list[str]:
+    named = "" if since else '["name"]'
+    newer = f'(newer:"{since}")' if since else ""
     lines: list[str] = []
 
     for f in filters:
         if f["type"] == "kv":
             k = f["key"]
             v = _escape_ql_string(f["value"])
-            lines.append(f'nwr["{k}"="{v}"]["name"]{bbox};')
+            lines.append(f'nwr["{k}"="{v}"]{named}{newer}{bbox};')
         elif f["type"] == "key_exists":
             k = f["key"]
-            lines.append(f'nwr["{k}"]["name"]{bbox};')
+            lines.append(f'nwr["{k}"]{named}{newer}{bbox};')
         elif f["type"] == "value_only":
             v = _escape_ql_string(f["value"])
             for k in DEFAULT_POI_KEYS:
-                lines.append(f'nwr["{k}"="{v}"]["name"]{bbox};')
+                lines.append(f'nwr["{k}"="{v}"]{named}{newer}{bbox};')
+    return lines
+
+
+def _build_overpass_group_query(
+    parts: list[Tuple[list[dict], int]],
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    server_timeout: int = 25,
+) -> str:
+    """
+    Batch: une requête pour plusieurs specs d'un même bbox, mais une sortie par spec
+    (`(...)->.sN; .sN out center <limite>;`): une catégorie dense ne consomme pas la limite
+    d'une catégorie rare. Un élément qui correspond à plusieurs specs sort plusieurs fois
+    (dédupliqué au parse).
+    """
+    bbox = f"({south},{west},{north},{east})"
+    blocks = []
+    for n, (filters, fetch_limit) in enumerate(parts):
+        body = "\n  ".join(_filter_statements(filters, bbox))
+        blocks.append(f"(\n  {body}\n)->.s{n};\n.s{n} out center {int(fetch_limit)};")
+    return f"[out:json][timeout:{int(server_timeout)}];\n" + "\n".join(blocks) + "\n"
 
-    body = "\n  ".join(lines)
 
-    return f"""[out:json][timeout:25];
-(
-  {body}
-);
-out center {int(fetch_limit)};
-"""
+def _overpass_server_timeout(deadline: Optional[float]) -> int:
+    """[timeout:N] côté Overpass: 25s max, moins s'il reste moins de temps."""
+    left = remaining(deadline)
+    return 25 if left is None else max(1, min(25, int(left)))
+
+
+_WS_RE = re.compile(r"[ \t\n\r]*")
+_NUMBER_END_RE = re.compile(r"[,\]}\s]")
+
+
+class _JsonStream:
+    """Tampon de texte sur un flux d'octets UTF-8; décode une valeur JSON à la fois (raw_decode)."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        # json.loads partage les clés identiques d'un document; raw_decode oublie ce memo à chaque
+        # valeur: sans lui chaque élément garderait ses propres copies ("name", "amenity", …)
+        keys: Dict[str, str] = {}
+        self._json_decoder = json.JSONDecoder(
+            object_pairs_hook=lambda pairs: {keys.setdefault(k, k): v for k, v in pairs}
+        )
+
+    def _fill(self) -> bool:
+        """Ajoute le morceau suivant (la partie déjà lue est jetée); False en fin de flux."""
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+        text = self._decoder.decode(chunk or b"", final=chunk is None)
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self._pos = _WS_RE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise json.JSONDecodeError("fin de flux inattendue", self._buf, self._pos)
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if ch not in chars:
+            raise json.JSONDecodeError(f"attendu l'un de {chars!r}", self._buf, self._pos)
+        self._pos += 1
+        return ch
+
+    def value(self) -> Any:
+        if self.peek() in "-0123456789":
+            # un nombre coupé par la fin du tampon se décoderait tronqué ("0." -> 0): attendre sa fin
+            while not _NUMBER_END_RE.search(self._buf, self._pos) and self._fill():
+                pass
+        while True:
+            try:
+                val, end = self._json_decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # valeur coupée par la fin du tampon (ou JSON invalide: erreur en fin de flux)
+                if not self._fill():
+                    raise
+                continue
+            self._pos = end
+            return val
 
 
-def _overpass_request(query: str, session: requests.Session) -> dict:
+def _iter_overpass_elements(chunks: Iterable[bytes], header: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Parse incrémental d'une réponse Overpass JSON: yield chaque élément de `elements` dès qu'il
+    est complet. Les autres clés de premier niveau (version, osm3s, remark…) vont dans `header`.
+    En mémoire: le morceau en cours et l'élément en cours de décodage seulement.
+    """
+    stream = _JsonStream(chunks)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "elements":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            val = stream.value()
+            if header is not None:
+                header[key] = val
+        if stream.expect(",}") == "}":
+            return
+
+
+def _replay(head: deque, rest: Iterator[bytes]) -> Iterator[bytes]:
+    """Morceaux déjà lus puis la suite; chaque morceau est libéré une fois rendu."""
+    while head:
+        yield head.popleft()
+    yield from rest
+
+
+def _consume_overpass_stream(
+    r, consume: Callable[[Iterator[dict]], Any], cache_key: Optional[str], header: dict
+) -> Any:
+    """
+    Lit le corps jusqu'à OSM_OVERPASS_STREAM_MIN_BYTES: réponse complète => décodée d'un bloc et mise
+    en cache (si cache_key); sinon `consume` reçoit les éléments au fil du téléchargement, sans copie
+    ni cache. `header` reçoit les clés de premier niveau hors `elements` (osm3s…).
+    """
+    chunks = r.iter_content(chunk_size=_STREAM_CHUNK)
+    try:
+        head: deque = deque()
+        size = 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size > OVERPASS_STREAM_MIN_BYTES:
+                return consume(_iter_overpass_elements(_replay(head, chunks), header))
+        data = json.loads(b"".join(head))
+        head.clear()
+        if cache_key is not None:
+            _OVERPASS_CACHE.set(cache_key, data)
+        header.update((k, v) for k, v in data.items() if k != "elements")
+        return consume(iter(data.get("elements", [])))
+    finally:
+        r.close()
+
+
+def _overpass_request(
+    query: str,
+    session: requests.Session,
+    deadline: Optional[float] = None,
+    refresh: bool = False,
+    consume: Optional[Callable[[Iterator[dict]], Any]] = None,
+    header: Optional[dict] = None,
+    cache: bool = True,
+) -> Any:
+    """
+    POST Overpass avec retries + backoff exponentiel.
+    Avec une deadline: timeout par tentative = temps restant, et pas de nouvelle tentative
+    si le backoff + une tentative minimale ne tiennent plus dans le budget.
+    Réponses en cache (OSM_OVERPASS_CACHE_TTL) par requête hors [timeout:N]; refresh: ignore le cache
+    mais le met à jour (prewarm); cache=False: ni lecture ni écriture (sync, toujours frais et unique).
+    consume: `consume(éléments)` reçoit les éléments et son résultat est retourné à la place du JSON
+    (relancé à chaque tentative); lecture en flux au-delà de OSM_OVERPASS_STREAM_MIN_BYTES (sans cache).
+    header: avec consume, reçoit les clés de premier niveau de la réponse hors `elements`.
+    """
+    cache_key = _TIMEOUT_RE.sub("", query) if cache else None
+    header = {} if header is None else header
+    if cache_key is not None and not refresh:
+        cached = _OVERPASS_CACHE.get(cache_key)
+        if cached is not None:
+            if consume is None:
+                return cached
+            header.update((k, v) for k, v in cached.items() if k != "elements")
+            return consume(iter(cached.get("elements", [])))
+
     headers = {
         "User-Agent": USER_AGENT,
         "Accept": "application/json",
@@ -220,38 +444,52 @@ def _overpass_request(query: str, session: requests.Session) -> dict:
     attempts = 3
     backoff = 2.0
     last_err = None
+    tried = 0
 
     for i in range(attempts):
+        if i > 0:
+            pause = backoff + random.random()
+            backoff *= 2
+            if expired(deadline, margin=pause + MIN_OVERPASS_ATTEMPT_SECONDS):
+                last_err = f"{last_err} (deadline: plus de temps pour réessayer)"
+                break
+            metrics.sleep_backoff(pause, "overpass")
+            metrics.UPSTREAM_RETRIES.inc(upstream="overpass")
+
+        timeout = clamp_timeout(35, deadline, "la requête Overpass", minimum=1.0)
+        tried += 1
         try:
-            r = session.post(OVERPASS_URL, data={"data": query}, headers=headers, timeout=35)
+            with metrics.UPSTREAM_INFLIGHT.track(upstream="overpass"):
+                r = session.post(
+                    OVERPASS_URL, data={"data": query}, headers=headers, timeout=timeout, stream=consume is not None
+                )
             if r.status_code == 429:
+                metrics.UPSTREAM_RATE_LIMITED.inc(upstream="overpass")
                 last_err = "Overpass rate limit (429)"
-                time.sleep(backoff + random.random())
-                backoff *= 2
+                r.close()
                 continue
             if r.status_code >= 500:
                 last_err = f"Overpass HTTP {r.status_code}"
-                time.sleep(backoff + random.random())
-                backoff *= 2
+                r.close()
                 continue
             if r.status_code != 200:
                 raise RuntimeError(f"Overpass HTTP {r.status_code}: {r.text[:200]}")
-            return r.json()
+            if consume is not None:
+                header.clear()
+                return _consume_overpass_stream(r, consume, cache_key, header)
+            data = r.json()
+            if cache_key is not None:
+                _OVERPASS_CACHE.set(cache_key, data)
+            return data
         except requests.exceptions.Timeout:
             last_err = "Overpass timeout"
-            time.sleep(backoff + random.random())
-            backoff *= 2
         except json.JSONDecodeError:
             last_err = "Overpass JSON invalide"
-            time.sleep(backoff + random.random())
-            backoff *= 2
         except Exception as e:
             last_err = str(e)
-            time.sleep(backoff + random.random())
-            backoff *= 2
 
     raise RuntimeError(
-        f"Overpass indisponible sur {OVERPASS_URL} après {attempts} tentatives. "
+        f"Overpass indisponible sur {OVERPASS_URL} après {tried} tentative(s). "
         f"Cause probable: zone trop grande / filtre trop large. Dernière erreur: {last_err}. "
         f"Solution: réduire radius_km, ajouter category/tags, ou baisser limit."
     )
@@ -285,11 +523,84 @@ EXTRA_KEYS = [
     "addr:full"
 ]
 
-def _parse_elements(data: dict) -> list[dict]:
+def _nominatim_address(address: Optional[dict]) -> dict:
+    """Bloc `address` Nominatim -> champs de `adresse` (sans numéro: partagé entre voisins)."""
+    a = address or {}
+    return {
+        "street": a.get("road") or a.get("pedestrian") or a.get("footway") or a.get("square"),
+        "postcode": a.get("postcode"),
+        "city": a.get("city") or a.get("town") or a.get("village") or a.get("municipality"),
+        "country": (a.get("country_code") or "").upper() or None,
+    }
+
+
+def _reverse_geocode(
+    lat: float,
+    lon: float,
+    session: requests.Session,
+    deadline: Optional[float] = None,
+) -> Optional[dict]:
+    """Adresse la plus proche d'un point (zoom 18 = bâtiment); None si rien."""
+    data = _nominatim_get(
+        NOMINATIM_REVERSE_URL, {"lat": lat, "lon": lon, "zoom": 18}, session, deadline, "reverse geocoding"
+    )
+    if not isinstance(data, dict) or data.get("error") or not data.get("address"):
+        return None
+    return _nominatim_address(data["address"])
+
+
+def _lookup_addresses(
+    entity_keys: Sequence[str],
+    session: requests.Session,
+    deadline: Optional[float] = None,
+) -> Dict[str, dict]:
+    """
+    Adresses calculées par Nominatim pour des éléments OSM (`osm:<type>:<id>`), une requête
+    /lookup par lot de NOMINATIM_LOOKUP_MAX_IDS. Les éléments inconnus de Nominatim sont absents.
+    """
+    prefixes = {"node": "N", "way": "W", "relation": "R"}
+    ids = {}
+    for key in entity_keys:
+        parts = key.split(":")
+        if len(parts) == 3 and parts[0] == "osm" and parts[1] in prefixes:
+            ids[f"{prefixes[parts[1]]}{parts[2]}"] = key
+
+    out: Dict[str, dict] = {}
+    batch = list(ids)
+    for i in range(0, len(batch), NOMINATIM_LOOKUP_MAX_IDS):
+        chunk = batch[i:i + NOMINATIM_LOOKUP_MAX_IDS]
+        data = _nominatim_get(NOMINATIM_LOOKUP_URL, {"osm_ids": ",".join(chunk)}, session, deadline, "lookup")
+        for it in data or []:
+            osm_id = f"{prefixes.get(it.get('osm_type'), '?')}{it.get('osm_id')}"
+            if osm_id in ids and it.get("address"):
+                out[ids[osm_id]] = _nominatim_address(it["address"])
+    return out
+
+
+def _parse_elements(
+    data: dict | Iterable[dict],
+    region: Optional[str] = None,
+    fields: Optional[frozenset] = None,
+) -> list[dict]:
+    """
+    data: réponse Overpass, ou itérable d'éléments (lecture en flux: chaque élément brut est
+    libéré dès qu'il est converti).
+    region: pays par défaut (ISO-2, ex: geocoding) pour normaliser les téléphones
+    quand l'élément n'a pas de addr:country.
+    fields: champs optionnels à construire (cf. service.fields); None = tous.
+    """
     out = []
     seen = set()
 
-    for el in data.get("elements", []):
+    want_activity = wants(fields, "activite_type", "activite_valeur")
+    want_contacts = wants(fields, *FIELD_GROUPS["contacts"])
+    want_address = wants(fields, "adresse")
+    want_social = wants(fields, "contacts_social")
+    want_payment = wants(fields, "payment")
+    want_extras = wants(fields, "extras")
+
+    elements = data.get("elements", []) if isinstance(data, dict) else data
+    for el in elements:
         el_type = el.get("type", "node")
         el_id = el.get("id")
         if el_id is None:
@@ -310,118 +621,133 @@ def _parse_elements(data: dict) -> list[dict]:
         if lat is None or lon is None:
             continue
 
-        # activité (première clé connue)
-        activity_key = None
-        activity_value = None
-        for k in DEFAULT_POI_KEYS:
-            if tags.get(k):
-                activity_key = k
-                activity_value = tags.get(k)
-                break
-
-        website = (
-            tags.get("website")
-            or tags.get("contact:website")
-            or tags.get("url")
-            or tags.get("contact:url")
-        )
-
-        emails = []
-        for k in ["email", "contact:email", "contact:email_1", "contact:email_2"]:
-            emails += _split_multi(tags.get(k, ""))
-        emails = list(dict.fromkeys(emails))
-
-        phones = []
-        for k in ["phone", "contact:phone", "mobile", "contact:mobile", "fax", "contact:fax"]:
-            phones += _split_multi(tags.get(k, ""))
-        phones = list(dict.fromkeys(phones))
-
-        whatsapp = []
-        for k in ["whatsapp", "contact:whatsapp"]:
-            whatsapp += _split_multi(tags.get(k, ""))
-        whatsapp = list(dict.fromkeys(whatsapp))
-
-        address = {
-            "full": tags.get("addr:full"),
-            "housenumber": tags.get("addr:housenumber"),
-            "street": tags.get("addr:street"),
-            "postcode": tags.get("addr:postcode"),
-            "city": tags.get("addr:city") or tags.get("addr:city:fr"),
-            "country": tags.get("addr:country"),
+        item = {
+            "entity_key": entity_key,
+            "nom": name,
         }
 
-        # social contacts
-        contacts_social = {}
-        for k in SOCIAL_KEYS:
-            v = (tags.get(k) or "").strip()
-            if v:
-                contacts_social[k] = v
+        if want_activity:
+            # activité (première clé connue)
+            activity_key = None
+            activity_value = None
+            for k in DEFAULT_POI_KEYS:
+                if tags.get(k):
+                    activity_key = k
+                    activity_value = tags.get(k)
+                    break
+            item["activite_type"] = activity_key
+            item["activite_valeur"] = activity_value
+
+        if want_contacts:
+            website = (
+                tags.get("website")
+                or tags.get("contact:website")
+                or tags.get("url")
+                or tags.get("contact:url")
+            )
+
+            emails = []
+            for k in ["email", "contact:email", "contact:email_1", "contact:email_2"]:
+                emails += _split_multi(tags.get(k, ""))
+            emails = list(dict.fromkeys(emails))
+
+            # téléphones: dédoublonnés sur la forme E.164 (pays de l'élément, sinon celui de la recherche)
+            el_region = region_from_country(tags.get("addr:country")) or region
+
+            phones = []
+            for k in ["phone", "contact:phone", "mobile", "contact:mobile", "fax", "contact:fax"]:
+                phones += _split_multi(tags.get(k, ""))
+            phones = dedupe_phones(phones, el_region)
+
+            whatsapp = []
+            for k in ["whatsapp", "contact:whatsapp"]:
+                whatsapp += _split_multi(tags.get(k, ""))
+            whatsapp = dedupe_phones(whatsapp, el_region)
+
+            item["site"] = website
+            item["emails"] = emails
+            item["telephones"] = phones
+            item["whatsapp"] = whatsapp
+            item["phone_keys"] = phone_keys(phones + whatsapp, el_region)
+
+        if want_address:
+            item["adresse"] = {
+                "full": tags.get("addr:full"),
+                "housenumber": tags.get("addr:housenumber"),
+                "street": tags.get("addr:street"),
+                "postcode": tags.get("addr:postcode"),
+                "city": tags.get("addr:city") or tags.get("addr:city:fr"),
+                "country": tags.get("addr:country"),
+            }
+
+        # champs “business”
+        if wants(fields, "etoiles"):
+            item["etoiles"] = tags.get("stars") or tags.get("hotel:stars")
+        if wants(fields, "cuisine"):
+            item["cuisine"] = tags.get("cuisine")
+        if wants(fields, "horaires"):
+            item["horaires"] = tags.get("opening_hours")
+        if wants(fields, "operateur"):
+            item["operateur"] = tags.get("operator")
+        if wants(fields, "marque"):
+            item["marque"] = tags.get("brand")
 
-        # extras whitelist (pratique)
-        extras = {}
-        for k in EXTRA_KEYS:
-            v = tags.get(k)
-            if v is not None and str(v).strip() != "":
-                extras[k] = v
+        # social contacts
+        if want_social:
+            contacts_social = {}
+            for k in SOCIAL_KEYS:
+                v = (tags.get(k) or "").strip()
+                if v:
+                    contacts_social[k] = v
+            item["contacts_social"] = contacts_social
 
         # payment:* (ex: payment:visa=yes)
-        payment = {}
-        for k, v in tags.items():
-            if isinstance(k, str) and k.startswith("payment:"):
-                if v is not None and str(v).strip() != "":
-                    payment[k] = v
-
-        out.append({
-            "entity_key": entity_key,
-            "nom": name,
-            "activite_type": activity_key,
-            "activite_valeur": activity_value,
+        if want_payment:
+            payment = {}
+            for k, v in tags.items():
+                if isinstance(k, str) and k.startswith("payment:"):
+                    if v is not None and str(v).strip() != "":
+                        payment[k] = v
+            item["payment"] = payment
 
-            "site": website,
-            "emails": emails,
-            "telephones": phones,
-            "whatsapp": whatsapp,
-
-            "adresse": address,
-
-            # champs “business”
-            "etoiles": tags.get("stars") or tags.get("hotel:stars"),
-            "cuisine": tags.get("cuisine"),
-            "horaires": tags.get("opening_hours"),
-            "operateur": tags.get("operator"),
-            "marque": tags.get("brand"),
+        # extras whitelist (pratique)
+        if want_extras:
+            extras = {}
+            for k in EXTRA_KEYS:
+                v = tags.get(k)
+                if v is not None and str(v).strip() != "":
+                    extras[k] = v
+            item["extras"] = extras
 
-            # nouveaux blocs
-            "contacts_social": contacts_social,
-            "payment": payment,
-            "extras": extras,
+        item["lat"] = float(lat)
+        item["lon"] = float(lon)
+        if wants(fields, "osm"):
+            item["osm"] = f"https://www.openstreetmap.org/{el_type}/{el_id}"
+        item["source"] = "OpenStreetMap"
 
-            "lat": float(lat),
-            "lon": float(lon),
-            "osm": f"https://www.openstreetmap.org/{el_type}/{el_id}",
-            "source": "OpenStreetMap",
+        # le plus important pour “encore plus de données”
+        if wants(fields, "raw_tags"):
+            item["raw_tags"] = tags
 
-            # le plus important pour “encore plus de données”
-            "raw_tags": tags,
-        })
+        out.append(item)
 
     return out
 
-def get_prospects(
+def _resolve_area(
     *,
     where: Optional[str],
     lat: Optional[float],
     lon: Optional[float],
     radius_km: Optional[float],
     radius_min_km: Optional[float],
-    tags: Optional[str],
-    limit: int,
-) -> Tuple[List[dict], Dict[str, Any]]:
-    limit = max(1, min(int(limit), MAX_LIMIT))
-    session = requests.Session()
-
-    t0 = time.perf_counter()
-
+    session: requests.Session,
+    geo: Optional[dict] = None,
+    deadline: Optional[float] = None,
+) -> dict:
+    """
+    Centre + bbox + bornes de rayon pour une recherche.
+    `geo` permet de réutiliser un geocoding déjà fait (batch).
+    """
     # --- centre + bbox
     geo_bbox = None
     if lat is not None and lon is not None:
@@ -430,7 +756,9 @@ def get_prospects(
     else:
         if not where or not where.strip():
             raise ValueError("Tu dois fournir where OU lat/lon.")
-        geo = _geocode(where.strip(), session)
+        if geo is None:
+            with metrics.stage("geocode"):
+                geo = _geocode(where.strip(), session, deadline)
         center_lat = float(geo["lat"])
         center_lon = float(geo["lon"])
         geo_bbox = geo.get("bbox")  # bbox retourné par Nominatim (zone géographique)
@@ -439,7 +767,7 @@ def get_prospects(
     # Si radius_km n'est pas fourni, on utilise le bbox du geocoding (zone géographique complète)
     # mais on ne filtre pas les résultats par distance (pas de limite de rayon)
     use_radius_filter = radius_km is not None
-    
+
     if radius_km is None:
         # Utiliser le bbox du geocoding si disponible, sinon MAX_RADIUS_KM
         if geo_bbox:
@@ -459,54 +787,322 @@ def get_prospects(
             raise ValueError("radius_min_km doit être strictement < radius_km.")
         south, west, north, east = _bbox_around(center_lat, center_lon, max_km)
 
-    # --- filtres (category->tags déjà fait au controller si besoin)
-    parsed = _parse_tags(tags)
-
-    # fetch_limit: on récupère un peu plus pour l’anneau (sinon tu risques d’avoir 0 résultats)
-    fetch_limit = min(1000, max(limit * 3, limit))
-
-    query = _build_overpass_query(parsed, south, west, north, east, fetch_limit)
-
-    t_over = time.perf_counter()
-    data = _overpass_request(query, session)
-    over_s = time.perf_counter() - t_over
+    return {
+        "center_lat": center_lat,
+        "center_lon": center_lon,
+        "bbox": (south, west, north, east),
+        "use_radius_filter": use_radius_filter,
+        "max_km": max_km,
+        "min_km": min_km,
+        "country_code": (geo or {}).get("country_code"),
+    }
 
-    results = _parse_elements(data)
 
+def _filter_distance(results: list[dict], area: dict) -> list[dict]:
     # --- filtre anneau (min/max) côté serveur impossible proprement => on le fait ici (léger)
     # Seulement si radius_km était fourni (use_radius_filter = True)
-    if use_radius_filter:
-        if min_km > 0:
-            filtered = []
-            for r in results:
-                d = _haversine_km(center_lat, center_lon, float(r["lat"]), float(r["lon"]))
-                if (d > min_km) and (d <= max_km):
-                    filtered.append(r)
-            results = filtered
-        else:
-            # filtre max_km exact (bbox est approx)
-            filtered = []
-            for r in results:
-                d = _haversine_km(center_lat, center_lon, float(r["lat"]), float(r["lon"]))
-                if d <= max_km:
-                    filtered.append(r)
-            results = filtered
     # Si radius_km n'était pas fourni, on garde tous les résultats du bbox (pas de filtre par distance)
+    if not area["use_radius_filter"]:
+        return results
+
+    center_lat, center_lon = area["center_lat"], area["center_lon"]
+    min_km, max_km = area["min_km"], area["max_km"]
+    filtered = []
+    for r in results:
+        d = _haversine_km(center_lat, center_lon, float(r["lat"]), float(r["lon"]))
+        # filtre max_km exact (bbox est approx) + anneau si min_km > 0
+        if d <= max_km and (min_km <= 0 or d > min_km):
+            filtered.append(r)
+    return filtered
+
+
+def _matches_filters(tags: dict, filters: list[dict]) -> bool:
+    """Même sémantique que _build_overpass_query, mais côté Python (split des requêtes combinées)."""
+    for f in filters:
+        if f["type"] == "kv":
+            if tags.get(f["key"]) == f["value"]:
+                return True
+        elif f["type"] == "key_exists":
+            if tags.get(f["key"]):
+                return True
+        elif f["type"] == "value_only":
+            if any(tags.get(k) == f["value"] for k in DEFAULT_POI_KEYS):
+                return True
+    return False
 
-    results = results[:limit]
 
-    meta = {
+def _area_meta(area: dict, *, where: Optional[str], tags: Optional[str]) -> dict:
+    use_radius_filter = area["use_radius_filter"]
+    return {
         "where": where,
-        "lat": center_lat,
-        "lon": center_lon,
-        "radius_km": max_km if use_radius_filter else None,  # None si radius_km n'était pas fourni
-        "radius_min_km": min_km if (use_radius_filter and min_km > 0) else None,
-        "bbox": [south, west, north, east],
+        "lat": area["center_lat"],
+        "lon": area["center_lon"],
+        "radius_km": area["max_km"] if use_radius_filter else None,  # None si radius_km n'était pas fourni
+        "radius_min_km": area["min_km"] if (use_radius_filter and area["min_km"] > 0) else None,
+        "bbox": list(area["bbox"]),
         "tags": tags,
+        "country_code": area["country_code"],
         "overpass_endpoint": OVERPASS_URL,
+    }
+
+
+def _fetch_parsed(
+    query: str,
+    session: requests.Session,
+    deadline: Optional[float],
+    *,
+    region: Optional[str],
+    fields: Optional[frozenset],
+    refresh: bool = False,
+) -> Tuple[List[dict], float]:
+    """
+    Requête Overpass + conversion des éléments; retourne (prospects, secondes Overpass).
+    En flux (OSM_OVERPASS_STREAM, grosses réponses) les éléments sont convertis pendant le
+    téléchargement: l'étape "parse" ne compte que la conversion (attente réseau et décodage exclus).
+    """
+    t_over = time.perf_counter()
+    if not OVERPASS_STREAM:
+        with metrics.stage("overpass"):
+            data = _overpass_request(query, session, deadline, refresh=refresh)
+        over_s = time.perf_counter() - t_over
+        with metrics.stage("parse"):
+            results = _parse_elements(data, region=region, fields=fields)
+        return results, over_s
+
+    timing = {"parse": 0.0}
+
+    def consume(elements: Iterator[dict]) -> List[dict]:
+        waited = 0.0
+
+        def timed() -> Iterator[dict]:
+            nonlocal waited
+            while True:
+                t = time.perf_counter()
+                el = next(elements, None)
+                waited += time.perf_counter() - t
+                if el is None:
+                    return
+                yield el
+
+        t0 = time.perf_counter()
+        out = _parse_elements(timed(), region=region, fields=fields)
+        timing["parse"] = time.perf_counter() - t0 - waited  # dernière tentative seulement
+        return out
+
+    try:
+        with metrics.span("prospect.overpass"):
+            results = _overpass_request(query, session, deadline, refresh=refresh, consume=consume)
+    finally:
+        # mêmes histogrammes que sans flux (cf. metrics.stage), y compris en cas d'échec
+        over_s = time.perf_counter() - t_over - timing["parse"]
+        metrics.STAGE_SECONDS.observe(over_s, stage="overpass")
+    metrics.STAGE_SECONDS.observe(timing["parse"], stage="parse")
+    return results, over_s
+
+
+def get_prospects(
+    *,
+    where: Optional[str],
+    lat: Optional[float],
+    lon: Optional[float],
+    radius_km: Optional[float],
+    radius_min_km: Optional[float],
+    tags: Optional[str],
+    limit: int,
+    deadline: Optional[float] = None,
+    fields: Optional[frozenset] = None,
+    refresh: bool = False,
+    filters: Optional[Sequence[dict]] = None,
+    candidates: bool = False,
+) -> Tuple[List[dict], Dict[str, Any]]:
+    """
+    refresh: requête Overpass refaite même si en cache (prewarm), cache mis à jour.
+    filters: filtres déjà résolus (service.tags), prioritaires sur `tags` (gardé pour la meta).
+    candidates: pas de troncature à `limit` (jusqu'à fetch_limit résultats): l'appelant trie puis tronque.
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    session = requests.Session()
+
+    t0 = time.perf_counter()
+
+    area = _resolve_area(
+        where=where,
+        lat=lat,
+        lon=lon,
+        radius_km=radius_km,
+        radius_min_km=radius_min_km,
+        session=session,
+        deadline=deadline,
+    )
+    south, west, north, east = area["bbox"]
+
+    # --- filtres (category->filtres déjà fait au controller si besoin)
+    parsed = list(filters) if filters else _parse_tags(tags)
+
+    # fetch_limit: on récupère un peu plus pour l’anneau (sinon tu risques d’avoir 0 résultats)
+    fetch_limit = min(1000, max(limit * 3, limit))
+
+    query = _build_overpass_query(
+        parsed, south, west, north, east, fetch_limit, server_timeout=_overpass_server_timeout(deadline)
+    )
+
+    results, over_s = _fetch_parsed(
+        query, session, deadline, region=area["country_code"], fields=fields, refresh=refresh
+    )
+
+    with metrics.stage("distance_filter"):
+        results = _filter_distance(results, area)
+
+    if not candidates:
+        results = results[:limit]
+
+    meta = _area_meta(area, where=where, tags=tags)
+    meta["timings"] = {
+        "overpass_seconds": round(over_s, 3),
+        "provider_total_seconds": round(time.perf_counter() - t0, 3),
+    }
+    return results, meta
+
+
+def get_prospects_batch(
+    specs: list[dict],
+    max_workers: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> Tuple[List[dict], Dict[str, Any]]:
+    """
+    Plusieurs recherches en un appel.
+    - geocode une seule fois chaque `where` distinct
+    - regroupe les specs qui partagent le même bbox en UNE requête Overpass (une sortie limitée par spec)
+    - exécute les groupes en parallèle (borné par OSM_BATCH_CONCURRENCY pour rester poli avec Overpass)
+
+    Chaque spec: dict avec les mêmes clés que get_prospects (where, lat, lon, radius_km, radius_min_km, tags, limit,
+    fields, candidates).
+    Retourne une entrée par spec (même ordre): {"results", "query"} ou {"error", "status"}.
+    """
+    t0 = time.perf_counter()
+    max_workers = max(1, int(max_workers or BATCH_CONCURRENCY))
+    session = requests.Session()
+    out: list[dict] = [{} for _ in specs]
+
+    # --- geocode des where distincts (séquentiel: Nominatim ≈1 req/s de toute façon)
+    t_geo = time.perf_counter()
+    geos: dict[str, Any] = {}
+    for spec in specs:
+        if spec.get("lat") is not None and spec.get("lon") is not None:
+            continue
+        w = (spec.get("where") or "").strip()
+        key = w.lower()
+        if not w or key in geos:
+            continue
+        try:
+            with metrics.stage("geocode"):
+                geos[key] = _geocode(w, session, deadline)
+        except (ValueError, RuntimeError) as e:
+            geos[key] = e
+    geo_s = time.perf_counter() - t_geo
+
+    # --- zone + filtres par spec, puis regroupement par bbox
+    groups: dict[tuple, list[int]] = {}
+    prepared: dict[int, dict] = {}
+    for i, spec in enumerate(specs):
+        try:
+            geo = geos.get((spec.get("where") or "").strip().lower())
+            if isinstance(geo, Exception):
+                raise geo
+            area = _resolve_area(
+                where=spec.get("where"),
+                lat=spec.get("lat"),
+                lon=spec.get("lon"),
+                radius_km=spec.get("radius_km"),
+                radius_min_km=spec.get("radius_min_km"),
+                session=session,
+                geo=geo,
+                deadline=deadline,
+            )
+            prepared[i] = {
+                "area": area,
+                "filters": list(spec.get("filters") or ()) or _parse_tags(spec.get("tags")),
+                "limit": max(1, min(int(spec.get("limit") or 20), MAX_LIMIT)),
+                "fields": spec.get("fields"),
+                "candidates": bool(spec.get("candidates")),
+            }
+        except ValueError as e:
+            out[i] = {"error": str(e), "status": 400}
+            continue
+        except RuntimeError as e:
+            out[i] = {"error": str(e), "status": 503}
+            continue
+        gkey = tuple(round(x, 6) for x in prepared[i]["area"]["bbox"])
+        groups.setdefault(gkey, []).append(i)
+
+    def run_group(idxs: list[int]) -> dict:
+        # une sortie par jeu de filtres distinct (specs aux filtres identiques: la plus grande limite)
+        parts: dict[tuple, list] = {}
+        for i in idxs:
+            fk = tuple(sorted(tuple(sorted(f.items())) for f in prepared[i]["filters"]))
+            fetch_limit = min(1000, prepared[i]["limit"] * 3)
+            if fk in parts:
+                parts[fk][1] = max(parts[fk][1], fetch_limit)
+            else:
+                parts[fk] = [prepared[i]["filters"], fetch_limit]
+
+        # union des champs; raw_tags toujours (répartition des résultats entre specs)
+        fields: Optional[set] = set()
+        for i in idxs:
+            if prepared[i]["fields"] is None:
+                fields = None
+                break
+            fields.update(prepared[i]["fields"])
+        if fields is not None:
+            fields = frozenset(fields | {"raw_tags"})
+
+        south, west, north, east = prepared[idxs[0]]["area"]["bbox"]
+        query = _build_overpass_group_query(
+            [tuple(part) for part in parts.values()],
+            south, west, north, east, server_timeout=_overpass_server_timeout(deadline),
+        )
+
+        parsed, over_s = _fetch_parsed(
+            query, requests.Session(), deadline, region=prepared[idxs[0]]["area"]["country_code"], fields=fields
+        )
+        return {"results": parsed, "overpass_seconds": over_s}
+
+    t_over = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(run_group, idxs): idxs for idxs in groups.values()}
+        for fut, idxs in futures.items():
+            try:
+                res = fut.result()
+            except (ValueError, RuntimeError) as e:
+                status = 400 if isinstance(e, ValueError) else 503
+                for i in idxs:
+                    out[i] = {"error": str(e), "status": status}
+                continue
+
+            for i in idxs:
+                spec, prep = specs[i], prepared[i]
+                results = [r for r in res["results"] if _matches_filters(r["raw_tags"], prep["filters"])]
+                with metrics.stage("distance_filter"):
+                    results = _filter_distance(results, prep["area"])
+                meta = _area_meta(prep["area"], where=spec.get("where"), tags=spec.get("tags"))
+                meta["timings"] = {
+                    "overpass_seconds": round(res["overpass_seconds"], 3),
+                    "group_size": len(idxs),
+                }
+                keep = None if prep["candidates"] else prep["limit"]
+                # résultats partagés entre specs du groupe: copie avant projection
+                results = [dict(r) for r in results[:keep]] if len(idxs) > 1 else results[:keep]
+                out[i] = {"results": project(results, prep["fields"]), "query": meta}
+
+    stats = {
+        "specs": len(specs),
+        "distinct_where": len(geos),
+        "overpass_requests": len(groups),
+        "concurrency": max_workers,
         "timings": {
-            "overpass_seconds": round(over_s, 3),
+            "geocode_seconds": round(geo_s, 3),
+            "overpass_wall_seconds": round(time.perf_counter() - t_over, 3),
             "provider_total_seconds": round(time.perf_counter() - t0, 3),
         },
     }
-    return results, meta
+    return out, stats
@@ -0,0 +1,30 @@
+import os
+from typing import Iterator, Optional
+
+from src.prospect.base import Provider, SearchSpec
+from .osm import get_prospects
+
+
+class OsmProvider(Provider):
+    """OpenStreetMap (Nominatim + Overpass)."""
+    name = "osm"
+    # pire cas actuel: geocode 20s + Overpass 3×35s + backoff
+    timeout = float(os.getenv("OSM_PROVIDER_TIMEOUT", "140"))
+
+    def search(self, spec: SearchSpec, deadline: Optional[float]) -> Iterator[dict]:
+        results, meta = get_prospects(
+            where=spec.where,
+            lat=spec.lat,
+            lon=spec.lon,
+            radius_km=spec.radius_km,
+            radius_min_km=spec.radius_min_km,
+            tags=spec.tags,
+            filters=spec.filters,
+            limit=spec.limit,
+            deadline=deadline,
+            fields=spec.fields,
+            candidates=spec.candidates,
+        )
+        # résultats déjà en mémoire: un seul yield, pas de coupure par l'échéance entre deux items
+        yield results
+        return meta
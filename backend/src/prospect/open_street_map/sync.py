@@ -0,0 +1,309 @@
+"""
+Sync incrémental d'une zone OSM vers le store local (service.store), par tuiles.
+
+- une zone = bbox (geocodée une fois à l'enregistrement) + tags, découpée en tuiles de SYNC_TILE_KM
+- 1re passe d'une tuile: requête complète (tous les prospects nommés) => `added`
+- passes suivantes: `(newer:"<last_sync>")`, seuls les éléments modifiés depuis l'horodatage
+  Overpass de la passe précédente reviennent => `added` / `updated` (empreinte du contenu),
+  `removed` si l'élément a perdu son nom
+- reconcile: `out ids` par tuile, les prospects du store absents de la réponse sont `removed`
+  (suppressions OSM / tag métier retiré, invisibles pour `newer`)
+- zone redéfinie (bbox, tile_km ou tags): l'état des tuiles est effacé, chaque tuile repart d'une
+  requête complète; les prospects qu'aucune tuile n'a revus après une passe entière sont `removed`
+
+Le flux de changements (`changes`) se consomme par curseur `since_id` (CRM).
+
+CLI:
+    cd backend && python -m src.prospect.open_street_map.sync --area tana [--reconcile]
+"""
+import argparse
+import datetime as dt
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+
+from src import metrics
+from src.deadline import DeadlineExceeded, expired
+from src.service.store import ORPHAN_TILE, content_hash, get_store
+
+from .osm import (
+    _build_overpass_query,
+    _matches_filters,
+    _overpass_request,
+    _overpass_server_timeout,
+    _parse_elements,
+    _parse_tags,
+    _resolve_area,
+)
+
+
+SYNC_TILE_KM = float(os.getenv("SYNC_TILE_KM", "5"))
+SYNC_MAX_TILES = int(os.getenv("SYNC_MAX_TILES", "400"))
+SYNC_OVERPASS_INTERVAL = float(os.getenv("SYNC_OVERPASS_INTERVAL", "5"))
+SYNC_CHANGES_MAX = 1000
+# clés de la spec qui définissent les tuiles et la requête `newer`
+GRID_KEYS = ("bbox", "tile_km", "tags")
+
+_KM_PER_DEG_LAT = 111.32
+
+
+def _tiles(bbox: Tuple[float, float, float, float], tile_km: float) -> List[Tuple[str, Tuple[float, float, float, float]]]:
+    """Grille régulière sur la bbox; clé "ligne:colonne" stable tant que bbox et tile_km ne changent pas."""
+    south, west, north, east = bbox
+    mid = math.radians((south + north) / 2)
+    dlat = tile_km / _KM_PER_DEG_LAT
+    dlon = tile_km / (_KM_PER_DEG_LAT * max(0.01, math.cos(mid)))
+    rows = max(1, math.ceil((north - south) / dlat))
+    cols = max(1, math.ceil((east - west) / dlon))
+    if rows * cols > SYNC_MAX_TILES:
+        raise ValueError(
+            f"Zone trop grande: {rows * cols} tuiles de {tile_km} km (max {SYNC_MAX_TILES}). Augmenter tile_km."
+        )
+    out = []
+    for i in range(rows):
+        for j in range(cols):
+            s = south + i * dlat
+            w = west + j * dlon
+            out.append((
+                f"{i}:{j}",
+                (round(s, 6), round(w, 6), round(min(north, s + dlat), 6), round(min(east, w + dlon), 6)),
+            ))
+    return out
+
+
+def register_area(
+    name: str,
+    *,
+    where: Optional[str] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    tags: Optional[str] = None,
+    tile_km: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Enregistre (ou redéfinit) une zone; le geocoding est fait ici, pas à chaque sync.
+    Si la grille change, les horodatages `newer` des anciennes tuiles ne valent plus: on les efface.
+    """
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("name requis.")
+    area = _resolve_area(
+        where=where, lat=lat, lon=lon, radius_km=radius_km, radius_min_km=None, session=requests.Session()
+    )
+    tile_km = float(tile_km or SYNC_TILE_KM)
+    tiles = _tiles(area["bbox"], tile_km)
+    spec = {
+        "where": where,
+        "bbox": list(area["bbox"]),
+        "tags": tags,
+        "tile_km": tile_km,
+        "tiles": len(tiles),
+        "country_code": area["country_code"],
+    }
+    store = get_store()
+    old = store.get_area(name)
+    saved = store.save_area(name, spec)
+    if old is not None and any(old.get(k) != spec[k] for k in GRID_KEYS):
+        store.reset_tiles(name)
+    return saved
+
+
+def _now_iso() -> str:
+    return dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _sync_tile(
+    store,
+    area: dict,
+    tile: str,
+    bbox: Tuple[float, float, float, float],
+    filters: List[dict],
+    session: requests.Session,
+    *,
+    reconcile: bool,
+    deadline: Optional[float],
+) -> Dict[str, int]:
+    name = area["name"]
+    since = store.tile_last_sync(name, tile)
+    query = _build_overpass_query(
+        filters, *bbox, None, server_timeout=_overpass_server_timeout(deadline), since=since
+    )
+    region = area.get("country_code")
+
+    def consume(elements: Iterator[dict]) -> Tuple[List[dict], Set[str]]:
+        # une passe, en flux pour les grosses tuiles: clés de tous les éléments + prospects convertis
+        returned: Set[str] = set()
+
+        def tap() -> Iterator[dict]:
+            for el in elements:
+                if el.get("id") is not None:
+                    returned.add(f"osm:{el.get('type', 'node')}:{el['id']}")
+                yield el
+
+        return _parse_elements(tap(), region=region), returned
+
+    header: dict = {}
+    # cache=False: un sync ne doit jamais se contenter d'une réponse en cache, ni en remplir une
+    parsed, returned = _overpass_request(query, session, deadline, consume=consume, header=header, cache=False)
+    synced_at = (header.get("osm3s") or {}).get("timestamp_osm_base") or _now_iso()
+
+    records = [r for r in parsed if _matches_filters(r.get("raw_tags") or {}, filters)]
+    kept = {r["entity_key"] for r in records}
+    # éléments modifiés mais plus prospects (nom retiré)
+    dropped = returned - kept
+
+    known = store.hashes(name, sorted(kept | dropped))
+    upserts, changes = [], []
+    for r in records:
+        h = content_hash(r)
+        old = known.get(r["entity_key"])
+        if old == h:
+            if since is None:
+                # passe complète: rattache à la tuile un prospect inchangé (orphelin d'une ancienne grille)
+                upserts.append((r["entity_key"], h, r))
+            continue
+        upserts.append((r["entity_key"], h, r))
+        changes.append((r["entity_key"], "added" if old is None else "updated", r))
+    removals = [k for k in sorted(dropped) if k in known]
+
+    if reconcile and since:
+        ids_query = _build_overpass_query(
+            filters, *bbox, None, server_timeout=_overpass_server_timeout(deadline), ids_only=True
+        )
+        present = _overpass_request(
+            ids_query, session, deadline, cache=False,
+            consume=lambda elements: {
+                f"osm:{el.get('type', 'node')}:{el['id']}" for el in elements if el.get("id") is not None
+            },
+        )
+        removals += [k for k in store.tile_keys(name, tile) if k not in present and k not in kept and k not in removals]
+
+    changes += [(k, "removed", None) for k in removals]
+    store.apply(name, tile, upserts, removals, changes)
+    store.set_tile_last_sync(name, tile, synced_at)
+
+    counts = {"added": 0, "updated": 0, "removed": 0}
+    for _, change, _ in changes:
+        counts[change] += 1
+    for change, n in counts.items():
+        if n:
+            metrics.SYNC_CHANGES.inc(n, change=change)
+    counts["full"] = int(since is None)
+    return counts
+
+
+def sync_area(
+    name: str,
+    *,
+    reconcile: bool = False,
+    interval: float = SYNC_OVERPASS_INTERVAL,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Une passe sur toutes les tuiles de la zone. deadline (perf_counter absolu): les tuiles restantes
+    sont ignorées et gardent leur last_sync (reprises à la passe suivante).
+    """
+    store = get_store()
+    area = store.get_area(name)
+    if area is None:
+        raise LookupError(f"Zone de sync inconnue: '{name}'.")
+
+    t0 = time.perf_counter()
+    filters = _parse_tags(area.get("tags"))
+    session = requests.Session()
+    summary: Dict[str, Any] = {
+        "area": name,
+        "tiles": 0,
+        "full_tiles": 0,
+        "added": 0,
+        "updated": 0,
+        "removed": 0,
+        "skipped_tiles": 0,
+        "errors": [],
+    }
+
+    last_request = 0.0
+    for tile, bbox in _tiles(tuple(area["bbox"]), float(area["tile_km"])):
+        # espacement minimal entre deux tuiles (Overpass)
+        wait = interval - (time.perf_counter() - last_request)
+        if last_request and wait > 0:
+            if expired(deadline, margin=wait):
+                summary["skipped_tiles"] += 1
+                continue
+            metrics.sleep_backoff(wait, "overpass")
+        if expired(deadline):
+            summary["skipped_tiles"] += 1
+            continue
+        last_request = time.perf_counter()
+        try:
+            with metrics.stage("sync_tile"):
+                counts = _sync_tile(store, area, tile, bbox, filters, session, reconcile=reconcile, deadline=deadline)
+        except DeadlineExceeded:
+            summary["skipped_tiles"] += 1
+            continue
+        except RuntimeError as e:
+            summary["errors"].append({"tile": tile, "error": str(e)})
+            continue
+        summary["tiles"] += 1
+        summary["full_tiles"] += counts.pop("full")
+        for change, n in counts.items():
+            summary[change] += n
+
+    if not summary["skipped_tiles"] and not summary["errors"]:
+        # toutes les tuiles ont eu leur passe complète depuis la redéfinition: le reste est hors zone
+        orphans = store.tile_keys(name, ORPHAN_TILE)
+        if orphans:
+            store.apply(name, ORPHAN_TILE, [], orphans, [(k, "removed", None) for k in orphans])
+            metrics.SYNC_CHANGES.inc(len(orphans), change="removed")
+            summary["removed"] += len(orphans)
+
+    summary["seconds"] = round(time.perf_counter() - t0, 3)
+    return summary
+
+
+def changes(since_id: int = 0, area: Optional[str] = None, limit: int = 500) -> Dict[str, Any]:
+    """Flux de changements après `since_id`; repasser `next_since_id` à l'appel suivant."""
+    limit = max(1, min(int(limit), SYNC_CHANGES_MAX))
+    items = get_store().changes(since_id=since_id, area=area, limit=limit)
+    return {
+        "changes": items,
+        "count": len(items),
+        "next_since_id": items[-1]["id"] if items else since_id,
+        "has_more": len(items) == limit,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Sync incrémental OSM d'une zone vers le store local.")
+    ap.add_argument("--area", required=True, help="Nom de la zone (déjà enregistrée, ou créée avec --where/--lat/--lon)")
+    ap.add_argument("--where", default=None)
+    ap.add_argument("--lat", type=float, default=None)
+    ap.add_argument("--lon", type=float, default=None)
+    ap.add_argument("--radius-km", type=float, default=None)
+    ap.add_argument("--tags", default=None, help="Filtre OSM (mêmes formats que /prospects)")
+    ap.add_argument("--tile-km", type=float, default=None)
+    ap.add_argument("--reconcile", action="store_true", help="Détecte aussi les suppressions (requêtes `out ids`)")
+    ap.add_argument("--interval", type=float, default=SYNC_OVERPASS_INTERVAL, help="Secondes entre deux tuiles")
+    ap.add_argument("--max-minutes", type=float, default=None, help="Budget total")
+    args = ap.parse_args(argv)
+
+    if args.where or (args.lat is not None and args.lon is not None):
+        register_area(
+            args.area, where=args.where, lat=args.lat, lon=args.lon,
+            radius_km=args.radius_km, tags=args.tags, tile_km=args.tile_km,
+        )
+    deadline = time.perf_counter() + args.max_minutes * 60 if args.max_minutes else None
+    summary = sync_area(args.area, reconcile=args.reconcile, interval=args.interval, deadline=deadline)
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
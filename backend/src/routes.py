@@ -1,7 +1,15 @@
+import os
 from time import perf_counter
-from fastapi import APIRouter, Query, HTTPException
+from typing import Literal
+from fastapi import APIRouter, Query, HTTPException, Request
+from pydantic import BaseModel, Field, model_validator
+from fastapi.responses import FileResponse, PlainTextResponse
 
+from src import metrics, profiling, serialization
+from src.deadline import from_ms
 from src.controller.prospect_controller import ProspectController
+from src.prospect.open_street_map import sync
+from src.service.snapshots import SnapshotExpired
 
 router = APIRouter()
 
@@ -11,8 +19,47 @@ def health():
     return {"ok": True}
 
 
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def _check_profiling(request: Request) -> None:
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profilage désactivé (PROSPECT_PROFILING=1).")
+    if profiling.ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="PROSPECT_ADMIN_TOKEN non défini: /admin/profiles fermé.")
+    if not profiling.admin_allowed(request):
+        raise HTTPException(status_code=403, detail="X-Admin-Token invalide.")
+
+
+@router.get("/admin/profiles")
+def admin_profiles(request: Request):
+    _check_profiling(request)
+    items = profiling.list_profiles()
+    return {"count": len(items), "dir": profiling.PROFILE_DIR, "profiles": items}
+
+
+@router.get("/admin/profiles/{profile_id}")
+def admin_profile(
+    request: Request,
+    profile_id: str,
+    fmt: str = Query("speedscope", alias="format", description="speedscope|collapsed"),
+):
+    _check_profiling(request)
+    try:
+        path = profiling.profile_path(profile_id, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profil inconnu: '{profile_id}'.")
+    media_type = "application/json" if fmt == "speedscope" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+
 @router.get("/prospects")
 def prospects(
+    request: Request,
     # Localisation
     where: str | None = Query(None, min_length=2, description="Champ libre localisation (ville/adresse/lieu…)"),
     lat: float | None = Query(None, ge=-90, le=90, description="Latitude (point manuel)"),
@@ -35,17 +82,44 @@ def prospects(
     ),
 
     # Résultats
-    limit: int = Query(20, ge=1, le=200, description="Nombre de résultats"),
+    limit: int = Query(20, ge=1, le=1000, description="Nombre de résultats (max 200; avec page_size: taille du snapshot, max 1000)"),
     enrich: bool = Query(False, description="Si true: scrape tous les résultats retournés qui ont un site web"),
+    dedupe: str = Query("strict", description="strict (entity_key)|smart (fusion nom/distance/contacts)"),
+    sort: str | None = Query(None, description="score: les plus faciles à contacter d'abord, parmi tous les candidats des sources (défaut: ordre des sources)"),
+    providers: str | None = Query(None, description="Sources (csv), ex: 'osm' ou 'osm,fixture' (défaut: PROSPECT_PROVIDERS)"),
+    deadline_ms: int | None = Query(
+        None, ge=100, le=600000, description="Budget total (ms): upstream + enrichissement s'arrêtent à l'échéance"
+    ),
+
+    # Réponse
+    fields: str | None = Query(
+        None,
+        description=(
+            "Projection (csv): groupes activite,contacts,adresse,business,social,payment,extras,osm,raw_tags "
+            "ou champs (ex: 'contacts,horaires'); défaut: tout"
+        ),
+    ),
+    fmt: str | None = Query(None, alias="format", description="json|msgpack (défaut: en-tête Accept, sinon json)"),
+
+    # Pagination par curseur (snapshot serveur)
+    page_size: int | None = Query(None, ge=1, le=200, description="Taille de page: active la pagination par curseur"),
+    cursor: str | None = Query(None, description="page.next_cursor de la réponse précédente (les autres filtres sont ignorés)"),
 ):
-    if not (where or (lat is not None and lon is not None)):
+    if not cursor and not (where or (lat is not None and lon is not None)):
         raise HTTPException(
             status_code=422,
             detail="Paramètres requis: where=... OU lat=...&lon=...",
         )
 
     t0 = perf_counter()
+    deadline = from_ms(deadline_ms, t0)
     try:
+        out_format = serialization.negotiate_format(request, fmt)
+        if cursor:
+            resp = ProspectController.next_page(cursor, page_size=page_size, deadline=deadline)
+            resp["timings"]["total_seconds"] = round(perf_counter() - t0, 3)
+            return serialization.render(request, resp, timings=resp["timings"], items_key="results", fmt=out_format)
+
         resp = ProspectController.search_prospects(
             where=where,
             lat=lat,
@@ -56,14 +130,131 @@ def prospects(
             tags=tags,
             limit=limit,
             enrich=enrich,
+            dedupe=dedupe,
+            providers=providers,
+            deadline=deadline,
+            fields=fields,
+            page_size=page_size,
+            sort=sort,
         )
         resp.setdefault("timings", {})
         resp["timings"]["total_seconds"] = round(perf_counter() - t0, 3)
-        return resp
+        return serialization.render(request, resp, timings=resp["timings"], items_key="results", fmt=out_format)
 
+    except SnapshotExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur interne: {e}")
+
+
+class SearchSpec(BaseModel):
+    """Une recherche du batch (mêmes paramètres que GET /prospects)."""
+    where: str | None = Field(None, min_length=2)
+    lat: float | None = Field(None, ge=-90, le=90)
+    lon: float | None = Field(None, ge=-180, le=180)
+    radius_km: float | None = Field(None, gt=0)
+    radius_min_km: float | None = Field(None, ge=0)
+    category: str | None = None
+    tags: str | None = None
+    limit: int = Field(20, ge=1, le=200)
+    enrich: bool = False
+    fields: str | None = None
+    sort: Literal["score"] | None = None
+
+    @model_validator(mode="after")
+    def _check_location(self):
+        if not (self.where or (self.lat is not None and self.lon is not None)):
+            raise ValueError("Paramètres requis: where=... OU lat=...&lon=...")
+        return self
+
+
+class BatchRequest(BaseModel):
+    specs: list[SearchSpec] = Field(..., min_length=1, max_length=500)
+    deadline_ms: int | None = Field(None, ge=100, le=600000)
+
+
+@router.post("/prospects/batch")
+def prospects_batch(
+    request: Request,
+    body: BatchRequest,
+    fmt: str | None = Query(None, alias="format", description="json|msgpack (défaut: en-tête Accept, sinon json)"),
+):
+    t0 = perf_counter()
+    deadline = from_ms(body.deadline_ms, t0)
+    try:
+        out_format = serialization.negotiate_format(request, fmt)
+        resp = ProspectController.search_batch([s.model_dump() for s in body.specs], deadline=deadline)
+        resp["stats"]["timings"]["total_seconds"] = round(perf_counter() - t0, 3)
+        return serialization.render(request, resp, timings=resp["stats"]["timings"], items_key="items", fmt=out_format)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {e}")
+
+
+class SyncAreaRequest(BaseModel):
+    """Zone synchronisée: where OU lat/lon (+ radius_km), filtre category/tags comme /prospects."""
+    name: str = Field(..., min_length=1, max_length=100)
+    where: str | None = Field(None, min_length=2)
+    lat: float | None = Field(None, ge=-90, le=90)
+    lon: float | None = Field(None, ge=-180, le=180)
+    radius_km: float | None = Field(None, gt=0)
+    category: str | None = None
+    tags: str | None = None
+    tile_km: float | None = Field(None, gt=0.5, le=50)
+
+    @model_validator(mode="after")
+    def _check_location(self):
+        if not (self.where or (self.lat is not None and self.lon is not None)):
+            raise ValueError("Paramètres requis: where=... OU lat=...&lon=...")
+        return self
+
+
+@router.post("/sync/areas")
+def sync_register_area(body: SyncAreaRequest):
+    try:
+        return sync.register_area(
+            body.name,
+            where=body.where,
+            lat=body.lat,
+            lon=body.lon,
+            radius_km=body.radius_km,
+            tags=ProspectController._resolve_tags(body.category, body.tags),
+            tile_km=body.tile_km,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/sync/areas/{name}/run")
+def sync_run(
+    name: str,
+    reconcile: bool = Query(False, description="Détecte aussi les suppressions (une requête `out ids` de plus par tuile)"),
+    deadline_ms: int | None = Query(None, ge=100, le=3600000, description="Budget: les tuiles restantes sont reprises au prochain run"),
+):
+    try:
+        return sync.sync_area(name, reconcile=reconcile, deadline=from_ms(deadline_ms))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/sync/changes")
+def sync_changes(
+    since_id: int = Query(0, ge=0, description="next_since_id de la réponse précédente"),
+    area: str | None = Query(None, description="Filtrer sur une zone"),
+    limit: int = Query(500, ge=1, le=1000),
+):
+    return sync.changes(since_id=since_id, area=area, limit=limit)
@@ -0,0 +1,144 @@
+"""
+Encodage des grosses réponses (/prospects, /prospects/batch) sans passer par l'encodeur FastAPI.
+
+- JSON compact (stdlib) par défaut; `orjson` si PROSPECT_JSON_ENCODER=orjson et installé
+- MessagePack (`Accept: application/msgpack` ou `format=msgpack`) si `msgpack` est installé
+- compression brotli (si installé) ou gzip selon `Accept-Encoding`, au-delà de PROSPECT_COMPRESS_MIN_BYTES
+
+La liste de résultats est encodée à part puis collée dans l'enveloppe: `timings.serialization`
+(format, secondes, octets) peut ainsi être écrit dans la réponse qu'il mesure.
+La compression (faite après) est exposée dans l'en-tête `Server-Timing`.
+orjson / msgpack / brotli sont dans requirements.txt; importés sans obligation (repli stdlib / gzip).
+"""
+import gzip
+import json
+import os
+import time
+from typing import Any, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:  # dépendances optionnelles
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+JSON_ENCODER = os.getenv("PROSPECT_JSON_ENCODER", "json").strip().lower()
+COMPRESSION_ENABLED = os.getenv("PROSPECT_COMPRESSION", "1") not in ("0", "false", "no")
+COMPRESS_MIN_BYTES = int(os.getenv("PROSPECT_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("PROSPECT_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("PROSPECT_BROTLI_QUALITY", "4"))
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+FORMATS = ("json", "msgpack")
+
+
+def _json_default(o: Any) -> Any:
+    if isinstance(o, (set, frozenset)):
+        return sorted(o)
+    return str(o)
+
+
+def _encode_json(obj: Any) -> bytes:
+    if orjson is not None and JSON_ENCODER == "orjson":
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def _encode_msgpack(obj: Any) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True, default=_json_default)
+
+
+def json_encoder_name() -> str:
+    return "orjson" if orjson is not None and JSON_ENCODER == "orjson" else "json"
+
+
+def negotiate_format(request: Request, fmt: Optional[str] = None) -> str:
+    """`format=` explicite, sinon en-tête Accept. ValueError si msgpack demandé mais indisponible."""
+    f = (fmt or "").strip().lower()
+    if not f:
+        accept = (request.headers.get("accept") or "").lower()
+        f = "msgpack" if any(m in accept for m in MSGPACK_MEDIA_TYPES) else "json"
+    if f not in FORMATS:
+        raise ValueError(f"format invalide: '{fmt}' (attendu: {', '.join(FORMATS)})")
+    if f == "msgpack" and msgpack is None:
+        raise ValueError("format msgpack indisponible (paquet 'msgpack' non installé)")
+    return f
+
+
+def _splice(fmt: str, envelope: dict, key: str, encoded_items: bytes) -> bytes:
+    """Enveloppe encodée + `key: <items déjà encodés>` (dernière clé)."""
+    if fmt == "json":
+        head = _encode_json(envelope)
+        sep = b"," if len(head) > 2 else b""
+        return head[:-1] + sep + _encode_json(key) + b":" + encoded_items + b"}"
+    head = _encode_msgpack(envelope)
+    # fixmap (<= 15 clés): on incrémente le nombre de clés dans l'octet d'en-tête
+    if 0x80 <= head[0] < 0x8F:
+        return bytes([head[0] + 1]) + head[1:] + _encode_msgpack(key) + encoded_items
+    return _encode_msgpack({**envelope, key: msgpack.unpackb(encoded_items, raw=False)})
+
+
+def _compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    if not COMPRESSION_ENABLED or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    accepted = {e.split(";")[0].strip() for e in accept_encoding.lower().split(",")}
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def render(request: Request, payload: dict, *, timings: dict, items_key: str, fmt: str = "json") -> Response:
+    """
+    Encode `payload` (avec `payload[items_key]` = liste volumineuse) au format demandé.
+    Ajoute `timings["serialization"]` = {format, encoder, seconds, items_bytes, payload_bytes}.
+    """
+    encode = _encode_json if fmt == "json" else _encode_msgpack
+    t0 = time.perf_counter()
+    envelope = {k: v for k, v in payload.items() if k != items_key}
+    items = encode(payload.get(items_key) or [])
+
+    stats = {
+        "format": fmt,
+        "encoder": json_encoder_name() if fmt == "json" else "msgpack",
+        "seconds": 0.0,
+        "items_bytes": len(items),
+        "payload_bytes": 0,
+    }
+    timings["serialization"] = stats
+    # la taille totale dépend du bloc qui la contient: quelques passes sur la petite enveloppe
+    stats["seconds"] = round(time.perf_counter() - t0, 4)
+    body = b""
+    for _ in range(3):
+        body = _splice(fmt, envelope, items_key, items)
+        if stats["payload_bytes"] == len(body):
+            break
+        stats["payload_bytes"] = len(body)
+    ser_s = time.perf_counter() - t0
+
+    t_comp = time.perf_counter()
+    body_out, encoding = _compress(body, request.headers.get("accept-encoding") or "")
+    comp_s = time.perf_counter() - t_comp
+
+    server_timing = f"serialize;dur={ser_s * 1000:.1f}"
+    headers = {"Vary": "Accept, Accept-Encoding", "X-Payload-Bytes": str(len(body))}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        server_timing += f", compress;dur={comp_s * 1000:.1f};desc=\"{encoding}\""
+    headers["Server-Timing"] = server_timing
+
+    media_type = JSON_MEDIA_TYPE if fmt == "json" else MSGPACK_MEDIA_TYPES[0]
+    return Response(content=body_out, media_type=media_type, headers=headers)
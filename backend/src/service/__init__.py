@@ -1,8 +1,12 @@
 """Services pour l'enrichissement et le post-traitement des prospects."""
+from .coverage import compute_coverage
 from .enrich import enrich_prospects
+from .resolve import resolve_entities
+from .tags import category_to_tags
 
 __all__ = [
     "enrich_prospects",
+    "resolve_entities",
     "category_to_tags",
     "compute_coverage",
 ]
@@ -0,0 +1,185 @@
+"""
+Complétion des adresses vides (ni rue ni addr:full) par Nominatim, hors du chemin de la requête.
+
+- Les prospects sont regroupés par cellule de coordonnées arrondies (ADDRESS_GRID_DECIMALS,
+  défaut 4 ≈ 11 m): des POI voisins partagent une seule recherche.
+- Réponse en cours: seules les cellules déjà en cache sont complétées (aucun appel réseau);
+  les autres sont mises en file et résolues par un thread de fond, disponibles aux fetchs suivants.
+- Thread de fond: lots de cellules, un appel /lookup par lot de 50 éléments OSM (adresse calculée
+  par Nominatim pour le POI représentant la cellule), /reverse pour le reste; chaque appel passe
+  par le rate limit Nominatim partagé (cf. service.ratelimit).
+- Cache (PROSPECT_ADDRESS_CACHE_BACKEND, défaut: celui des autres caches, PROSPECT_CACHE_BACKEND):
+  cellule -> adresse, ou {} si Nominatim ne trouve rien (TTL plus court).
+
+Désactivé par défaut (PROSPECT_ADDRESS_COMPLETION=1 pour l'activer): le thread de fond suppose un
+process long (pas de serverless, où il est gelé après la réponse) et un cache qui survit aux
+requêtes. Seuls les prospects OSM (`entity_key` "osm:…") sont complétés.
+
+Seuls les champs vides sont remplis (rue, code postal, ville, pays; jamais le numéro, propre au
+POI); `adresse.source = "nominatim"` marque une adresse complétée.
+"""
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from src import metrics
+from src.service.cache import TTLCache
+
+
+ADDRESS_COMPLETION = os.getenv("PROSPECT_ADDRESS_COMPLETION", "0") in ("1", "true", "yes")
+ADDRESS_GRID_DECIMALS = int(os.getenv("PROSPECT_ADDRESS_GRID_DECIMALS", "4"))
+ADDRESS_CACHE_TTL = int(os.getenv("PROSPECT_ADDRESS_CACHE_TTL", str(30 * 86400)))  # 30 j
+ADDRESS_NOT_FOUND_TTL = int(os.getenv("PROSPECT_ADDRESS_NOT_FOUND_TTL", str(7 * 86400)))
+ADDRESS_CACHE_MAX = int(os.getenv("PROSPECT_ADDRESS_CACHE_MAX", "200000"))
+ADDRESS_CACHE_BACKEND = os.getenv("PROSPECT_ADDRESS_CACHE_BACKEND") or None  # None: PROSPECT_CACHE_BACKEND
+ADDRESS_QUEUE_MAX = int(os.getenv("PROSPECT_ADDRESS_QUEUE_MAX", "5000"))
+ADDRESS_BATCH = int(os.getenv("PROSPECT_ADDRESS_BATCH", "50"))
+
+FILLED_KEYS = ("street", "postcode", "city", "country")
+
+_ADDRESS_CACHE = TTLCache("reverse", ADDRESS_CACHE_TTL, max_items=ADDRESS_CACHE_MAX, backend=ADDRESS_CACHE_BACKEND)
+
+
+def _cell(p: dict) -> Optional[str]:
+    lat, lon = p.get("lat"), p.get("lon")
+    if lat is None or lon is None:
+        return None
+    d = ADDRESS_GRID_DECIMALS
+    return f"{round(float(lat), d):.{d}f},{round(float(lon), d):.{d}f}"
+
+
+def _incomplete(p: dict) -> bool:
+    # fixture, bench, autres providers: rien à demander à Nominatim
+    if not (p.get("entity_key") or "").startswith("osm:"):
+        return False
+    addr = p.get("adresse")
+    return isinstance(addr, dict) and not (addr.get("street") or addr.get("full"))
+
+
+def _fill(p: dict, found: dict) -> bool:
+    # copie: le dict `adresse` peut être partagé avec les données du provider (fixture, snapshot)
+    addr = dict(p["adresse"])
+    for k in FILLED_KEYS:
+        if not addr.get(k) and found.get(k):
+            addr[k] = found[k]
+    if addr == p["adresse"]:
+        return False
+    addr["source"] = "nominatim"
+    p["adresse"] = addr
+    return True
+
+
+class AddressCompleter:
+    """File de cellules à résoudre (dédoublonnée) + thread de fond démarré au premier besoin."""
+
+    def __init__(self, batch: int = ADDRESS_BATCH, queue_max: int = ADDRESS_QUEUE_MAX):
+        self.batch = max(1, batch)
+        self.queue_max = queue_max
+        self._queue: deque = deque()  # (cellule, lat, lon, entity_key)
+        self._pending: set = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.session = requests.Session()
+
+    def enqueue(self, cells: Dict[str, dict]) -> int:
+        """cellule -> prospect représentatif; en une fois (un seul lot pour la réponse). Retourne le nb en file."""
+        queued = dropped = 0
+        with self._cond:
+            for cell, p in cells.items():
+                if cell in self._pending:
+                    queued += 1
+                    continue
+                if len(self._queue) >= self.queue_max:
+                    dropped += 1
+                    continue
+                self._pending.add(cell)
+                self._queue.append((cell, float(p["lat"]), float(p["lon"]), p.get("entity_key") or ""))
+                queued += 1
+            if self._queue and self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="address-completion", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        if queued:
+            metrics.ADDRESS_COMPLETIONS.inc(queued, result="queued")
+        if dropped:
+            metrics.ADDRESS_COMPLETIONS.inc(dropped, result="dropped")
+        return queued
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _next_batch(self) -> List[Tuple[str, float, float, str]]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            return [self._queue.popleft() for _ in range(min(self.batch, len(self._queue)))]
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                self.resolve(batch)
+            except Exception as e:
+                metrics.ADDRESS_COMPLETIONS.inc(result="error")
+                print(f"[addresses] échec du lot ({len(batch)} cellules): {e}")
+            finally:
+                with self._cond:
+                    self._pending.difference_update(cell for cell, *_ in batch)
+
+    def resolve(self, batch: List[Tuple[str, float, float, str]]) -> Dict[str, dict]:
+        """Résout un lot de cellules (lookup groupé puis reverse) et remplit le cache."""
+        from src.prospect.open_street_map.osm import _lookup_addresses, _reverse_geocode
+
+        found = _lookup_addresses([key for _, _, _, key in batch], self.session)
+        out: Dict[str, dict] = {}
+        for cell, lat, lon, key in batch:
+            addr = found.get(key)
+            if not addr or not addr.get("street"):
+                # POI absent de Nominatim, ou sans rue: adresse la plus proche du point
+                addr = _reverse_geocode(lat, lon, self.session) or addr
+            if addr and any(addr.get(k) for k in FILLED_KEYS):
+                _ADDRESS_CACHE.set(cell, addr)
+                metrics.ADDRESS_COMPLETIONS.inc(result="filled")
+            else:
+                addr = {}
+                _ADDRESS_CACHE.set(cell, addr, ttl=ADDRESS_NOT_FOUND_TTL)
+                metrics.ADDRESS_COMPLETIONS.inc(result="not_found")
+            out[cell] = addr
+        return out
+
+
+COMPLETER = AddressCompleter()
+
+
+def complete_addresses(results: List[dict], *, enqueue: bool = True) -> Tuple[List[dict], Dict[str, Any]]:
+    """
+    Complète en place les adresses vides depuis le cache; met les cellules inconnues en file
+    (si `enqueue`). Retourne (résultats, meta: missing, filled, queued = cellules en file).
+    """
+    meta = {"enabled": ADDRESS_COMPLETION, "missing": 0, "filled": 0, "queued": 0}
+    if not ADDRESS_COMPLETION:
+        return results, meta
+
+    by_cell: Dict[str, List[dict]] = {}
+    for p in results:
+        if _incomplete(p):
+            cell = _cell(p)
+            if cell is not None:
+                by_cell.setdefault(cell, []).append(p)
+                meta["missing"] += 1
+
+    misses = {}
+    for cell, items in by_cell.items():
+        found = _ADDRESS_CACHE.get(cell)
+        if found is None:
+            misses[cell] = items[0]
+            continue
+        metrics.ADDRESS_COMPLETIONS.inc(result="cache")
+        meta["filled"] += sum(1 for p in items if _fill(p, found))
+    if enqueue and misses:
+        meta["queued"] = COMPLETER.enqueue(misses)
+    return results, meta
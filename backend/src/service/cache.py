@@ -0,0 +1,247 @@
+"""
+Cache clé -> valeur avec TTL, thread-safe.
+Même logique que le cache geocode OSM, réutilisable (robots.txt, sitemaps, …).
+
+Stockage (PROSPECT_CACHE_BACKEND), commun à tous les caches du process:
+- `memory` (défaut): dict du process
+- `sqlite`: fichier partagé par les workers d'une même machine (PROSPECT_CACHE_PATH), WAL + mmap:
+  les lectures se font dans la mémoire partagée du page cache, sans copie entre processus
+- `postgres`: table prospect_cache, partagée entre machines
+Les backends partagés stockent les valeurs en JSON (jamais de pickle: un fichier ou une table
+modifiable par un tiers ne doit pas pouvoir exécuter de code); les valeurs doivent être
+sérialisables en JSON (les tuples reviennent en listes). Par défaut le fichier sqlite est dans un
+répertoire privé (0700) propre à l'utilisateur.
+"""
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+import time
+from itertools import count
+from threading import Lock, local
+from typing import Any, Optional
+
+from src import metrics
+
+
+CACHE_BACKEND = os.getenv("PROSPECT_CACHE_BACKEND", "memory").strip().lower()
+CACHE_DIR = os.path.join(tempfile.gettempdir(), f"prospect-cache-{os.getuid()}")
+CACHE_PATH = os.getenv("PROSPECT_CACHE_PATH", os.path.join(CACHE_DIR, "cache.sqlite"))
+CACHE_MMAP_BYTES = int(os.getenv("PROSPECT_CACHE_MMAP_BYTES", str(256 * 1024 * 1024)))
+CACHE_BACKENDS = ("memory", "sqlite", "postgres")
+# ménage (expirés + max_items) toutes les N écritures d'un cache partagé
+_PRUNE_EVERY = 100
+
+
+def _dumps(val: Any) -> bytes:
+    return json.dumps(val, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(raw: Any) -> Optional[Any]:
+    try:
+        return json.loads(bytes(raw))
+    except ValueError:
+        return None  # ligne illisible (ex: ancienne valeur pickle): traitée comme absente
+
+
+def private_dir(path: str) -> None:
+    """
+    Crée le répertoire en 0700; refuse un répertoire existant d'un autre utilisateur ou ouvert aux autres.
+    Aussi pour les autres fichiers de travail sous /tmp (verrous de rate limit, profils).
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"Répertoire non privé: {path} (attendu: dossier 0700 de l'utilisateur courant)")
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data: dict[str, tuple[float, Any]] = {}
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            it = self._data.get(key)
+            if it is not None and it[0] <= now:
+                self._data.pop(key, None)
+                it = None
+        return None if it is None else it[1]
+
+    def set(self, key: str, val: Any, expires_at: float, max_items: int) -> None:
+        with self._lock:
+            if key not in self._data and len(self._data) >= max_items:
+                # plus ancienne insertion d'abord (dict ordonné)
+                self._data.pop(next(iter(self._data)), None)
+            self._data[key] = (expires_at, val)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class SqliteBackend:
+    """Une table par fichier, lignes (name, key); une connexion par thread (WAL: lecteurs concurrents)."""
+
+    def __init__(self, name: str, path: str = CACHE_PATH):
+        self.name = name
+        self.path = path
+        self._local = local()
+        self._writes = count()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path) == CACHE_DIR:
+                private_dir(CACHE_DIR)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute(f"PRAGMA mmap_size={CACHE_MMAP_BYTES};")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prospect_cache ("
+                " name TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, value BLOB NOT NULL,"
+                " PRIMARY KEY (name, key)) WITHOUT ROWID;"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM prospect_cache WHERE name = ? AND key = ? AND expires_at > ?;",
+            (self.name, key, time.time()),
+        ).fetchone()
+        return None if row is None else _loads(row[0])
+
+    def set(self, key: str, val: Any, expires_at: float, max_items: int) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO prospect_cache (name, key, expires_at, value) VALUES (?, ?, ?, ?);",
+            (self.name, key, expires_at, _dumps(val)),
+        )
+        if next(self._writes) % _PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM prospect_cache WHERE name = ? AND expires_at <= ?;", (self.name, time.time()))
+            conn.execute(
+                "DELETE FROM prospect_cache WHERE name = ? AND key IN ("
+                " SELECT key FROM prospect_cache WHERE name = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?);",
+                (self.name, self.name, max_items),
+            )
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM prospect_cache WHERE name = ?;", (self.name,))
+
+    def __len__(self) -> int:
+        row = self._conn().execute(
+            "SELECT count(*) FROM prospect_cache WHERE name = ? AND expires_at > ?;", (self.name, time.time())
+        ).fetchone()
+        return int(row[0])
+
+
+class PostgresBackend:
+    _ready = False
+    _ready_lock = Lock()
+
+    def __init__(self, name: str):
+        self.name = name
+        self._writes = count()
+
+    @classmethod
+    def _ensure_table(cls) -> None:
+        if cls._ready:
+            return
+        from src.db import execute
+        with cls._ready_lock:
+            if cls._ready:
+                return
+            execute(
+                """
+                CREATE TABLE IF NOT EXISTS prospect_cache (
+                    name TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    expires_at DOUBLE PRECISION NOT NULL,
+                    value BYTEA NOT NULL,
+                    PRIMARY KEY (name, key)
+                );
+                """
+            )
+            cls._ready = True
+
+    def get(self, key: str) -> Optional[Any]:
+        from src.db import fetch_one
+        self._ensure_table()
+        row = fetch_one(
+            "SELECT value FROM prospect_cache WHERE name = %s AND key = %s AND expires_at > %s;",
+            (self.name, key, time.time()),
+        )
+        return None if row is None else _loads(row["value"])
+
+    def set(self, key: str, val: Any, expires_at: float, max_items: int) -> None:
+        from src.db import execute
+        self._ensure_table()
+        execute(
+            "INSERT INTO prospect_cache (name, key, expires_at, value) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (name, key) DO UPDATE SET expires_at = EXCLUDED.expires_at, value = EXCLUDED.value;",
+            (self.name, key, expires_at, _dumps(val)),
+        )
+        if next(self._writes) % _PRUNE_EVERY == 0:
+            execute(
+                "DELETE FROM prospect_cache WHERE name = %s AND (expires_at <= %s OR key IN ("
+                " SELECT key FROM prospect_cache WHERE name = %s ORDER BY expires_at DESC OFFSET %s));",
+                (self.name, time.time(), self.name, max_items),
+            )
+
+    def clear(self) -> None:
+        from src.db import execute
+        self._ensure_table()
+        execute("DELETE FROM prospect_cache WHERE name = %s;", (self.name,))
+
+    def __len__(self) -> int:
+        from src.db import fetch_one
+        self._ensure_table()
+        row = fetch_one(
+            "SELECT count(*) AS n FROM prospect_cache WHERE name = %s AND expires_at > %s;", (self.name, time.time())
+        )
+        return int(row["n"])
+
+
+def make_backend(name: str, backend: Optional[str] = None):
+    backend = (backend or CACHE_BACKEND).strip().lower()
+    if backend == "memory":
+        return MemoryBackend()
+    if backend == "sqlite":
+        return SqliteBackend(name)
+    if backend == "postgres":
+        return PostgresBackend(name)
+    raise RuntimeError(f"PROSPECT_CACHE_BACKEND inconnu: '{backend}' ({'|'.join(CACHE_BACKENDS)})")
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, max_items: int = 10000, backend: Optional[str] = None):
+        self.name = name
+        self.ttl = float(ttl)
+        self.max_items = int(max_items)
+        self._backend = make_backend(name, backend)
+
+    def get(self, key: str) -> Optional[Any]:
+        val = self._backend.get(key)
+        if val is None:
+            metrics.CACHE_MISSES.inc(cache=self.name)
+            return None
+        metrics.CACHE_HITS.inc(cache=self.name)
+        return val
+
+    def set(self, key: str, val: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else float(ttl))
+        self._backend.set(key, val, expires_at, self.max_items)
+
+    def clear(self) -> None:
+        self._backend.clear()
+
+    def __len__(self) -> int:
+        return len(self._backend)
@@ -0,0 +1,155 @@
+"""
+Couverture des données et score de complétude (post-traitement, par colonnes).
+
+Chaque prospect est réduit à une ligne de booléens (site, email, téléphone, horaires, adresse);
+la matrice n × 5 donne en une passe:
+- `score` par prospect: somme pondérée (0..1), "facilité à contacter" pour les commerciaux
+- `coverage` de la recherche: part des résultats qui ont chaque champ + score moyen / médian
+- l'ordre `sort=score` (décroissant, stable: à score égal l'ordre du provider est gardé)
+
+Avec une projection `fields=`, seules les colonnes dont les champs ont été demandés sont mesurées
+(les autres: `None` dans coverage, 0 dans le score); `sort=score` demande toujours tous les champs.
+
+NumPy si installé (produit matrice × poids, argsort); sinon colonnes `array` et sommes Python.
+"""
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.service.fields import wants, with_required
+
+try:  # dépendance optionnelle
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# colonne -> poids dans le score (somme = 1); téléphone et email pèsent le plus
+COVERAGE_WEIGHTS = {
+    "phone": 0.35,
+    "email": 0.3,
+    "site": 0.2,
+    "opening_hours": 0.1,
+    "address": 0.05,
+}
+COLUMNS = tuple(COVERAGE_WEIGHTS)
+
+# colonne -> champs lus pour la construire (à demander au provider, cf. service.fields)
+COLUMN_FIELDS = {
+    "phone": ("telephones", "whatsapp"),
+    "email": ("emails",),
+    "site": ("site",),
+    "opening_hours": ("horaires",),
+    "address": ("adresse",),
+}
+COVERAGE_FIELDS = frozenset(f for names in COLUMN_FIELDS.values() for f in names)
+
+SORT_MODES = ("score",)
+
+
+def score_fields(fields: Optional[frozenset], sort: Optional[str]) -> Optional[frozenset]:
+    """Champs lus par le score: ceux demandés, ou tous ceux du score si on trie dessus."""
+    return with_required(fields, COVERAGE_FIELDS) if sort == "score" else fields
+
+
+def _row(p: dict) -> Tuple[bool, ...]:
+    addr = p.get("adresse") or {}
+    return (
+        bool(p.get("telephones") or p.get("whatsapp")),
+        bool(p.get("emails")),
+        bool(p.get("site")),
+        bool(p.get("horaires")),
+        bool(addr.get("street") or addr.get("full")),
+    )
+
+
+def measured_columns(fields: Optional[frozenset]) -> Tuple[str, ...]:
+    """Colonnes calculables avec la projection `fields` (None = tout)."""
+    return tuple(c for c in COLUMNS if wants(fields, *COLUMN_FIELDS[c]))
+
+
+def _matrix(results: List[dict], fields: Optional[frozenset] = None) -> Tuple[Any, Any]:
+    """(matrice n × colonnes de 0/1, score par prospect); colonnes non mesurées à 0."""
+    n = len(results)
+    measured = measured_columns(fields)
+    weights = [COVERAGE_WEIGHTS[c] if c in measured else 0.0 for c in COLUMNS]
+    if np is not None:
+        flat = np.fromiter((v for p in results for v in _row(p)), dtype=np.uint8, count=n * len(COLUMNS))
+        matrix = flat.reshape(n, len(COLUMNS))
+        # arrondi: deux combinaisons de même poids ont le même score (tri stable)
+        return matrix, np.round(matrix @ np.asarray(weights), 2)
+
+    cols = [array("B") for _ in COLUMNS]
+    for p in results:
+        for col, v in zip(cols, _row(p)):
+            col.append(v)
+    scores = array("d", bytes(8 * n))
+    for col, w in zip(cols, weights):
+        for i, v in enumerate(col):
+            if v:
+                scores[i] += w
+    for i in range(n):
+        scores[i] = round(scores[i], 2)
+    return cols, scores
+
+
+def _empty_coverage(fields: Optional[frozenset] = None) -> Dict[str, Any]:
+    measured = measured_columns(fields)
+    return {"count": 0, **{c: 0.0 if c in measured else None for c in COLUMNS}, "score_avg": 0.0, "score_median": 0.0}
+
+
+def score_prospects(results: List[dict], fields: Optional[frozenset] = None) -> List[dict]:
+    """Ajoute (en place) `score` à chaque prospect, ex: après enrichissement."""
+    if results:
+        _, scores = _matrix(results, fields)
+        for p, s in zip(results, scores):
+            p["score"] = float(s)
+    return results
+
+
+def compute_coverage(
+    results: List[dict],
+    *,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[frozenset] = None,
+) -> Tuple[List[dict], Dict[str, Any]]:
+    """
+    Score chaque prospect (en place), trie si `sort="score"`, garde les `limit` premiers,
+    et retourne (résultats, coverage) où coverage porte sur les résultats gardés.
+    fields: champs lus (cf. score_fields); colonnes hors projection non mesurées.
+    """
+    if sort is not None and sort not in SORT_MODES:
+        raise ValueError(f"sort invalide: '{sort}' (attendu: {', '.join(SORT_MODES)})")
+    if not results:
+        return results, _empty_coverage(fields)
+
+    measured = measured_columns(fields)
+    matrix, scores = _matrix(results, fields)
+    n = len(results)
+    if np is not None:
+        order = np.argsort(-scores, kind="stable") if sort == "score" else np.arange(n)
+        order = order[:limit]
+        kept = scores[order]
+        sums = matrix[order].sum(axis=0)
+        order = order.tolist()
+    else:
+        order = sorted(range(n), key=lambda i: -scores[i]) if sort == "score" else list(range(n))
+        order = order[:limit]
+        kept = [scores[i] for i in order]
+        sums = [sum(col[i] for i in order) for col in matrix]
+
+    results = [results[i] for i in order]
+    for p, s in zip(results, kept):
+        p["score"] = float(s)
+
+    m = len(results)
+    if not m:
+        return results, _empty_coverage(fields)
+    ordered = sorted(float(s) for s in kept)
+    median = ordered[m // 2] if m % 2 else (ordered[m // 2 - 1] + ordered[m // 2]) / 2
+    return results, {
+        "count": m,
+        **{c: round(float(s) / m, 3) if c in measured else None for c, s in zip(COLUMNS, sums)},
+        "score_avg": round(sum(ordered) / m, 3),
+        "score_median": round(median, 3),
+    }
@@ -1,17 +1,58 @@
+import os
 import re
 import time
+import unicodedata
 from urllib.parse import urljoin, urlparse
-from typing import Tuple
+from urllib.robotparser import RobotFileParser
+from typing import Optional, Tuple
 
 import requests
 
+from src import metrics
+from src.deadline import expired, remaining
+from src.service.cache import TTLCache
+from src.service.phones import dedupe_phones, phone_keys, region_from_country
+
 
 EMAIL_RE = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
 MAILTO_RE = re.compile(r"mailto:([^\"\'\?\s>]+)", re.IGNORECASE)
 TEL_RE = re.compile(r"tel:([+0-9][0-9\s().-]{5,})", re.IGNORECASE)
 
-CONTACT_WORDS = ["contact", "contact-us", "contacts", "support", "help", "a-propos", "about", "mentions-legales"]
-CONTACT_PATH_GUESSES = ["/contact", "/contact-us", "/contacts", "/support", "/help", "/a-propos", "/about"]
+# mots-clés des pages contact (chemin ou texte du lien) -> poids pour le classement
+CONTACT_WORDS = {
+    "nous-contacter": 10, "contactez": 10, "contact": 9, "ecrivez": 8, "nous ecrire": 8,
+    "impressum": 7, "mentions-legales": 6, "mentions legales": 6, "mentions": 5, "legal": 4,
+    "a-propos": 4, "a propos": 4, "about": 4, "qui-sommes-nous": 4, "qui sommes nous": 4,
+    "support": 3, "help": 2, "aide": 2,
+}
+CONTACT_PATH_GUESS = "/contact"
+SKIP_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".zip", ".doc", ".docx")
+
+# pages contact max par site (après la home), arrêt anticipé dès qu'on a email + téléphone
+MAX_CONTACT_PAGES = 2
+
+# Deadline: on ne lance pas un fetch avec moins que ça
+MIN_FETCH_SECONDS = 1.0
+
+USER_AGENT = "prospecting/1.0 (contact: randriamanjakacedric@gmail.com)"
+
+ROBOTS_TTL = int(os.getenv("ENRICH_ROBOTS_TTL", "86400"))  # 24h
+# robots.txt injoignable (5xx, réseau): tout autorisé, mais on réessaie vite
+ROBOTS_ERROR_TTL = int(os.getenv("ENRICH_ROBOTS_ERROR_TTL", "300"))
+SITEMAP_TTL = int(os.getenv("ENRICH_SITEMAP_TTL", "86400"))
+SITEMAP_MAX_BYTES = 2_000_000
+
+# contacts trouvés par site (évite de re-scraper; rafraîchi par le prewarm)
+SITE_CACHE_TTL = int(os.getenv("ENRICH_SITE_CACHE_TTL", "86400"))
+SITE_CACHE_MAX = int(os.getenv("ENRICH_SITE_CACHE_MAX", "20000"))
+
+_ROBOTS_CACHE = TTLCache("robots", ROBOTS_TTL)
+_SITEMAP_CACHE = TTLCache("sitemap", SITEMAP_TTL)
+_SITE_CACHE = TTLCache("enrich", SITE_CACHE_TTL, max_items=SITE_CACHE_MAX)
+
+ANCHOR_RE = re.compile(r'<a[^>]+href=["\']([^"\']+)["\'][^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+LOC_RE = re.compile(r"<loc>\s*([^<\s]+)\s*</loc>", re.IGNORECASE)
 
 
 def _normalize_url(url: str) -> str:
@@ -30,14 +71,25 @@ def _same_domain(a: str, b: str) -> bool:
         return False
 
 
-def _fetch(session: requests.Session, url: str, timeout: int) -> Tuple[str, dict]:
+def _origin(url: str) -> str:
+    u = urlparse(url)
+    return f"{u.scheme}://{u.netloc.lower()}"
+
+
+def _fetch(
+    session: requests.Session,
+    url: str,
+    timeout: float,
+    accept: str = "text/html,application/xhtml+xml",
+) -> Tuple[str, dict]:
     headers = {
-        "User-Agent": "prospecting/1.0 (contact: randriamanjakacedric@gmail.com)",
-        "Accept": "text/html,application/xhtml+xml",
+        "User-Agent": USER_AGENT,
+        "Accept": accept,
     }
     t0 = time.perf_counter()
     try:
-        r = session.get(url, headers=headers, timeout=timeout, allow_redirects=True)
+        with metrics.UPSTREAM_INFLIGHT.track(upstream="enrich"):
+            r = session.get(url, headers=headers, timeout=timeout, allow_redirects=True)
         sec = time.perf_counter() - t0
         status = int(getattr(r, "status_code", 0) or 0)
         html = (r.text or "") if status and status < 400 else ""
@@ -47,7 +99,7 @@ def _fetch(session: requests.Session, url: str, timeout: int) -> Tuple[str, dict
         return "", {"url": url, "ok": False, "status": 0, "seconds": round(sec, 3), "error": str(e)}
 
 
-def _extract(html: str) -> dict:
+def _extract(html: str, region: Optional[str] = None) -> dict:
     emails = []
     for m in MAILTO_RE.findall(html or ""):
         if m and m not in emails:
@@ -57,79 +109,231 @@ def _extract(html: str) -> dict:
         if e and e not in emails:
             emails.append(e.strip())
 
-    phones = []
-    for m in TEL_RE.findall(html or ""):
-        p = (m or "").strip()
-        if p and p not in phones:
-            phones.append(p)
+    phones = dedupe_phones(TEL_RE.findall(html or ""), region)
 
     return {"emails": emails, "telephones": phones}
 
 
-def _find_contact_urls(base: str, html: str, limit: int = 2) -> list[str]:
+def _fold(s: str) -> str:
+    s = unicodedata.normalize("NFKD", s or "")
+    return "".join(c for c in s if not unicodedata.combining(c)).lower()
+
+
+def _contact_score(url: str, text: str = "") -> int:
+    """Poids "page contact" d'un lien: mots du chemin + texte de l'ancre; 0 = pas une page contact."""
+    path = _fold(urlparse(url).path)
+    if path.endswith(SKIP_EXTENSIONS):
+        return 0
+    label = " ".join(_fold(TAG_RE.sub(" ", text or "")).split())
+    score = max((w for k, w in CONTACT_WORDS.items() if k in path), default=0)
+    score += max((w for k, w in CONTACT_WORDS.items() if k in label), default=0)
+    if not score:
+        return 0
+    # pages proches de la racine d'abord
+    return score * 10 - path.count("/")
+
+
+def _find_contact_urls(base: str, html: str, limit: int = MAX_CONTACT_PAGES) -> list[str]:
+    """Liens de la page vers des pages contact (même domaine), classés par pertinence."""
     if not html:
         return []
-    anchors = re.findall(r'<a[^>]+href=["\']([^"\']+)["\']', html, flags=re.IGNORECASE)
-    out = []
-    for href in anchors:
+    scored: dict[str, int] = {}
+    for href, text in ANCHOR_RE.findall(html):
         h = (href or "").strip()
         if not h or h.startswith(("#", "mailto:", "tel:", "javascript:")):
             continue
-        low = h.lower()
-        if any(w in low for w in CONTACT_WORDS):
-            full = urljoin(base, h)
-            if _same_domain(base, full) and full not in out:
-                out.append(full)
-        if len(out) >= limit:
-            break
-    return out
+        full = urljoin(base, h).split("#", 1)[0]
+        if not _same_domain(base, full) or full.rstrip("/") == base.rstrip("/"):
+            continue
+        score = _contact_score(full, text)
+        if score > scored.get(full, 0):
+            scored[full] = score
+    ranked = sorted(scored, key=lambda u: (-scored[u], len(u)))
+    return ranked[:limit]
+
+
+def _robots(session: requests.Session, origin: str, timeout: float, stats: dict) -> Tuple[Optional[RobotFileParser], list]:
+    """robots.txt du domaine (cache TTL). Retourne (parser ou None = tout autorisé, sitemaps déclarés)."""
+    # en cache: le texte brut (JSON), pas le parser; "" = pas de robots.txt
+    text = _ROBOTS_CACHE.get(origin)
+    if text is None:
+        text, info = _fetch(session, origin + "/robots.txt", timeout=timeout, accept="text/plain")
+        stats["meta_fetches"] += 1
+        # 4xx = pas de robots.txt (réponse stable); 5xx / erreur réseau = panne passagère
+        failed = not info["status"] or info["status"] >= 500
+        text = text if info["ok"] else ""
+        _ROBOTS_CACHE.set(origin, text, ttl=ROBOTS_ERROR_TTL if failed else None)
+    if not text:
+        return None, []
+    parser = RobotFileParser()
+    parser.parse(text.splitlines())
+    return parser, list(parser.site_maps() or [])
+
+
+def _allowed(parser: Optional[RobotFileParser], url: str) -> bool:
+    return parser is None or parser.can_fetch(USER_AGENT, url)
+
+
+def _sitemap_contact_urls(
+    session: requests.Session, origin: str, url: str, timeout: float, stats: dict
+) -> list[str]:
+    """Pages contact trouvées dans le sitemap `url` du domaine (cache TTL, un seul niveau)."""
+    cached = _SITEMAP_CACHE.get(origin)
+    if cached is not None:
+        return cached
+    xml, info = _fetch(session, url, timeout=timeout, accept="application/xml,text/xml")
+    stats["meta_fetches"] += 1
+    found: dict[str, int] = {}
+    if info["ok"] and xml:
+        for loc in LOC_RE.findall(xml[:SITEMAP_MAX_BYTES]):
+            if _same_domain(origin, loc):
+                score = _contact_score(loc)
+                if score:
+                    found[loc] = score
+    ranked = sorted(found, key=lambda u: (-found[u], len(u)))[:MAX_CONTACT_PAGES]
+    _SITEMAP_CACHE.set(origin, ranked)
+    return ranked
 
 
-def enrich_prospects(prospects: list[dict], return_meta: bool = False, timeout: int = 15, delay: float = 0.7):
+def _complete(emails: list, phones: list) -> bool:
+    return bool(emails) and bool(phones)
+
+
+def _merge_found(p: dict, found: dict, region: Optional[str]) -> None:
+    """Ajoute au prospect les contacts trouvés sur son site."""
+    p["emails"] = list(dict.fromkeys((p.get("emails") or []) + found["emails"]))
+    p["telephones"] = dedupe_phones((p.get("telephones") or []) + found["telephones"], region)
+    p["phone_keys"] = phone_keys(p["telephones"] + (p.get("whatsapp") or []), region)
+
+
+def enrich_prospects(
+    prospects: list[dict],
+    return_meta: bool = False,
+    timeout: int = 15,
+    delay: float = 0.7,
+    region: Optional[str] = None,
+    deadline: Optional[float] = None,
+    refresh: bool = False,
+):
+    """
+    Scrape le site (+ pages contact) de chaque prospect qui en a un.
+    - arrêt anticipé dès qu'on a un email ET un téléphone (enrich_skipped="complete" si déjà le cas)
+    - pages contact classées (texte + chemin des liens), sinon sitemap déclaré dans robots.txt,
+      sinon une seule devinette
+    - robots.txt (cache par domaine avec TTL) lu seulement avant une page au-delà de la home, respecté pour celles-ci
+    - contacts trouvés mis en cache par site (ENRICH_SITE_CACHE_TTL); refresh: re-scrape quand même (prewarm)
+    deadline (perf_counter absolu): chaque fetch utilise au plus le temps restant; une fois le budget
+    épuisé on s'arrête proprement et les prospects non traités sont marqués enrich_skipped="deadline".
+    """
     t0 = time.perf_counter()
     s = requests.Session()
     enriched = 0
+    skipped = 0
+    stats = {
+        "page_fetches": 0, "meta_fetches": 0, "early_exits": 0, "already_complete": 0, "robots_blocked": 0,
+        "cache_hits": 0,
+    }
+
+    def fetch_timeout() -> float:
+        left = remaining(deadline)
+        return timeout if left is None else max(0.1, min(timeout, left))
 
     for p in prospects:
         p["enrich_attempted"] = False
         p["enrich_seconds"] = None
         p["enrich_error"] = None
+        p["enrich_skipped"] = None
+        p["enrich_fetches"] = 0
+        p["enrich_cache_hit"] = False
 
         site = _normalize_url(p.get("site") or "")
         if not site:
             continue
 
+        if _complete(p.get("emails") or [], p.get("telephones") or []):
+            p["enrich_skipped"] = "complete"
+            stats["already_complete"] += 1
+            continue
+
+        p_region = region_from_country((p.get("adresse") or {}).get("country")) or region
+
+        cached = None if refresh else _SITE_CACHE.get(site)
+        if cached is not None:
+            _merge_found(p, cached, p_region)
+            p["enrich_cache_hit"] = True
+            stats["cache_hits"] += 1
+            enriched += 1
+            continue
+
+        if expired(deadline, margin=MIN_FETCH_SECONDS):
+            p["enrich_skipped"] = "deadline"
+            skipped += 1
+            continue
+
         p["enrich_attempted"] = True
         t_item = time.perf_counter()
 
         try:
-            html, info = _fetch(s, site, timeout=timeout)
-            extracted = _extract(html)
-
-            # pages contact
-            urls = _find_contact_urls(site, html, limit=2)
-            if not urls:
-                for path in CONTACT_PATH_GUESSES:
-                    urls.append(urljoin(site, path))
-                    if len(urls) >= 2:
-                        break
+            origin = _origin(site)
+            emails = list(p.get("emails") or [])
+            phones = list(p.get("telephones") or [])
+            found = {"emails": [], "telephones": []}  # trouvé sur le site (mis en cache)
 
-            for u in urls:
-                time.sleep(delay)
-                html2, _ = _fetch(s, u, timeout=timeout)
-                ex2 = _extract(html2)
-                extracted["emails"] += [x for x in ex2["emails"] if x not in extracted["emails"]]
-                extracted["telephones"] += [x for x in ex2["telephones"] if x not in extracted["telephones"]]
+            def absorb(html: str) -> None:
+                ex = _extract(html, p_region)
+                for k, dest in (("emails", emails), ("telephones", phones)):
+                    found[k].extend(x for x in ex[k] if x not in found[k])
+                    dest.extend(x for x in ex[k] if x not in dest)
 
-            # merge dans prospect
-            p["emails"] = list(dict.fromkeys((p.get("emails") or []) + extracted["emails"]))
-            p["telephones"] = list(dict.fromkeys((p.get("telephones") or []) + extracted["telephones"]))
+            html, info = _fetch(s, site, timeout=fetch_timeout())
+            p["enrich_fetches"] += 1
+            absorb(html)
 
-            enriched += 1
+            if not _complete(emails, phones) and info["ok"]:
+                # robots.txt seulement avant d'explorer le site au-delà de la home (URL publiée par le POI)
+                robots, sitemaps = _robots(s, origin, fetch_timeout(), stats)
+                # pages contact: liens de la home, sinon sitemap déclaré, sinon une devinette
+                # (pas de /sitemap.xml deviné: un fetch de plus pour un fichier souvent absent)
+                urls = _find_contact_urls(site, html)
+                declared = next((u for u in sitemaps if _same_domain(origin, u)), None)
+                if not urls and declared:
+                    urls = _sitemap_contact_urls(s, origin, declared, fetch_timeout(), stats)
+                if not urls:
+                    urls = [urljoin(site, CONTACT_PATH_GUESS)]
+
+                blocked = False
+                for u in urls:
+                    if _complete(emails, phones):
+                        break
+                    if not _allowed(robots, u):
+                        blocked = True
+                        continue
+                    if expired(deadline, margin=delay + MIN_FETCH_SECONDS):
+                        # on garde ce qu'on a déjà trouvé, mais l'item n'est pas complet
+                        p["enrich_skipped"] = "deadline"
+                        skipped += 1
+                        break
+                    metrics.sleep_backoff(delay, "enrich")
+                    html2, _ = _fetch(s, u, timeout=fetch_timeout())
+                    p["enrich_fetches"] += 1
+                    absorb(html2)
+                if blocked:
+                    stats["robots_blocked"] += 1
+
+            if _complete(emails, phones):
+                stats["early_exits"] += 1
+
+            _merge_found(p, found, p_region)
+            if p["enrich_skipped"] != "deadline":
+                # coupé par la deadline: contacts partiels gardés, mais item non terminé
+                enriched += 1
+                if info["ok"]:
+                    _SITE_CACHE.set(site, found)
 
         except Exception as e:
             p["enrich_error"] = str(e)
 
+        stats["page_fetches"] += p["enrich_fetches"]
         p["enrich_seconds"] = round(time.perf_counter() - t_item, 3)
 
     total = time.perf_counter() - t0
@@ -138,5 +342,7 @@ def enrich_prospects(prospects: list[dict], return_meta: bool = False, timeout:
         "enriched_count": enriched,
         "total_seconds": round(total, 3),
         "avg_seconds": round(total / enriched, 3) if enriched else 0.0,
+        "skipped_deadline": skipped,
+        **stats,
     }
     return (prospects, meta) if return_meta else prospects
@@ -0,0 +1,73 @@
+"""
+Projection des champs d'un prospect (`fields=`).
+
+Le provider ne construit que les blocs demandés (+ ceux dont les étapes suivantes ont besoin:
+enrichissement, dedupe smart, filtre batch), puis le controller retire ce qui n'a pas été demandé.
+`fields` accepte des noms de groupes (`contacts`, `business`, …) ou des champs individuels (`emails`).
+"""
+from typing import Iterable, Optional
+
+
+# toujours présents (identité + position)
+CORE_FIELDS = ("entity_key", "nom", "lat", "lon", "source")
+
+FIELD_GROUPS = {
+    "activite": ("activite_type", "activite_valeur"),
+    "contacts": ("site", "emails", "telephones", "whatsapp", "phone_keys"),
+    "adresse": ("adresse",),
+    "business": ("etoiles", "cuisine", "horaires", "operateur", "marque"),
+    "social": ("contacts_social",),
+    "payment": ("payment",),
+    "extras": ("extras",),
+    "osm": ("osm",),
+    "raw_tags": ("raw_tags",),
+}
+
+OPTIONAL_FIELDS = frozenset(f for group in FIELD_GROUPS.values() for f in group)
+
+# champs lus par les étapes après le provider
+ENRICH_FIELDS = frozenset(FIELD_GROUPS["contacts"] + ("adresse",))
+SMART_DEDUPE_FIELDS = frozenset(FIELD_GROUPS["contacts"])
+
+
+def parse_fields(value: Optional[str]) -> Optional[frozenset]:
+    """'contacts,adresse,horaires' -> champs optionnels demandés; None (vide / 'all') = tout."""
+    names = [n.strip().lower() for n in (value or "").split(",") if n.strip()]
+    if not names or "all" in names:
+        return None
+    out: set = set()
+    for n in names:
+        if n in FIELD_GROUPS:
+            out.update(FIELD_GROUPS[n])
+        elif n in OPTIONAL_FIELDS:
+            out.add(n)
+        elif n not in CORE_FIELDS:
+            raise ValueError(
+                f"fields invalide: '{n}' (groupes: {', '.join(FIELD_GROUPS)}; ou un champ, ex: emails)"
+            )
+    return frozenset(out)
+
+
+def with_required(fields: Optional[frozenset], *extra: Iterable[str]) -> Optional[frozenset]:
+    """Ajoute les champs nécessaires aux étapes suivantes (None reste None = tout)."""
+    if fields is None:
+        return None
+    out = set(fields)
+    for e in extra:
+        out.update(e)
+    return frozenset(out)
+
+
+def wants(fields: Optional[frozenset], *names: str) -> bool:
+    return fields is None or any(n in fields for n in names)
+
+
+def project(records: list[dict], fields: Optional[frozenset]) -> list[dict]:
+    """Retire (en place) les champs optionnels non demandés; les champs ajoutés en aval (enrich_*, sources…) restent."""
+    if fields is None:
+        return records
+    drop = OPTIONAL_FIELDS - fields
+    for r in records:
+        for k in drop:
+            r.pop(k, None)
+    return records
@@ -0,0 +1,77 @@
+"""
+Normalisation des téléphones (E.164) via `phonenumbers`.
+
+- region: code pays ISO-2 (addr:country OSM ou geocoding) pour les numéros locaux (ex: 0341234567)
+- parse mis en cache par (raw, region): mêmes numéros répétés sur beaucoup de POI / pages
+- dédoublonnage sur la forme normalisée; `phone_keys` = clés de jointure inter-sources
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import phonenumbers
+from phonenumbers import NumberParseException, PhoneNumberFormat
+
+
+DEFAULT_REGION = (os.getenv("PHONE_DEFAULT_REGION") or "").strip().upper() or None
+PHONE_CACHE_SIZE = int(os.getenv("PHONE_CACHE_SIZE", "65536"))
+
+_PREFIX_RE = re.compile(r"^(tel|callto|phone|tél)\s*:\s*", re.IGNORECASE)
+_REGION_RE = re.compile(r"^[A-Za-z]{2}$")
+
+
+def region_from_country(country: Optional[str]) -> Optional[str]:
+    """'mg' / 'MG' -> 'MG'; tout le reste (nom de pays libre…) -> None."""
+    c = (country or "").strip()
+    if not _REGION_RE.match(c):
+        return None
+    c = c.upper()
+    return c if c in phonenumbers.SUPPORTED_REGIONS else None
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def normalize_phone(raw: str, region: Optional[str] = None) -> Optional[str]:
+    """Retourne le numéro en E.164 (+261341234567) ou None si non interprétable."""
+    s = _PREFIX_RE.sub("", (raw or "").strip())
+    if not s:
+        return None
+    if s.startswith("00"):
+        s = "+" + s[2:]
+    try:
+        n = phonenumbers.parse(s, region or DEFAULT_REGION)
+    except NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(n):
+        return None
+    return phonenumbers.format_number(n, PhoneNumberFormat.E164)
+
+
+def dedupe_phones(values: Iterable[str], region: Optional[str] = None) -> list[str]:
+    """
+    Dédoublonne sur la forme normalisée.
+    Valeur renvoyée: E.164 si parsable, sinon la chaîne brute (on ne perd rien).
+    """
+    out: list[str] = []
+    seen: set[str] = set()
+    for v in values:
+        raw = (v or "").strip()
+        if not raw:
+            continue
+        norm = normalize_phone(raw, region)
+        key = norm or _PREFIX_RE.sub("", raw)
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(key)
+    return out
+
+
+def phone_keys(values: Iterable[str], region: Optional[str] = None) -> list[str]:
+    """Uniquement les numéros E.164 valides: clés de jointure pour le matching inter-sources."""
+    out: list[str] = []
+    for v in values:
+        norm = normalize_phone((v or "").strip(), region)
+        if norm and norm not in out:
+            out.append(norm)
+    return out
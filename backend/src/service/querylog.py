@@ -0,0 +1,71 @@
+"""
+Journal des recherches (fréquence par ville × tags), pour apprendre la hot-list du prewarm.
+
+- compteur en mémoire du process (prewarm en tâche de fond)
+- si PROSPECT_QUERY_LOG est défini: une ligne JSON par recherche (lue par le CLI prewarm)
+Seules les recherches par `where` sont comptées: ce sont elles qui paient Nominatim.
+"""
+import json
+import os
+import time
+from collections import Counter
+from threading import Lock
+from typing import Optional
+
+
+QUERY_LOG_PATH = os.getenv("PROSPECT_QUERY_LOG") or None
+
+_COUNTS: Counter = Counter()
+_LOCK = Lock()
+
+
+def _key(where: str, tags: Optional[str], limit: int, radius_km: Optional[float]) -> tuple:
+    return (where.strip().lower(), tags or "", int(limit), radius_km)
+
+
+def record_query(
+    *,
+    where: Optional[str],
+    tags: Optional[str],
+    limit: int,
+    radius_km: Optional[float] = None,
+    path: Optional[str] = QUERY_LOG_PATH,
+) -> None:
+    """tags = tags résolus (après category -> tags), pour retomber sur la même requête Overpass."""
+    if not where or not where.strip():
+        return
+    key = _key(where, tags, limit, radius_km)
+    with _LOCK:
+        _COUNTS[key] += 1
+        if path:
+            try:
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps({
+                        "ts": int(time.time()), "where": key[0], "tags": key[1], "limit": key[2], "radius_km": radius_km,
+                    }) + "\n")
+            except OSError:
+                pass  # le journal ne doit jamais casser une recherche
+
+
+def top_queries(n: int = 50, path: Optional[str] = None, since: Optional[float] = None) -> list[dict]:
+    """Recherches les plus fréquentes: depuis le fichier `path` si fourni, sinon le compteur du process."""
+    if path:
+        counts: Counter = Counter()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        it = json.loads(line)
+                    except ValueError:
+                        continue
+                    if since and it.get("ts", 0) < since:
+                        continue
+                    counts[_key(it["where"], it.get("tags"), it.get("limit", 20), it.get("radius_km"))] += 1
+    else:
+        with _LOCK:
+            counts = Counter(_COUNTS)
+
+    return [
+        {"where": where, "tags": tags or None, "limit": limit, "radius_km": radius_km, "count": c}
+        for (where, tags, limit, radius_km), c in counts.most_common(n)
+    ]
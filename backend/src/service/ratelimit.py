@@ -0,0 +1,116 @@
+"""
+Espacement minimal entre deux appels à un upstream (ex: Nominatim, 1 req/s), partagé entre workers.
+
+Chaque appelant réserve atomiquement le prochain créneau libre (max(maintenant, dernier + intervalle))
+puis dort jusqu'à ce créneau hors verrou: N workers en attente obtiennent des créneaux espacés,
+et un appelant dont la deadline tombe avant son créneau abandonne sans rien réserver.
+
+Coordination (PROSPECT_RATE_LIMIT_BACKEND):
+- `memory` (défaut): verrou du process (un seul worker)
+- `file`: fcntl.flock sur PROSPECT_RATE_LIMIT_DIR/prospect-ratelimit-<nom>.lock (workers d'une même machine);
+  répertoire privé (0700, défaut propre à l'utilisateur) et fichier 0600: un autre compte ne peut ni
+  bloquer le verrou ni réécrire le créneau
+- `postgres`: pg_advisory_xact_lock + table prospect_rate_limits, horloge de la base (plusieurs machines)
+"""
+import os
+import struct
+import tempfile
+import time
+from threading import Lock
+from typing import Optional
+
+from src import metrics
+from src.deadline import DeadlineExceeded, expired
+from src.service.cache import private_dir
+
+
+RATE_LIMIT_BACKEND = os.getenv("PROSPECT_RATE_LIMIT_BACKEND", "memory").strip().lower()
+RATE_LIMIT_DIR = os.getenv(
+    "PROSPECT_RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), f"prospect-ratelimit-{os.getuid()}")
+)
+RATE_LIMIT_BACKENDS = ("memory", "file", "postgres")
+
+
+class IntervalLimiter:
+    def __init__(self, name: str, min_interval: float, backend: Optional[str] = None):
+        self.name = name
+        self.min_interval = float(min_interval)
+        self.backend = (backend or RATE_LIMIT_BACKEND).strip().lower()
+        if self.backend not in RATE_LIMIT_BACKENDS:
+            raise RuntimeError(
+                f"PROSPECT_RATE_LIMIT_BACKEND inconnu: '{self.backend}' ({'|'.join(RATE_LIMIT_BACKENDS)})"
+            )
+        self._last = 0.0
+        self._lock = Lock()
+        self._ready = False  # postgres: table créée / file: répertoire vérifié
+
+    def wait(self, deadline: Optional[float] = None, min_interval: Optional[float] = None) -> float:
+        """Bloque jusqu'au créneau réservé; retourne les secondes attendues. DeadlineExceeded si trop tard."""
+        interval = self.min_interval if min_interval is None else float(min_interval)
+        reserve = {"memory": self._reserve_memory, "file": self._reserve_file, "postgres": self._reserve_postgres}
+        wait = reserve[self.backend](interval, deadline)
+        if wait > 0:
+            metrics.sleep_backoff(wait, self.name)
+        return max(0.0, wait)
+
+    @staticmethod
+    def _check(wait: float, deadline: Optional[float], name: str) -> None:
+        if wait > 0 and expired(deadline, margin=wait):
+            raise DeadlineExceeded(f"Deadline dépassée en attente du rate limit {name}.")
+
+    def _reserve_memory(self, interval: float, deadline: Optional[float]) -> float:
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._last + interval)
+            self._check(slot - now, deadline, self.name)
+            self._last = slot
+            return slot - now
+
+    def _reserve_file(self, interval: float, deadline: Optional[float]) -> float:
+        import fcntl  # POSIX uniquement
+        path = os.path.join(RATE_LIMIT_DIR, f"prospect-ratelimit-{self.name}.lock")
+        # verrou inter-process + verrou du process (flock est par descripteur, pas par thread)
+        with self._lock:
+            if not self._ready:
+                private_dir(RATE_LIMIT_DIR)
+                self._ready = True
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.pread(fd, 8, 0)
+                last = struct.unpack("d", raw)[0] if len(raw) == 8 else 0.0
+                now = time.time()
+                slot = max(now, last + interval)
+                self._check(slot - now, deadline, self.name)
+                os.pwrite(fd, struct.pack("d", slot), 0)
+                return slot - now
+            finally:
+                os.close(fd)  # libère aussi le flock
+
+    def _reserve_postgres(self, interval: float, deadline: Optional[float]) -> float:
+        from src.db import get_conn
+        # une exception dans le bloc => rollback par le pool (rien n'est réservé)
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                if not self._ready:
+                    cur.execute(
+                        "CREATE TABLE IF NOT EXISTS prospect_rate_limits ("
+                        " name TEXT PRIMARY KEY, last_at DOUBLE PRECISION NOT NULL);"
+                    )
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (f"prospect_rate_limit:{self.name}",))
+                cur.execute(
+                    "SELECT extract(epoch FROM clock_timestamp())::float8, "
+                    "(SELECT last_at FROM prospect_rate_limits WHERE name = %s);",
+                    (self.name,),
+                )
+                now, last = cur.fetchone()
+                slot = max(float(now), float(last or 0.0) + interval)
+                self._check(slot - now, deadline, self.name)
+                cur.execute(
+                    "INSERT INTO prospect_rate_limits (name, last_at) VALUES (%s, %s) "
+                    "ON CONFLICT (name) DO UPDATE SET last_at = EXCLUDED.last_at;",
+                    (self.name, slot),
+                )
+            conn.commit()
+        self._ready = True
+        return slot - now
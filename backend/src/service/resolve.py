@@ -0,0 +1,316 @@
+"""
+Entity resolution: regroupe les prospects qui désignent le même commerce
+(plusieurs sources, ou node + way OSM) et les fusionne avec leur provenance.
+
+Pas de comparaison O(n²): on ne compare que les candidats qui partagent
+- une cellule geohash à moins de max_distance_km ET un trigramme du nom normalisé, ou
+- une clé exacte (téléphone E.164, domaine du site, email)
+Les blocs trop gros (trigrammes très fréquents dans une zone dense) sont ignorés,
+et seuls les meilleurs candidats par enregistrement sont scorés => ~linéaire.
+"""
+import heapq
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+GEOHASH_PRECISION = int(os.getenv("RESOLVE_GEOHASH_PRECISION", "6"))  # ≈ 1.2km × 0.6km
+MAX_DISTANCE_KM = float(os.getenv("RESOLVE_MAX_DISTANCE_KM", "0.3"))
+MATCH_THRESHOLD = float(os.getenv("RESOLVE_MATCH_THRESHOLD", "0.6"))
+MAX_BLOCK_SIZE = int(os.getenv("RESOLVE_MAX_BLOCK_SIZE", "200"))
+MAX_CANDIDATES = int(os.getenv("RESOLVE_MAX_CANDIDATES", "20"))
+MIN_SHARED_NGRAMS = float(os.getenv("RESOLVE_MIN_SHARED_NGRAMS", "0.3"))  # part des trigrammes du nom
+
+# poids du score (somme = 1); sans le nom, contacts + distance plafonnent à 0.55 < MATCH_THRESHOLD:
+# un même téléphone / email à moins de MAX_DISTANCE_KM est donc une correspondance directe (cf. _score)
+W_NAME = 0.45
+W_DISTANCE = 0.2
+W_PHONE = 0.15
+W_DOMAIN = 0.1
+W_EMAIL = 0.1
+
+_NAME_STOPWORDS = {"le", "la", "les", "l", "de", "du", "des", "d", "et", "the", "and", "of", "chez"}
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+LIST_FIELDS = ["emails", "telephones", "whatsapp", "phone_keys"]
+DICT_FIELDS = ["adresse", "contacts_social", "payment", "extras"]
+SCALAR_FIELDS = [
+    "activite_type", "activite_valeur", "site", "etoiles", "cuisine",
+    "horaires", "operateur", "marque", "lat", "lon", "osm",
+]
+
+
+def _cell_size(precision: int) -> Tuple[float, float]:
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+_CELL_DLAT, _CELL_DLON = _cell_size(GEOHASH_PRECISION)
+_CELL_COLS = round(360.0 / _CELL_DLON)
+
+
+def _geohash_cell(lat: float, lon: float) -> Tuple[int, int]:
+    """
+    Cellule geohash de précision GEOHASH_PRECISION sous forme (ligne, colonne):
+    même découpage que la chaîne base32, sans l'encodage (plus rapide, voisins = ±1).
+    """
+    return int((lat + 90.0) // _CELL_DLAT), int((lon + 180.0) // _CELL_DLON)
+
+
+def _cells_within(lat: float, lon: float, radius_km: float) -> list:
+    """
+    Cellules geohash qui intersectent le carré de côté 2×radius_km autour du point
+    (souvent 2 à 4 cellules au lieu des 8 voisines systématiques).
+    """
+    dlat = radius_km / 111.0
+    dlon = radius_km / (111.0 * max(0.2, abs(math.cos(math.radians(lat)))))
+    r0, c0 = _geohash_cell(max(-90.0, lat - dlat), lon - dlon)
+    r1, c1 = _geohash_cell(min(90.0, lat + dlat), lon + dlon)
+    return [(r, c % _CELL_COLS) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+
+def _fold(s: str) -> str:
+    s = s or ""
+    if s.isascii():
+        return s.lower()
+    s = unicodedata.normalize("NFKD", s)
+    return "".join(c for c in s if not unicodedata.combining(c)).lower()
+
+
+def normalize_name(name: str) -> str:
+    words = [w for w in _NON_ALNUM_RE.split(_fold(name)) if w and w not in _NAME_STOPWORDS]
+    return " ".join(words)
+
+
+def _ngrams(s: str, n: int = 3) -> set:
+    if not s:
+        return set()
+    p = f" {s} "
+    if len(p) <= n:
+        return {p}
+    return {p[i:i + n] for i in range(len(p) - n + 1)}
+
+
+def _domain(url: Optional[str]) -> Optional[str]:
+    u = (url or "").strip().lower()
+    if not u:
+        return None
+    if "://" not in u:
+        u = "https://" + u
+    try:
+        host = urlparse(u).netloc.split(":")[0]
+    except Exception:
+        return None
+    if host.startswith("www."):
+        host = host[4:]
+    # les réseaux sociaux ne sont pas un identifiant de commerce
+    if not host or host in ("facebook.com", "m.facebook.com", "instagram.com", "linkedin.com"):
+        return None
+    return host
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+    return 6371.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class _Features:
+    __slots__ = ("grams", "lat", "lon", "cell", "phones", "domain", "emails")
+
+    def __init__(self, r: dict):
+        self.grams = _ngrams(normalize_name(r.get("nom") or ""))
+        lat, lon = r.get("lat"), r.get("lon")
+        self.lat = float(lat) if lat is not None else None
+        self.lon = float(lon) if lon is not None else None
+        self.cell = _geohash_cell(self.lat, self.lon) if self.lat is not None and self.lon is not None else None
+        self.phones = set(r.get("phone_keys") or [])
+        self.domain = _domain(r.get("site"))
+        self.emails = {e.strip().lower() for e in (r.get("emails") or []) if e}
+
+    def exact_keys(self) -> list:
+        keys = [f"p:{p}" for p in self.phones]
+        keys += [f"e:{e}" for e in self.emails]
+        if self.domain:
+            keys.append(f"d:{self.domain}")
+        return keys
+
+
+def _score(a: _Features, b: _Features, max_distance_km: float) -> float:
+    """
+    0..1; -1 si les deux sont localisés et trop éloignés (jamais fusionnés).
+    1 si les deux sont localisés à portée et partagent un téléphone ou un email, quel que soit le nom
+    (orthographes différentes d'une source à l'autre); pas le domaine seul, partagé par les chaînes.
+    """
+    dist_score = 0.0
+    if a.lat is not None and b.lat is not None:
+        d = _haversine_km(a.lat, a.lon, b.lat, b.lon)
+        if d > max_distance_km:
+            return -1.0
+        if a.phones & b.phones or a.emails & b.emails:
+            return 1.0
+        dist_score = 1.0 - (d / max_distance_km) if max_distance_km > 0 else 1.0
+
+    inter = len(a.grams & b.grams)
+    union = len(a.grams | b.grams)
+    name_score = inter / union if union else 0.0
+
+    return (
+        W_NAME * name_score
+        + W_DISTANCE * dist_score
+        + W_PHONE * (1.0 if a.phones & b.phones else 0.0)
+        + W_DOMAIN * (1.0 if a.domain and a.domain == b.domain else 0.0)
+        + W_EMAIL * (1.0 if a.emails & b.emails else 0.0)
+    )
+
+
+def _find(parent: list, i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _completeness(r: dict) -> int:
+    return sum(1 for k in ("site", "emails", "telephones", "horaires", "adresse") if r.get(k))
+
+
+def _provenance(r: dict) -> dict:
+    return {"source": r.get("source"), "entity_key": r.get("entity_key"), "url": r.get("osm")}
+
+
+def _merge_cluster(records: List[dict]) -> dict:
+    # enregistrement le plus complet = base; les autres comblent les trous
+    primary = max(records, key=_completeness)
+    merged = dict(primary)
+    others = [r for r in records if r is not primary]
+
+    for k in LIST_FIELDS:
+        vals = list(primary.get(k) or [])
+        for r in others:
+            vals += [v for v in (r.get(k) or []) if v not in vals]
+        merged[k] = vals
+
+    for k in DICT_FIELDS:
+        d = dict(primary.get(k) or {})
+        for r in others:
+            for dk, dv in (r.get(k) or {}).items():
+                if dv not in (None, "") and d.get(dk) in (None, ""):
+                    d[dk] = dv
+        merged[k] = d
+
+    for k in SCALAR_FIELDS:
+        if merged.get(k) in (None, ""):
+            for r in others:
+                if r.get(k) not in (None, ""):
+                    merged[k] = r[k]
+                    break
+
+    sources = []
+    for r in [primary] + others:
+        sources += r.get("sources") or [_provenance(r)]
+    merged["sources"] = sources
+    merged["merged_from"] = [s["entity_key"] for s in sources]
+    return merged
+
+
+def _single(r: dict) -> dict:
+    # même forme que les groupes fusionnés (sources / merged_from sur chaque item)
+    sources = r.get("sources") or [_provenance(r)]
+    return {**r, "sources": sources, "merged_from": [s["entity_key"] for s in sources]}
+
+
+def resolve_entities(
+    records: List[dict],
+    *,
+    threshold: float = MATCH_THRESHOLD,
+    max_distance_km: float = MAX_DISTANCE_KM,
+) -> Tuple[List[dict], Dict[str, Any]]:
+    """
+    Fusionne les doublons probables. L'ordre du premier enregistrement de chaque groupe est conservé.
+    Retourne (prospects, stats).
+    """
+    t0 = time.perf_counter()
+    n = len(records)
+    parent = list(range(n))
+    feats = [_Features(r) for r in records]
+
+    block_index: dict[tuple, dict[str, list[int]]] = {}  # cellule -> trigramme -> ids
+    key_index: dict[str, list[int]] = {}
+    compared = 0
+    skipped_blocks = 0
+
+    for i, f in enumerate(feats):
+        # cands[j] = nb de trigrammes partagés (j n'est indexé que dans sa propre cellule)
+        blocks = []
+        if f.cell is not None:
+            for c in _cells_within(f.lat, f.lon, max_distance_km):
+                cell_index = block_index.get(c)
+                if not cell_index:
+                    continue
+                found = [b for b in map(cell_index.get, f.grams) if b]
+                kept = [b for b in found if len(b) <= MAX_BLOCK_SIZE]
+                skipped_blocks += len(found) - len(kept)
+                blocks.extend(kept)
+        cands = Counter(chain.from_iterable(blocks))
+
+        # blocage par nom: assez de trigrammes partagés, puis les meilleurs seulement
+        min_shared = max(1, math.ceil(MIN_SHARED_NGRAMS * len(f.grams)))
+        ranked = heapq.nlargest(
+            MAX_CANDIDATES, ((shared, j) for j, shared in cands.items() if shared >= min_shared)
+        )
+        todo = [j for _, j in ranked]
+
+        # blocage par clé exacte: toujours scoré (nom différent mais même téléphone / site / email)
+        exact = f.exact_keys()
+        for k in exact:
+            block = key_index.get(k)
+            if block and len(block) <= MAX_BLOCK_SIZE:
+                todo.extend(block)
+
+        for j in todo:
+            if _find(parent, i) == _find(parent, j):
+                continue
+            compared += 1
+            if _score(f, feats[j], max_distance_km) >= threshold:
+                parent[_find(parent, i)] = _find(parent, j)
+
+        # indexation (cellule propre uniquement: les voisines sont couvertes à la lecture)
+        if f.cell is not None:
+            cell_index = block_index.setdefault(f.cell, {})
+            for g in f.grams:
+                cell_index.setdefault(g, []).append(i)
+        for k in exact:
+            key_index.setdefault(k, []).append(i)
+
+    clusters: dict[int, list[int]] = {}
+    for i in range(n):
+        clusters.setdefault(_find(parent, i), []).append(i)
+
+    out = []
+    merged_clusters = 0
+    for idxs in sorted(clusters.values(), key=lambda x: x[0]):
+        if len(idxs) == 1:
+            out.append(_single(records[idxs[0]]))
+        else:
+            merged_clusters += 1
+            out.append(_merge_cluster([records[i] for i in idxs]))
+
+    stats = {
+        "input": n,
+        "output": len(out),
+        "merged_clusters": merged_clusters,
+        "candidates_compared": compared,
+        "skipped_blocks": skipped_blocks,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return out, stats
@@ -0,0 +1,206 @@
+"""
+Snapshots de recherche pour la pagination par curseur.
+
+La première page d'une recherche paginée enregistre la liste ordonnée complète (après dedupe)
+côté serveur; le curseur opaque renvoyé désigne (snapshot, position). Les pages suivantes sont
+une tranche `position > curseur` du snapshot: aucun appel upstream, coût O(taille de page),
+et les résultats ne bougent pas d'une page à l'autre.
+
+Stockage (PROSPECT_SNAPSHOT_STORE):
+- `memory` (défaut): LRU en mémoire du process, SNAPSHOT_MAX_ENTRIES snapshots max
+- `postgres`: tables prospect_snapshots / prospect_snapshot_items (créées au premier usage),
+  partagées entre workers
+Dans les deux cas un snapshot expire après SNAPSHOT_TTL secondes.
+"""
+import base64
+import binascii
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from src import metrics
+
+
+SNAPSHOT_STORE = os.getenv("PROSPECT_SNAPSHOT_STORE", "memory").strip().lower()
+SNAPSHOT_TTL = int(os.getenv("PROSPECT_SNAPSHOT_TTL", "900"))  # 15 min
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("PROSPECT_SNAPSHOT_MAX_ENTRIES", "256"))
+SNAPSHOT_MAX_RESULTS = int(os.getenv("PROSPECT_SNAPSHOT_MAX_RESULTS", "1000"))
+MAX_PAGE_SIZE = 200  # même borne que `page_size` sur GET /prospects
+
+
+class SnapshotExpired(ValueError):
+    """Curseur valide mais snapshot expiré / évincé: relancer la recherche."""
+
+
+# --- curseur opaque: base64url(json {"s": snapshot_id, "p": dernière position servie, "n": taille de page})
+
+def encode_cursor(snapshot_id: str, position: int, page_size: int) -> str:
+    raw = json.dumps({"s": snapshot_id, "p": position, "n": page_size}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int, int]:
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + pad))
+        sid, position, size = str(data["s"]), int(data["p"]), int(data["n"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError("cursor invalide.")
+    # curseur forgé: p < -1 = tranche négative, n < 1 = LIMIT négatif / boucle sans fin
+    if position < -1 or not 1 <= size <= MAX_PAGE_SIZE:
+        raise ValueError("cursor invalide.")
+    return sid, position, size
+
+
+class MemorySnapshotStore:
+    def __init__(self, ttl: float = SNAPSHOT_TTL, max_entries: int = SNAPSHOT_MAX_ENTRIES):
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        # id -> (expire_at, meta, items)
+        self._data: "OrderedDict[str, tuple[float, dict, list]]" = OrderedDict()
+        self._lock = Lock()
+
+    def save(self, meta: dict, items: List[dict]) -> Tuple[str, float]:
+        sid = secrets.token_urlsafe(12)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._data[sid] = (expires_at, meta, list(items))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return sid, expires_at
+
+    def page(self, sid: str, after: int, size: int) -> Tuple[dict, List[dict], int, float]:
+        """(meta, items[after+1 : after+1+size], total, expire_at)."""
+        now = time.time()
+        with self._lock:
+            it = self._data.get(sid)
+            if it is not None and it[0] <= now:
+                self._data.pop(sid, None)
+                it = None
+            if it is None:
+                raise SnapshotExpired("Snapshot expiré ou inconnu: relancer la recherche.")
+            self._data.move_to_end(sid)
+        expires_at, meta, items = it
+        # copies: la page est enrichie / projetée en place par l'appelant
+        return meta, [dict(r) for r in items[after + 1:after + 1 + size]], len(items), expires_at
+
+
+class PostgresSnapshotStore:
+    """Une ligne par snapshot + une ligne par résultat (clé (snapshot_id, pos)): tranche par index."""
+
+    def __init__(self, ttl: float = SNAPSHOT_TTL):
+        self.ttl = float(ttl)
+        self._ready = False
+        self._lock = Lock()
+
+    def _ensure_tables(self) -> None:
+        if self._ready:
+            return
+        from src.db import execute
+        with self._lock:
+            if self._ready:
+                return
+            execute(
+                """
+                CREATE TABLE IF NOT EXISTS prospect_snapshots (
+                    id TEXT PRIMARY KEY,
+                    meta JSONB NOT NULL,
+                    total INTEGER NOT NULL,
+                    expires_at TIMESTAMPTZ NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS prospect_snapshot_items (
+                    snapshot_id TEXT NOT NULL REFERENCES prospect_snapshots(id) ON DELETE CASCADE,
+                    pos INTEGER NOT NULL,
+                    item JSONB NOT NULL,
+                    PRIMARY KEY (snapshot_id, pos)
+                );
+                CREATE INDEX IF NOT EXISTS prospect_snapshots_expires_idx ON prospect_snapshots (expires_at);
+                """
+            )
+            self._ready = True
+
+    def save(self, meta: dict, items: List[dict]) -> Tuple[str, float]:
+        from src.db import Json, get_conn
+        self._ensure_tables()
+        sid = secrets.token_urlsafe(12)
+        expires_at = time.time() + self.ttl
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                # ménage opportuniste des snapshots expirés
+                cur.execute("DELETE FROM prospect_snapshots WHERE expires_at < now();")
+                cur.execute(
+                    "INSERT INTO prospect_snapshots (id, meta, total, expires_at) VALUES (%s, %s, %s, to_timestamp(%s));",
+                    (sid, Json(meta), len(items), expires_at),
+                )
+                cur.executemany(
+                    "INSERT INTO prospect_snapshot_items (snapshot_id, pos, item) VALUES (%s, %s, %s);",
+                    [(sid, pos, Json(item)) for pos, item in enumerate(items)],
+                )
+            conn.commit()
+        return sid, expires_at
+
+    def page(self, sid: str, after: int, size: int) -> Tuple[dict, List[dict], int, float]:
+        from src.db import fetch_all, fetch_one
+        self._ensure_tables()
+        head = fetch_one(
+            "SELECT meta, total, extract(epoch FROM expires_at) AS expires_at "
+            "FROM prospect_snapshots WHERE id = %s AND expires_at > now();",
+            (sid,),
+        )
+        if head is None:
+            raise SnapshotExpired("Snapshot expiré ou inconnu: relancer la recherche.")
+        rows = fetch_all(
+            "SELECT item FROM prospect_snapshot_items WHERE snapshot_id = %s AND pos > %s ORDER BY pos LIMIT %s;",
+            (sid, after, size),
+        )
+        return head["meta"], [r["item"] for r in rows], int(head["total"]), float(head["expires_at"])
+
+
+_STORE = None
+_STORE_LOCK = Lock()
+
+
+def get_store():
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            if SNAPSHOT_STORE == "postgres":
+                _STORE = PostgresSnapshotStore()
+            elif SNAPSHOT_STORE == "memory":
+                _STORE = MemorySnapshotStore()
+            else:
+                raise RuntimeError(f"PROSPECT_SNAPSHOT_STORE inconnu: '{SNAPSHOT_STORE}' (memory|postgres)")
+        return _STORE
+
+
+def create_snapshot(meta: Dict[str, Any], items: List[dict], page_size: int) -> Tuple[List[dict], Dict[str, Any]]:
+    """Enregistre la liste ordonnée; retourne (première page, bloc `page`)."""
+    items = items[:SNAPSHOT_MAX_RESULTS]
+    with metrics.stage("snapshot_save"):
+        sid, expires_at = get_store().save(meta, items)
+    first = [dict(r) for r in items[:page_size]]
+    return first, _page_info(sid, -1, len(first), page_size, len(items), expires_at)
+
+
+def read_page(cursor: str, page_size: Optional[int] = None) -> Tuple[Dict[str, Any], List[dict], Dict[str, Any]]:
+    """Tranche suivante d'un snapshot: (meta du snapshot, items, bloc `page`). Taille par défaut: celle du curseur."""
+    sid, after, size = decode_cursor(cursor)
+    size = page_size or size
+    with metrics.stage("snapshot_page"):
+        meta, items, total, expires_at = get_store().page(sid, after, size)
+    return meta, items, _page_info(sid, after, len(items), size, total, expires_at)
+
+
+def _page_info(sid: str, after: int, n: int, page_size: int, total: int, expires_at: float) -> Dict[str, Any]:
+    last = after + n
+    return {
+        "offset": after + 1,
+        "size": n,
+        "total": total,
+        "next_cursor": encode_cursor(sid, last, page_size) if last + 1 < total else None,
+        "expires_in_seconds": max(0, int(expires_at - time.time())),
+    }
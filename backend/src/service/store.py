@@ -0,0 +1,265 @@
+"""
+Store local des prospects synchronisés + flux de changements (added / updated / removed).
+
+Utilisé par le sync incrémental OSM (prospect.open_street_map.sync): chaque zone (`area`) garde
+ses prospects par tuile, l'état de sync de chaque tuile (horodatage Overpass), et un journal
+append-only des changements consommable par curseur (`since_id`).
+
+Stockage (PROSPECT_STORE):
+- `postgres` (défaut): tables sync_* créées au premier usage
+- `memory`: en mémoire du process (dev / tests)
+"""
+import hashlib
+import json
+import os
+import time
+from threading import Lock
+from typing import Dict, List, Optional
+
+
+PROSPECT_STORE = os.getenv("PROSPECT_STORE", "postgres").strip().lower()
+
+CHANGE_TYPES = ("added", "updated", "removed")
+
+# tuile des prospects dont la grille a changé, en attente de leur prochaine passe complète
+ORPHAN_TILE = ""
+
+
+def content_hash(item: dict) -> str:
+    """Empreinte stable d'un prospect (détection des modifications)."""
+    raw = json.dumps(item, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryProspectStore:
+    def __init__(self):
+        self._areas: Dict[str, dict] = {}
+        self._tiles: Dict[tuple, str] = {}  # (area, tile) -> last_sync
+        self._items: Dict[tuple, dict] = {}  # (area, entity_key) -> {tile, hash, data}
+        self._changes: List[dict] = []
+        self._lock = Lock()
+
+    def save_area(self, name: str, spec: dict) -> dict:
+        with self._lock:
+            self._areas[name] = {"name": name, **spec}
+            return self._areas[name]
+
+    def get_area(self, name: str) -> Optional[dict]:
+        with self._lock:
+            return self._areas.get(name)
+
+    def list_areas(self) -> List[dict]:
+        with self._lock:
+            return list(self._areas.values())
+
+    def tile_last_sync(self, area: str, tile: str) -> Optional[str]:
+        with self._lock:
+            return self._tiles.get((area, tile))
+
+    def set_tile_last_sync(self, area: str, tile: str, ts: str) -> None:
+        with self._lock:
+            self._tiles[(area, tile)] = ts
+
+    def reset_tiles(self, area: str) -> None:
+        """Grille redéfinie: oublie l'état des tuiles, les prospects deviennent orphelins."""
+        with self._lock:
+            for key in [k for k in self._tiles if k[0] == area]:
+                del self._tiles[key]
+            for (a, _), it in self._items.items():
+                if a == area:
+                    it["tile"] = ORPHAN_TILE
+
+    def hashes(self, area: str, keys: List[str]) -> Dict[str, str]:
+        with self._lock:
+            return {k: self._items[(area, k)]["hash"] for k in keys if (area, k) in self._items}
+
+    def tile_keys(self, area: str, tile: str) -> List[str]:
+        with self._lock:
+            return [k for (a, k), it in self._items.items() if a == area and it["tile"] == tile]
+
+    def apply(self, area: str, tile: str, upserts: List[tuple], removals: List[str], changes: List[tuple]) -> None:
+        """upserts: (entity_key, hash, data); changes: (entity_key, change, data|None)."""
+        now = time.time()
+        with self._lock:
+            for key, h, data in upserts:
+                self._items[(area, key)] = {"tile": tile, "hash": h, "data": data}
+            for key in removals:
+                self._items.pop((area, key), None)
+            for key, change, data in changes:
+                self._changes.append({
+                    "id": len(self._changes) + 1, "area": area, "entity_key": key,
+                    "change": change, "at": now, "data": data,
+                })
+
+    def changes(self, since_id: int = 0, area: Optional[str] = None, limit: int = 500) -> List[dict]:
+        with self._lock:
+            out = [c for c in self._changes[since_id:] if area is None or c["area"] == area]
+        return out[:limit]
+
+    def items(self, area: str) -> List[dict]:
+        with self._lock:
+            return [it["data"] for (a, _), it in self._items.items() if a == area]
+
+
+class PostgresProspectStore:
+    def __init__(self):
+        self._ready = False
+        self._lock = Lock()
+
+    def _ensure_tables(self) -> None:
+        if self._ready:
+            return
+        from src.db import execute
+        with self._lock:
+            if self._ready:
+                return
+            execute(
+                """
+                CREATE TABLE IF NOT EXISTS sync_areas (
+                    name TEXT PRIMARY KEY,
+                    spec JSONB NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+                CREATE TABLE IF NOT EXISTS sync_tiles (
+                    area TEXT NOT NULL REFERENCES sync_areas(name) ON DELETE CASCADE,
+                    tile TEXT NOT NULL,
+                    last_sync TEXT NOT NULL,
+                    PRIMARY KEY (area, tile)
+                );
+                CREATE TABLE IF NOT EXISTS sync_prospects (
+                    area TEXT NOT NULL REFERENCES sync_areas(name) ON DELETE CASCADE,
+                    entity_key TEXT NOT NULL,
+                    tile TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    data JSONB NOT NULL,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    PRIMARY KEY (area, entity_key)
+                );
+                CREATE INDEX IF NOT EXISTS sync_prospects_tile_idx ON sync_prospects (area, tile);
+                CREATE TABLE IF NOT EXISTS sync_changes (
+                    id BIGSERIAL PRIMARY KEY,
+                    area TEXT NOT NULL,
+                    entity_key TEXT NOT NULL,
+                    change TEXT NOT NULL,
+                    at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    data JSONB
+                );
+                CREATE INDEX IF NOT EXISTS sync_changes_area_idx ON sync_changes (area, id);
+                """
+            )
+            self._ready = True
+
+    def save_area(self, name: str, spec: dict) -> dict:
+        from src.db import Json, execute
+        self._ensure_tables()
+        execute(
+            "INSERT INTO sync_areas (name, spec) VALUES (%s, %s) "
+            "ON CONFLICT (name) DO UPDATE SET spec = EXCLUDED.spec;",
+            (name, Json(spec)),
+        )
+        return {"name": name, **spec}
+
+    def get_area(self, name: str) -> Optional[dict]:
+        from src.db import fetch_one
+        self._ensure_tables()
+        row = fetch_one("SELECT name, spec FROM sync_areas WHERE name = %s;", (name,))
+        return {"name": row["name"], **row["spec"]} if row else None
+
+    def list_areas(self) -> List[dict]:
+        from src.db import fetch_all
+        self._ensure_tables()
+        return [{"name": r["name"], **r["spec"]} for r in fetch_all("SELECT name, spec FROM sync_areas ORDER BY name;")]
+
+    def tile_last_sync(self, area: str, tile: str) -> Optional[str]:
+        from src.db import fetch_one
+        self._ensure_tables()
+        row = fetch_one("SELECT last_sync FROM sync_tiles WHERE area = %s AND tile = %s;", (area, tile))
+        return row["last_sync"] if row else None
+
+    def set_tile_last_sync(self, area: str, tile: str, ts: str) -> None:
+        from src.db import execute
+        execute(
+            "INSERT INTO sync_tiles (area, tile, last_sync) VALUES (%s, %s, %s) "
+            "ON CONFLICT (area, tile) DO UPDATE SET last_sync = EXCLUDED.last_sync;",
+            (area, tile, ts),
+        )
+
+    def reset_tiles(self, area: str) -> None:
+        """Grille redéfinie: oublie l'état des tuiles, les prospects deviennent orphelins."""
+        from src.db import get_conn
+        self._ensure_tables()
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM sync_tiles WHERE area = %s;", (area,))
+                cur.execute("UPDATE sync_prospects SET tile = %s WHERE area = %s;", (ORPHAN_TILE, area))
+            conn.commit()
+
+    def hashes(self, area: str, keys: List[str]) -> Dict[str, str]:
+        from src.db import fetch_all
+        if not keys:
+            return {}
+        rows = fetch_all(
+            "SELECT entity_key, hash FROM sync_prospects WHERE area = %s AND entity_key = ANY(%s);",
+            (area, keys),
+        )
+        return {r["entity_key"]: r["hash"] for r in rows}
+
+    def tile_keys(self, area: str, tile: str) -> List[str]:
+        from src.db import fetch_all
+        rows = fetch_all("SELECT entity_key FROM sync_prospects WHERE area = %s AND tile = %s;", (area, tile))
+        return [r["entity_key"] for r in rows]
+
+    def apply(self, area: str, tile: str, upserts: List[tuple], removals: List[str], changes: List[tuple]) -> None:
+        """Une transaction par tuile: store + journal restent cohérents."""
+        from src.db import Json, get_conn
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                if upserts:
+                    cur.executemany(
+                        "INSERT INTO sync_prospects (area, entity_key, tile, hash, data) VALUES (%s, %s, %s, %s, %s) "
+                        "ON CONFLICT (area, entity_key) DO UPDATE SET tile = EXCLUDED.tile, hash = EXCLUDED.hash, "
+                        "data = EXCLUDED.data, updated_at = now();",
+                        [(area, key, tile, h, Json(data)) for key, h, data in upserts],
+                    )
+                if removals:
+                    cur.execute(
+                        "DELETE FROM sync_prospects WHERE area = %s AND entity_key = ANY(%s);", (area, removals)
+                    )
+                if changes:
+                    cur.executemany(
+                        "INSERT INTO sync_changes (area, entity_key, change, data) VALUES (%s, %s, %s, %s);",
+                        [(area, key, change, Json(data) if data is not None else None) for key, change, data in changes],
+                    )
+            conn.commit()
+
+    def changes(self, since_id: int = 0, area: Optional[str] = None, limit: int = 500) -> List[dict]:
+        from src.db import fetch_all
+        self._ensure_tables()
+        rows = fetch_all(
+            "SELECT id, area, entity_key, change, extract(epoch FROM at) AS at, data FROM sync_changes "
+            "WHERE id > %s AND (%s::text IS NULL OR area = %s) ORDER BY id LIMIT %s;",
+            (since_id, area, area, limit),
+        )
+        return [{**r, "at": float(r["at"])} for r in rows]
+
+    def items(self, area: str) -> List[dict]:
+        from src.db import fetch_all
+        self._ensure_tables()
+        return [r["data"] for r in fetch_all("SELECT data FROM sync_prospects WHERE area = %s ORDER BY entity_key;", (area,))]
+
+
+_STORE = None
+_STORE_LOCK = Lock()
+
+
+def get_store():
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            if PROSPECT_STORE == "postgres":
+                _STORE = PostgresProspectStore()
+            elif PROSPECT_STORE == "memory":
+                _STORE = MemoryProspectStore()
+            else:
+                raise RuntimeError(f"PROSPECT_STORE inconnu: '{PROSPECT_STORE}' (postgres|memory)")
+        return _STORE
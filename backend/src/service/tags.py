@@ -1,4 +1,223 @@
+"""
+Résolution catégorie -> filtres OSM.
+
+L'index est construit une seule fois à l'import (`RESOLVER`):
+- clés normalisées (minuscules, accents retirés, séparateurs -> `_`): "Pâtisserie" == "patisserie"
+- synonymes FR / EN (et valeurs OSM cibles, ex: "estate_agent")
+- pluriel simple ("restaurants", "hôtels")
+- fuzzy: distance d'édition bornée (1 dès 5 caractères, 2 dès 9), candidats par trigrammes;
+  une correction ambiguë (deux cibles à égalité) n'est pas appliquée
+
+Sortie structurée: filtres au format de osm._parse_tags, passés tels quels à _build_overpass_query.
+Une catégorie inconnue reste un filtre "valeur seule" (une instruction Overpass par clé POI):
+c'est ce cas coûteux que le fuzzy évite pour les fautes de frappe.
+"""
 import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from src import metrics
+
+
+# mêmes clés que osm.DEFAULT_POI_KEYS (pas d'import: osm dépend de src.service)
+POI_KEYS = ("amenity", "shop", "tourism", "leisure", "office", "craft", "healthcare")
+
+# catégorie canonique -> tags OSM
+CATEGORY_TAGS: Dict[str, str] = {
+    # Restauration
+    "restaurant": "amenity=restaurant",
+    "cafe": "amenity=cafe",
+    "bar": "amenity=bar",
+    "pub": "amenity=pub",
+    "fast_food": "amenity=fast_food",
+    "food_court": "amenity=food_court",
+    "ice_cream": "amenity=ice_cream",
+
+    # Hébergement
+    "hotel": "tourism=hotel",
+    "hostel": "tourism=hostel",
+    "motel": "tourism=motel",
+    "guest_house": "tourism=guest_house",
+    "apartment": "tourism=apartment",
+
+    # Commerce
+    "supermarket": "shop=supermarket",
+    "bakery": "shop=bakery",
+    "pastry": "shop=pastry",
+    "butcher": "shop=butcher",
+    "convenience": "shop=convenience",
+    "clothes": "shop=clothes",
+    "shoes": "shop=shoes",
+    "jewelry": "shop=jewelry",
+    "beauty": "shop=beauty",
+    "cosmetics": "shop=cosmetics",
+    "perfumery": "shop=perfumery",
+    "pharmacy": "amenity=pharmacy",
+    "fuel": "amenity=fuel",
+    "bank": "amenity=bank",
+    "atm": "amenity=atm",
+    "post_office": "amenity=post_office",
+
+    # Santé
+    "hospital": "amenity=hospital",
+    "clinic": "amenity=clinic",
+    "doctors": "amenity=doctors",
+    "dentist": "amenity=dentist",
+    "veterinary": "amenity=veterinary",
+
+    # Éducation
+    "school": "amenity=school",
+    "university": "amenity=university",
+    "kindergarten": "amenity=kindergarten",
+    "library": "amenity=library",
+
+    # Culture & Loisirs
+    "museum": "tourism=museum",
+    "theatre": "amenity=theatre",
+    "cinema": "amenity=cinema",
+    "parking": "amenity=parking",
+    "parking_entrance": "amenity=parking_entrance",
+    "fitness_centre": "leisure=fitness_centre",
+    "swimming_pool": "leisure=swimming_pool",
+    # Spa : shop=beauty (beauty=spa est un sous-tag, cherché via shop=beauty) OU amenity=public_bath (bains publics/thermaux)
+    # Note: beauty=spa ne peut pas être recherché directement via Overpass, on cherche shop=beauty
+    "spa": "shop=beauty,amenity=public_bath",
+    "hairdresser": "shop=hairdresser",
+    "tattoo": "shop=tattoo",
+    "massage": "shop=massage",
+    "physiotherapist": "healthcare=physiotherapist",
+
+    # Transport
+    "car_rental": "amenity=car_rental",
+    "car_repair": "amenity=car_repair,shop=car_repair",
+    "car_wash": "amenity=car_wash",
+    "bicycle_rental": "amenity=bicycle_rental",
+    "travel_agency": "shop=travel_agency,office=travel_agent",
+    "real_estate_agency": "office=estate_agent",
+
+    # Services professionnels
+    "insurance": "office=insurance",
+    "lawyer": "office=lawyer",
+    "accountant": "office=accountant",
+    "notary": "office=notary",
+    "funeral_directors": "shop=funeral_directors",
+
+    # Autres commerces
+    "florist": "shop=florist",
+    "gift": "shop=gift",
+    "toys": "shop=toys",
+    "books": "shop=books",
+    "computer": "shop=computer",
+    "mobile_phone": "shop=mobile_phone",
+    "electronics": "shop=electronics",
+    "furniture": "shop=furniture",
+    "hardware": "shop=hardware",
+    "paint": "shop=paint",
+    "garden_centre": "shop=garden_centre",
+    "pet": "shop=pet",
+    "optician": "shop=optician",
+}
+
+# catégorie canonique -> synonymes (FR / EN, formes courantes); normalisés à la construction
+CATEGORY_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "restaurant": ("restau", "resto", "restaurant"),
+    "cafe": ("café", "coffee", "coffee shop", "salon de thé"),
+    "bar": ("bar à vin", "wine bar"),
+    "fast_food": ("fast food", "snack", "restauration rapide", "gargote"),
+    "ice_cream": ("glacier", "glace", "ice cream"),
+    "hotel": ("hôtel", "hotels"),
+    "hostel": ("auberge de jeunesse",),
+    "guest_house": ("maison d'hôtes", "chambre d'hôtes", "guesthouse", "bnb"),
+    "apartment": ("appartement", "location saisonnière"),
+    "supermarket": ("supermarché", "hypermarché", "grocery"),
+    "bakery": ("boulangerie",),
+    "pastry": ("pâtisserie", "patisserie"),
+    "butcher": ("boucherie", "boucher"),
+    "convenience": ("épicerie", "superette", "supérette"),
+    "clothes": ("vêtements", "habillement", "boutique de vêtements", "clothing"),
+    "shoes": ("chaussures", "cordonnerie"),
+    "jewelry": ("bijouterie", "bijoutier", "jewellery", "jeweler"),
+    "beauty": ("beauty salon", "beauty_salon", "salon de beauté", "institut de beauté", "esthétique",
+               "nail salon", "nail_salon", "onglerie", "manucure"),
+    "cosmetics": ("cosmétiques", "cosmétique"),
+    "perfumery": ("parfumerie",),
+    "pharmacy": ("pharmacie", "chemist", "drugstore"),
+    "fuel": ("station service", "station essence", "gas station", "petrol station", "carburant"),
+    "bank": ("banque",),
+    "atm": ("distributeur", "guichet automatique", "dab", "gab"),
+    "post_office": ("poste", "la poste", "bureau de poste", "post office"),
+    "hospital": ("hôpital", "hopital", "chu"),
+    "clinic": ("clinique", "centre de santé", "dispensaire"),
+    "doctors": ("médecin", "cabinet médical", "doctor"),
+    "dentist": ("dentiste", "cabinet dentaire"),
+    "veterinary": ("vétérinaire", "veterinaire", "vet"),
+    "school": ("école", "collège", "lycée"),
+    "university": ("université", "fac", "faculté"),
+    "kindergarten": ("maternelle", "crèche", "jardin d'enfants", "nursery"),
+    "library": ("bibliothèque", "médiathèque"),
+    "museum": ("musée",),
+    "theatre": ("théâtre", "theater"),
+    "cinema": ("cinéma", "movie theater"),
+    "parking": ("stationnement", "car park", "parc de stationnement"),
+    "fitness_centre": ("gym", "fitness", "salle de sport", "salle de gym", "fitness center"),
+    "swimming_pool": ("piscine", "pool"),
+    "spa": ("hammam", "thermes", "bains"),
+    "hairdresser": ("coiffeur", "coiffure", "salon de coiffure", "barbier", "barber", "hair salon"),
+    "tattoo": ("tatouage", "tatoueur"),
+    "massage": ("salon de massage",),
+    "physiotherapist": ("kiné", "kine", "kinésithérapeute", "physiothérapeute", "physio"),
+    "car_rental": ("location de voiture", "location voiture", "loueur de voitures", "rent a car"),
+    "car_repair": ("garage", "garagiste", "mécanicien", "mécanique auto", "mechanic"),
+    "car_wash": ("lavage auto", "station de lavage", "lavage voiture"),
+    "bicycle_rental": ("location de vélo", "location vélo", "bike rental"),
+    "travel_agency": ("agence de voyage", "agence de voyages", "voyagiste", "travel agent"),
+    "real_estate_agency": ("agence immobilière", "immobilier", "real estate", "estate agent"),
+    "insurance": ("assurance", "assureur", "courtier en assurance"),
+    "lawyer": ("avocat", "cabinet d'avocats", "attorney"),
+    "accountant": ("comptable", "expert comptable", "cabinet comptable", "accounting"),
+    "notary": ("notaire", "étude notariale"),
+    "funeral_directors": ("pompes funèbres", "funérarium", "funeral home"),
+    "florist": ("fleuriste", "fleurs"),
+    "gift": ("cadeaux", "boutique de cadeaux", "souvenirs", "gift shop"),
+    "toys": ("jouets", "magasin de jouets", "toy", "toy shop"),
+    "books": ("librairie", "book", "bookshop", "bookstore", "livres"),
+    "computer": ("informatique", "ordinateurs", "magasin informatique"),
+    "mobile_phone": ("téléphonie", "téléphones", "phone shop"),
+    "electronics": ("électronique", "électroménager"),
+    "furniture": ("meubles", "ameublement", "magasin de meubles"),
+    "hardware": ("quincaillerie", "bricolage", "hardware store"),
+    "paint": ("peinture", "droguerie"),
+    "garden_centre": ("jardinerie", "pépinière", "garden center"),
+    "pet": ("animalerie", "pet shop"),
+    "optician": ("opticien", "optique", "lunetterie"),
+}
+
+# mots désignant une clé POI entière (toutes les valeurs): existence de clé
+KEY_SYNONYMS: Dict[str, str] = {
+    "magasin": "shop",
+    "commerce": "shop",
+    "commerces": "shop",
+    "store": "shop",
+    "bureau": "office",
+    "bureaux": "office",
+    "artisan": "craft",
+    "artisanat": "craft",
+    "tourisme": "tourism",
+    "loisirs": "leisure",
+    "sante": "healthcare",
+    "health": "healthcare",
+}
+
+_SEP_RE = re.compile(r"[^a-z0-9]+")
+
+
+def fold(s: str) -> str:
+    """Minuscules, sans accents, séparateurs -> `_`: clé de l'index."""
+    s = unicodedata.normalize("NFKD", (s or "").strip().lower().replace("œ", "oe").replace("æ", "ae"))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return _SEP_RE.sub("_", s).strip("_")
+
 
 def _norm(s: str) -> str:
     s = (s or "").strip().lower()
@@ -6,117 +225,171 @@ def _norm(s: str) -> str:
     s = re.sub(r"[\s\-]+", " ", s)
     return s.strip()
 
+
+def _tags_to_filters(tags: str) -> Tuple[dict, ...]:
+    out = []
+    for t in tags.split(","):
+        k, _, v = t.strip().partition("=")
+        out.append({"type": "kv", "key": k, "value": v} if v else {"type": "key_exists", "key": k})
+    return tuple(out)
+
+
+def _trigrams(key: str) -> set:
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _bounded_levenshtein(a: str, b: str, cutoff: int) -> int:
+    """Distance d'édition, arrêt dès que toute la ligne dépasse `cutoff` (retourne cutoff + 1)."""
+    if abs(len(a) - len(b)) > cutoff:
+        return cutoff + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > cutoff:
+            return cutoff + 1
+        prev = cur
+    return prev[-1]
+
+
+def _fuzzy_cutoff(key: str) -> int:
+    n = len(key)
+    return 0 if n < 5 else 1 if n < 9 else 2
+
+
+class CategoryResolver:
+    """Index catégorie -> filtres, construit une fois; `resolve` est mis en cache par entrée."""
+
+    def __init__(
+        self,
+        category_tags: Dict[str, str] = CATEGORY_TAGS,
+        synonyms: Dict[str, Tuple[str, ...]] = CATEGORY_SYNONYMS,
+        key_synonyms: Dict[str, str] = KEY_SYNONYMS,
+    ):
+        # clé normalisée -> (catégorie canonique, filtres)
+        self._index: Dict[str, Tuple[str, Tuple[dict, ...]]] = {}
+        for cat, tags in category_tags.items():
+            filters = _tags_to_filters(tags)
+            self._add(cat, cat, filters)
+            for f in filters:
+                if f["type"] == "kv":
+                    self._add(f["value"], cat, filters)  # valeur OSM cible (ex: estate_agent)
+        for cat, words in synonyms.items():
+            for w in words:
+                self._add(w, cat, self._index[fold(cat)][1])
+        for k in POI_KEYS:
+            self._add(k, k, ({"type": "key_exists", "key": k},))
+        for w, k in key_synonyms.items():
+            self._add(w, k, ({"type": "key_exists", "key": k},))
+
+        self._grams: Dict[str, List[str]] = {}
+        for key in self._index:
+            for g in _trigrams(key):
+                self._grams.setdefault(g, []).append(key)
+        self.resolve = lru_cache(maxsize=4096)(self._resolve)
+
+    def _add(self, word: str, cat: str, filters: Tuple[dict, ...]) -> None:
+        key = fold(word)
+        if key and key not in self._index:
+            self._index[key] = (cat, filters)
+
+    def _fuzzy(self, key: str) -> Optional[str]:
+        cutoff = _fuzzy_cutoff(key)
+        if not cutoff:
+            return None
+        grams = _trigrams(key)
+        shared: Dict[str, int] = {}
+        for g in grams:
+            for cand in self._grams.get(g, ()):
+                shared[cand] = shared.get(cand, 0) + 1
+        # une édition détruit au plus 3 trigrammes
+        need = len(grams) - 3 * cutoff
+        best, best_d, targets = None, cutoff + 1, set()
+        for cand, n in shared.items():
+            if n < need:
+                continue
+            d = _bounded_levenshtein(key, cand, cutoff)
+            if d < best_d:
+                best, best_d, targets = cand, d, {self._index[cand][0]}
+            elif d == best_d and d <= cutoff:
+                targets.add(self._index[cand][0])
+        if best is None or len(targets) > 1:
+            return None
+        return best
+
+    def _resolve(self, category: str) -> Dict[str, object]:
+        """{"input", "match", "method": exact|plural|fuzzy|unknown, "filters"} pour UNE catégorie."""
+        key = fold(category)
+        method, hit = "exact", self._index.get(key)
+        if hit is None:
+            for suffix in ("s", "x", "es"):
+                if key.endswith(suffix) and key[:-len(suffix)] in self._index:
+                    method, hit = "plural", self._index[key[:-len(suffix)]]
+                    break
+        if hit is None:
+            near = self._fuzzy(key)
+            if near is not None:
+                method, hit = "fuzzy", self._index[near]
+        if hit is None:
+            # inconnue: valeur seule, testée sur toutes les clés POI
+            value = _norm(category).replace(" ", "_")
+            return {"input": category, "match": None, "method": "unknown",
+                    "filters": ({"type": "value_only", "value": value},)}
+        return {"input": category, "match": hit[0], "method": method, "filters": hit[1]}
+
+
+RESOLVER = CategoryResolver()
+
+
+def format_filters(filters) -> str:
+    """Filtres -> chaîne `tags` équivalente (meta, clés de cache, journal des recherches)."""
+    out = []
+    for f in filters:
+        if f["type"] == "kv":
+            out.append(f"{f['key']}={f['value']}")
+        elif f["type"] == "key_exists":
+            out.append(f["key"])
+        else:
+            out.append(f["value"])
+    return ",".join(out)
+
+
+def resolve_categories(category: str) -> Tuple[str, Optional[Tuple[dict, ...]], List[dict]]:
+    """
+    Catégories csv -> (tags canoniques, filtres dédupliqués, détail par catégorie).
+    Une entrée déjà au format tags (key=value) passe telle quelle dans `tags`; les filtres sont
+    alors None (le provider parse et valide `tags`).
+    """
+    parts = [c.strip() for c in (category or "").split(",") if c.strip()]
+    filters: List[dict] = []
+    details: List[dict] = []
+    raw: List[str] = []
+    seen = set()
+    for p in parts:
+        if "=" in p:
+            raw.append(p)
+            continue
+        res = RESOLVER.resolve(p)
+        metrics.CATEGORY_RESOLUTIONS.inc(method=res["method"])
+        details.append({k: v for k, v in res.items() if k != "filters"})
+        for f in res["filters"]:
+            fk = tuple(sorted(f.items()))
+            if fk not in seen:
+                seen.add(fk)
+                filters.append(f)
+    tags = ",".join(x for x in (format_filters(filters), *raw) if x)
+    return tags, (None if raw else tuple(filters)), details
+
+
 def category_to_tags(category: str) -> str:
     """
     Retourne une string 'tags' compatible avec notre provider.
-    - mapping pour les cas courants
+    - index précompilé (synonymes FR/EN, accents, fautes de frappe)
     - sinon fallback: "valeur seule" => ex: "restaurant"
     """
-    c = _norm(category)
-
-    mapping = {
-        # Restauration
-        "restaurant": "amenity=restaurant",
-        "restau": "amenity=restaurant",
-        "cafe": "amenity=cafe",
-        "bar": "amenity=bar",
-        "fast_food": "amenity=fast_food",
-        "food_court": "amenity=food_court",
-        "ice_cream": "amenity=ice_cream",
-        
-        # Hébergement
-        "hotel": "tourism=hotel",
-        "hostel": "tourism=hostel",
-        "motel": "tourism=motel",
-        "guest_house": "tourism=guest_house",
-        "apartment": "tourism=apartment",
-        
-        # Commerce (générique - cherche tous les shops)
-        # Note: "shop" seul cherche tous les types de shops via DEFAULT_POI_KEYS
-        "supermarket": "shop=supermarket",
-        "bakery": "shop=bakery",
-        "boulangerie": "shop=bakery",
-        "butcher": "shop=butcher",
-        "convenience": "shop=convenience",
-        "clothes": "shop=clothes",
-        "shoes": "shop=shoes",
-        "jewelry": "shop=jewelry",
-        "beauty": "shop=beauty",
-        "cosmetics": "shop=cosmetics",
-        "perfumery": "shop=perfumery",
-        "pharmacy": "amenity=pharmacy",
-        "pharmacie": "amenity=pharmacy",
-        "fuel": "amenity=fuel",
-        "bank": "amenity=bank",
-        "atm": "amenity=atm",
-        "post_office": "amenity=post_office",
-        
-        # Santé
-        "hospital": "amenity=hospital",
-        "clinic": "amenity=clinic",
-        "dentist": "amenity=dentist",
-        "veterinary": "amenity=veterinary",
-        "veterinaire": "amenity=veterinary",
-        
-        # Éducation
-        "school": "amenity=school",
-        "university": "amenity=university",
-        "kindergarten": "amenity=kindergarten",
-        "library": "amenity=library",
-        
-        # Culture & Loisirs
-        "museum": "tourism=museum",
-        "theatre": "amenity=theatre",
-        "cinema": "amenity=cinema",
-        "parking": "amenity=parking",
-        "parking_entrance": "amenity=parking_entrance",
-        "gym": "leisure=fitness_centre",
-        "fitness": "leisure=fitness_centre",
-        "fitness_centre": "leisure=fitness_centre",
-        "swimming_pool": "leisure=swimming_pool",
-        # Spa : shop=beauty (beauty=spa est un sous-tag, cherché via shop=beauty) OU amenity=public_bath (bains publics/thermaux)
-        # Note: beauty=spa ne peut pas être recherché directement via Overpass, on cherche shop=beauty
-        "spa": "shop=beauty,amenity=public_bath",
-        "beauty_salon": "shop=beauty",
-        "hairdresser": "shop=hairdresser",
-        "nail_salon": "shop=beauty",
-        "tattoo": "shop=tattoo",
-        "massage": "shop=massage",
-        "physiotherapist": "healthcare=physiotherapist",
-        
-        # Transport
-        "car_rental": "amenity=car_rental",
-        "car_repair": "amenity=car_repair,shop=car_repair",
-        "car_wash": "amenity=car_wash",
-        "bicycle_rental": "amenity=bicycle_rental",
-        "travel_agency": "shop=travel_agency,office=travel_agent",
-        "real_estate_agency": "office=estate_agent",
-        
-        # Services professionnels
-        "insurance": "office=insurance",
-        "lawyer": "office=lawyer",
-        "accountant": "office=accountant",
-        "notary": "office=notary",
-        "funeral_directors": "shop=funeral_directors",
-        
-        # Autres commerces
-        "florist": "shop=florist",
-        "gift": "shop=gift",
-        "toy": "shop=toy",
-        "book": "shop=book",
-        "computer": "shop=computer",
-        "mobile_phone": "shop=mobile_phone",
-        "electronics": "shop=electronics",
-        "furniture": "shop=furniture",
-        "hardware": "shop=hardware",
-        "paint": "shop=paint",
-        "garden_centre": "shop=garden_centre",
-        "pet": "shop=pet",
-        "optician": "shop=optician",
-    }
-
     # si user te donne déjà du tags (key=value,...), on le laisse passer
-    if "=" in c or "," in c:
+    if "=" in category or "," in category:
         return category.strip()
-
-    return mapping.get(c, category.strip())
+    return format_filters(RESOLVER.resolve(category.strip())["filters"])
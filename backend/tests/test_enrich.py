@@ -0,0 +1,74 @@
+import copy
+import json
+import time
+
+from benchmarks import bench_enrich
+from src.service import enrich
+
+
+def _fixtures() -> dict:
+    with open(bench_enrich.DEFAULT_FIXTURES, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _run(cold: bool) -> tuple:
+    data = _fixtures()
+    session = bench_enrich.FixtureSession(data["pages"])
+    prospects = copy.deepcopy(data["prospects"])
+    meta = bench_enrich.run_current(prospects, session, cold=cold)
+    return bench_enrich._summary("current", prospects, session), meta, prospects
+
+
+def _legacy() -> tuple:
+    data = _fixtures()
+    session = bench_enrich.FixtureSession(data["pages"])
+    prospects = copy.deepcopy(data["prospects"])
+    bench_enrich.run_legacy(prospects, session)
+    return bench_enrich._summary("legacy", prospects, session), prospects
+
+
+def test_fetch_counts_against_legacy():
+    legacy, legacy_prospects = _legacy()
+    cold, cold_meta, cold_prospects = _run(cold=True)
+    warm, warm_meta, _ = _run(cold=False)
+
+    assert legacy["fetches"] == 33
+    # à froid: robots.txt / sitemap à récupérer, le gain reste faible
+    assert cold["fetches"] <= 30
+    assert cold_meta["meta_fetches"] <= 10
+    # à chaud (caches robots / sitemap remplis): ~40 % de fetches en moins
+    assert warm["fetches"] <= 20
+    assert warm_meta["meta_fetches"] == 0
+    for row in (cold, warm):
+        assert row["with_email"] >= legacy["with_email"]
+        assert row["with_phone"] >= legacy["with_phone"]
+    assert bench_enrich.lost_contacts(legacy_prospects, cold_prospects) == []
+
+
+def test_robots_disallowed_contact_page_is_never_fetched():
+    data = _fixtures()
+    session = bench_enrich.FixtureSession(data["pages"])
+    bench_enrich.run_current(copy.deepcopy(data["prospects"]), session, cold=True)
+    assert "https://clinique-ankadifotsy.mg/contact" not in session.calls
+
+
+def test_deadline_skipped_items_are_not_counted_as_enriched():
+    data = _fixtures()
+    session = bench_enrich.FixtureSession(data["pages"])
+    enrich._SITE_CACHE.clear()
+    orig = enrich.requests.Session
+    enrich.requests.Session = lambda: session
+    try:
+        # le budget couvre la home mais pas l'attente avant une page contact
+        prospects, meta = enrich.enrich_prospects(
+            copy.deepcopy(data["prospects"]), return_meta=True, delay=60, region="MG",
+            deadline=time.perf_counter() + 10,
+        )
+    finally:
+        enrich.requests.Session = orig
+
+    cut = [p for p in prospects if p["enrich_skipped"] == "deadline"]
+    assert cut
+    assert meta["skipped_deadline"] == len(cut)
+    done = [p for p in prospects if p["enrich_attempted"] and not p["enrich_skipped"] and not p["enrich_error"]]
+    assert meta["enriched_count"] == len(done)
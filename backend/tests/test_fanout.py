@@ -0,0 +1,48 @@
+import time
+
+from src.prospect.base import Provider, SearchSpec, register_provider
+from src.prospect.fanout import run_providers
+
+
+class _SlowBatchProvider(Provider):
+    """Un appel upstream qui rend la main après l'échéance, puis un lot déjà en mémoire."""
+
+    name = "test_slow_batch"
+    timeout = 0.2
+
+    def search(self, spec, deadline):
+        time.sleep(0.3)
+        yield [{"entity_key": f"test:{i}", "nom": f"P{i}"} for i in range(50)]
+        return {"provider": self.name}
+
+
+class _SlowStreamProvider(Provider):
+    """Prospects produits un à un, plus lentement que l'échéance."""
+
+    name = "test_slow_stream"
+    timeout = 0.2
+
+    def search(self, spec, deadline):
+        for i in range(50):
+            time.sleep(0.05)
+            yield {"entity_key": f"test:{i}", "nom": f"P{i}"}
+        return {}
+
+
+register_provider(_SlowBatchProvider())
+register_provider(_SlowStreamProvider())
+
+
+def test_slow_call_then_many_items_keeps_the_whole_batch():
+    results, status, meta = run_providers(SearchSpec(limit=50), ["test_slow_batch"])
+    assert status["test_slow_batch"]["count"] == 50
+    assert status["test_slow_batch"]["status"] == "ok"
+    assert len(results["test_slow_batch"]) == 50
+    assert meta == {"provider": "test_slow_batch"}
+
+
+def test_streaming_provider_is_cut_at_the_deadline():
+    results, status, _ = run_providers(SearchSpec(limit=50), ["test_slow_stream"])
+    assert status["test_slow_stream"]["status"] == "timeout"
+    assert 0 < len(results["test_slow_stream"]) < 50
+
@@ -0,0 +1,112 @@
+import json
+
+from src.prospect.open_street_map import osm, sync
+from src.service.store import MemoryProspectStore
+
+
+def _elements(n: int) -> list:
+    kinds = [("amenity", "restaurant"), ("shop", "bakery"), ("tourism", "hotel"), ("amenity", "cafe")]
+    out = []
+    for i in range(n):
+        k, v = kinds[i % len(kinds)]
+        tags = {"name": f"Biz {i}", k: v, "phone": "+261 34 12 345 %02d" % (i % 100), "addr:country": "MG"}
+        out.append({"type": "node", "id": 1000 + i, "lat": -18.9 + i * 1e-5, "lon": 47.5, "tags": tags})
+    # élément modifié mais plus prospect (nom retiré)
+    out.append({"type": "node", "id": 1, "lat": -18.9, "lon": 47.5, "tags": {"amenity": "cafe"}})
+    return out
+
+
+class _Resp:
+    status_code = 200
+
+    def __init__(self, payload: dict):
+        self.content = json.dumps(payload).encode()
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        self.closed = True
+
+
+class _Session:
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.streamed = []
+
+    def post(self, url, data=None, headers=None, timeout=None, stream=False, **kw):
+        self.streamed.append(stream)
+        return _Resp(self.payload)
+
+
+class _Sequence:
+    """Une session par appel (requête diff, puis `out ids`)."""
+
+    def __init__(self, *sessions):
+        self.sessions = iter(sessions)
+
+    def post(self, *args, **kwargs):
+        return next(self.sessions).post(*args, **kwargs)
+
+
+def _payload(n: int) -> dict:
+    return {"version": 0.6, "osm3s": {"timestamp_osm_base": "2026-10-01T00:00:00Z"}, "elements": _elements(n)}
+
+
+def test_sync_tile_streams_and_never_caches(monkeypatch):
+    monkeypatch.setattr(osm, "OVERPASS_STREAM_MIN_BYTES", 4096)
+    osm._OVERPASS_CACHE.clear()
+    store = MemoryProspectStore()
+    area = {"name": "tana", "country_code": "MG"}
+    session = _Session(_payload(200))
+    counts = sync._sync_tile(
+        store, area, "0:0", (-19.0, 47.4, -18.8, 47.6), sync._parse_tags(None), session,
+        reconcile=False, deadline=None,
+    )
+    assert session.streamed == [True]
+    assert counts["added"] == 200
+    assert store.tile_last_sync("tana", "0:0") == "2026-10-01T00:00:00Z"
+    assert len(osm._OVERPASS_CACHE) == 0
+
+
+def test_small_tile_is_decoded_whole_but_not_cached():
+    osm._OVERPASS_CACHE.clear()
+    store = MemoryProspectStore()
+    area = {"name": "tana", "country_code": "MG"}
+    session = _Session(_payload(3))
+    counts = sync._sync_tile(
+        store, area, "0:0", (-19.0, 47.4, -18.8, 47.6), sync._parse_tags(None), session,
+        reconcile=False, deadline=None,
+    )
+    assert counts["added"] == 3
+    assert store.tile_last_sync("tana", "0:0") == "2026-10-01T00:00:00Z"
+    assert len(osm._OVERPASS_CACHE) == 0
+
+
+def test_refresh_still_updates_the_search_cache():
+    # prewarm: refresh=True ignore le cache mais le remplit
+    osm._OVERPASS_CACHE.clear()
+    session = _Session(_payload(3))
+    osm._overpass_request("[out:json];node;out;", session, refresh=True)
+    assert osm._OVERPASS_CACHE.get("[out:json];node;out;") is not None
+
+
+def test_reconcile_ids_query_is_streamed(monkeypatch):
+    monkeypatch.setattr(osm, "OVERPASS_STREAM_MIN_BYTES", 4096)
+    osm._OVERPASS_CACHE.clear()
+    store = MemoryProspectStore()
+    area = {"name": "tana", "country_code": "MG"}
+    args = (store, area, "0:0", (-19.0, 47.4, -18.8, 47.6), sync._parse_tags(None))
+    sync._sync_tile(*args, _Session(_payload(200)), reconcile=True, deadline=None)
+    # passe suivante: rien de modifié, 10 prospects supprimés côté OSM
+    diff = _Session({"elements": []})
+    ids = _Session({"elements": [{"type": "node", "id": 1000 + i} for i in range(10, 200)]})
+    counts = sync._sync_tile(*args, _Sequence(diff, ids), reconcile=True, deadline=None)
+    assert counts["removed"] == 10
+    assert diff.streamed == ids.streamed == [True]
+    assert len(osm._OVERPASS_CACHE) == 0
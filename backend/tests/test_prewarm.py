@@ -0,0 +1,14 @@
+import pytest
+
+from src.controller.prewarm import _parse_hours
+
+
+def test_parse_hours_window():
+    assert _parse_hours("2-5") == (2, 5)
+    assert _parse_hours("23-1") == (23, 1)
+
+
+@pytest.mark.parametrize("value", ["3", "3-3", "", "3-", "a-b"])
+def test_parse_hours_rejects_empty_or_malformed_window(value):
+    with pytest.raises(ValueError, match="PROSPECT_PREWARM_HOURS"):
+        _parse_hours(value)
@@ -0,0 +1,35 @@
+from src.service.resolve import resolve_entities
+
+
+def _prospect(key: str, nom: str, lat: float, lon: float, **extra) -> dict:
+    return {"entity_key": key, "source": "osm", "nom": nom, "lat": lat, "lon": lon, **extra}
+
+
+def test_same_phone_different_name_spelling_is_merged():
+    a = _prospect("osm:node:1", "Hôtel Colbert", -18.9100, 47.5250, phone_keys=["+261341234567"])
+    b = _prospect("fixture:1", "Le Colbert Antananarivo", -18.9105, 47.5252, phone_keys=["+261341234567"])
+    out, stats = resolve_entities([a, b])
+    assert stats["merged_clusters"] == 1
+    assert out[0]["merged_from"] == ["osm:node:1", "fixture:1"]
+
+
+def test_same_email_is_merged():
+    a = _prospect("osm:node:1", "Boulangerie Ravo", -18.9100, 47.5250, emails=["contact@ravo.mg"])
+    b = _prospect("osm:way:2", "Ravo Pâtisserie", -18.9102, 47.5251, emails=["Contact@ravo.mg"])
+    out, _ = resolve_entities([a, b])
+    assert len(out) == 1
+
+
+def test_same_phone_too_far_is_kept_apart():
+    # standard partagé par deux agences d'une même enseigne
+    a = _prospect("osm:node:1", "Agence Centre", -18.9100, 47.5250, phone_keys=["+261201234567"])
+    b = _prospect("osm:node:2", "Agence Ivato", -18.8000, 47.4800, phone_keys=["+261201234567"])
+    out, _ = resolve_entities([a, b])
+    assert len(out) == 2
+
+
+def test_same_domain_only_is_not_enough():
+    a = _prospect("osm:node:1", "Shoprite Analakely", -18.9100, 47.5250, site="https://shoprite.mg")
+    b = _prospect("osm:node:2", "Shoprite Behoririka", -18.9110, 47.5255, site="https://shoprite.mg/magasins")
+    out, _ = resolve_entities([a, b])
+    assert len(out) == 2
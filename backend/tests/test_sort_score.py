@@ -0,0 +1,57 @@
+import json
+
+from src.controller.prospect_controller import ProspectController
+from src.prospect.open_street_map import osm
+
+
+def _payload() -> dict:
+    # les 3 premiers (ordre Overpass) sans contact; les meilleurs arrivent en dernier
+    els = []
+    for i in range(6):
+        tags = {"name": f"Biz {i}", "amenity": "restaurant"}
+        if i >= 3:
+            tags.update({"phone": "+261 34 12 345 %02d" % i, "email": f"info@biz{i}.mg"})
+        els.append({"type": "node", "id": 1000 + i, "lat": -18.9, "lon": 47.5 + i * 1e-4, "tags": tags})
+    return {"elements": els}
+
+
+class _Resp:
+    status_code = 200
+
+    def __init__(self, payload: dict):
+        self.content = json.dumps(payload).encode()
+
+    def iter_content(self, chunk_size=1):
+        yield self.content
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+class _Session:
+    def post(self, url, **kwargs):
+        return _Resp(_payload())
+
+
+def _search(monkeypatch, **kwargs):
+    monkeypatch.setattr(osm.requests, "Session", _Session)
+    osm._OVERPASS_CACHE.clear()
+    return ProspectController.search_prospects(
+        where=None, lat=-18.9, lon=47.5, radius_km=5, radius_min_km=None, category=None,
+        tags="amenity=restaurant", limit=2, enrich=False, providers="osm", **kwargs,
+    )
+
+
+def test_sort_score_ranks_every_candidate(monkeypatch):
+    resp = _search(monkeypatch, sort="score")
+    assert resp["count"] == 2
+    assert {p["nom"] for p in resp["results"]} <= {"Biz 3", "Biz 4", "Biz 5"}
+    assert resp["coverage"]["phone"] == 1.0
+
+
+def test_default_order_keeps_the_first_results(monkeypatch):
+    resp = _search(monkeypatch)
+    assert [p["nom"] for p in resp["results"]] == ["Biz 0", "Biz 1"]